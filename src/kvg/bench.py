@@ -0,0 +1,441 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+helpString = """Usage: python -m kvg.bench [ benchmark ... ] [options]
+Time the main operations of the kvg package on the SVG files of a corpus
+and on the release file built from them. Benchmarks run one after the
+other, each in a fresh interpreter so their peak memory use can be told
+apart.
+
+Benchmarks (all of them by default):
+%s
+Options:
+  --corpus=DIR      directory holding the kanji/ directory to work on
+                    (default: the current directory), and optionally the
+                    kanjivg.xml to read; it is built from kanji/ when
+                    missing. A synthetic corpus is generated when
+                    DIR/kanji does not exist
+  --synthetic=N     use a synthetic corpus of N kanji even if real data
+                    is present (default size: 2000)
+  --seed=N          seed of the synthetic corpus (default: 0)
+  --repeat=N        timed runs of each benchmark (default: 3)
+  --output=FILE     where to save the results as JSON (default:
+                    kvg-bench.json)
+  --compare=FILE    results of an earlier run to compare with"""
+
+SYNTHETIC_SIZE = 2000
+BENCH_OUTPUT = "kvg-bench.json"
+
+
+# Synthetic corpus. Kanji are made of nested groups of random components,
+# positions, radicals and multi-part elements, with a few single-child groups
+# for simplify() to merge, and 1 to 4 strokes of 1 to 3 curves per leaf.
+
+_syntheticElements = "亻氵扌木口日月土女糸言金火心艹宀辶阝刂一二十人又寸山田目"
+_syntheticPositions = (("left", "right"), ("top", "bottom"), ("kamae", None))
+_syntheticStrokeTypes = "㇐㇑㇒㇏㇔㇕㇚㇆㇀㇖㇇"
+
+
+def _syntheticStrokes(rng, group):
+    from kvg.kanjivg import Stroke
+    from kvg.pathstore import formatPath
+
+    for _ in range(rng.randint(1, 4)):
+        segments = rng.randint(1, 3)
+        numbers = [rng.randint(1000, 9900), rng.randint(1000, 9900)]
+        for _ in range(segments * 6):
+            numbers.append(rng.randint(-2500, 2500))
+        stroke = Stroke(group)
+        stroke.element = rng.choice(_syntheticStrokeTypes)
+        stroke.svg = formatPath(b"Mc", [2, segments * 6], numbers)
+        stroke.number_pos = (numbers[0] / 100 - 4, numbers[1] / 100 - 2)
+        group.addChild(stroke)
+
+
+def _syntheticGroup(rng, parent, depth):
+    from kvg.kanjivg import StrokeGr
+
+    first, second = rng.choice(_syntheticPositions)
+    for position in (first, second):
+        if position is None:
+            break
+        named = group = StrokeGr(parent)
+        named.element = rng.choice(_syntheticElements)
+        named.position = position
+        if rng.random() < 0.2:
+            named.radical = "general"
+        if rng.random() < 0.1:
+            named.original = rng.choice(_syntheticElements)
+        if rng.random() < 0.1:
+            # Unnamed single child, merged into its parent by simplify()
+            group = StrokeGr(named)
+        if depth < 2 and rng.random() < 0.6:
+            _syntheticGroup(rng, group, depth + 1)
+        elif rng.random() < 0.1:
+            # Element split in two parts around another component
+            named.part = 1
+            _syntheticStrokes(rng, group)
+            middle = StrokeGr(parent)
+            middle.element = rng.choice(_syntheticElements)
+            _syntheticStrokes(rng, middle)
+            rest = StrokeGr(parent)
+            rest.element = named.element
+            rest.part = 2
+            _syntheticStrokes(rng, rest)
+        else:
+            _syntheticStrokes(rng, group)
+
+
+def syntheticKanji(rng, code, variant=None):
+    """Return a random Kanji for code."""
+    from kvg.kanjivg import Kanji, StrokeGr
+
+    kanji = Kanji(code, variant)
+    kanji.strokes = StrokeGr()
+    kanji.strokes.element = chr(code)
+    _syntheticGroup(rng, kanji.strokes, 0)
+    return kanji
+
+
+def syntheticSvg(kanji):
+    """Return the SVG file of a Kanji, laid out like most of the files of
+    kanji/, the only layout kvg.py release handles: the outer groups are not
+    indented."""
+    from kvg.svgwriter import SVG_HEADER, strokeNumbersToSVG, strokesToSVG
+
+    kid = kanji.kId()
+    return (
+        SVG_HEADER
+        + f'<g id="kvg:StrokePaths_{kid}" style="fill:none;stroke:#000000;stroke-width:3;stroke-linecap:round;stroke-linejoin:round;">\n'
+        + strokesToSVG(kanji)
+        + "</g>\n"
+        + f'<g id="kvg:StrokeNumbers_{kid}" style="font-size:8;fill:#808080">\n'
+        + strokeNumbersToSVG(kanji)
+        + "</g>\n</svg>\n"
+    )
+
+
+def writeSyntheticCorpus(directory, size=SYNTHETIC_SIZE, seed=0):
+    """Write size random kanji as SVG files into directory, plus a Kaisho
+    variant for one in ten of them. The same seed gives the same files.
+    Returns the number of files written."""
+    import random
+
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for i in range(size):
+        code = 0x4E00 + i
+        for variant in (None, "Kaisho") if i % 10 == 9 else (None,):
+            kanji = syntheticKanji(rng, code, variant)
+            path = os.path.join(directory, f"{kanji.kId()}.svg")
+            with open(path, "w", encoding="utf-8", newline="") as out:
+                out.write(syntheticSvg(kanji))
+            count += 1
+    return count
+
+
+# Benchmarks. Each runs in a work directory holding kanji/ and a
+# kanjivg.xml release file, see prepareWorkdir(). setup() prepares the argument of run() and is
+# not timed; tree benchmarks get fresh trees every time, so that nothing is
+# cached from a previous run.
+
+
+def _loadTrees():
+    from kvg.snapshot import loadXmlFile
+
+    return list(loadXmlFile("kanjivg.xml").values())
+
+
+def _readXml(_):
+    from kvg.utils import readXmlFile
+
+    readXmlFile("kanjivg.xml")
+
+
+def _readSvg(_):
+    from kvg.utils import _readSvgFiles
+
+    # Files that cannot be parsed are skipped, as by loadAllSvg()
+    _readSvgFiles([os.path.join("kanji", f) for f in sorted(os.listdir("kanji"))])
+
+
+def _simplify(kanjis):
+    from kvg.kanjivg import simplifyAll
+
+    simplifyAll(kanjis)
+
+
+def _components(kanjis):
+    for kanji in kanjis:
+        if kanji.strokes is not None:
+            kanji.strokes.components(recursive=True)
+
+
+def _getStrokes(kanjis):
+    for kanji in kanjis:
+        kanji.getStrokes()
+
+
+def _toSvg(kanjis):
+    out = io.StringIO()
+    for kanji in kanjis:
+        if kanji.strokes is not None:
+            kanji.strokes.toSVG(out, kanji.kId(), [0], [1])
+
+
+def _diff(_):
+    from kvg.diff import diffCorpora
+
+    # Entries in different formats are never skipped by their bytes, so every
+    # kanji of kanjivg.xml is parsed and fingerprinted twice
+    diffCorpora("kanji", "kanjivg.xml")
+
+
+def _release(_):
+    from kvg.kvg import release
+
+    os.chdir("release")
+    try:
+        release()
+    finally:
+        os.chdir("..")
+
+
+# name: (setup or None, run, description)
+benchmarks = {
+    "read-xml": (None, _readXml, "readXmlFile() of kanjivg.xml"),
+    "read-svg": (None, _readSvg, "SvgFileInfo.read() of every file of kanji/"),
+    "simplify": (_loadTrees, _simplify, "simplifyAll() of every kanji"),
+    "components": (
+        _loadTrees,
+        _components,
+        "components(recursive=True) of every root group",
+    ),
+    "get-strokes": (_loadTrees, _getStrokes, "Kanji.getStrokes() of every kanji"),
+    "to-svg": (_loadTrees, _toSvg, "StrokeGr.toSVG() of every root group"),
+    "diff": (None, _diff, "diffCorpora() of kanji/ against kanjivg.xml"),
+    "release": (None, _release, "kvg.py release"),
+}
+
+
+def peakRss():
+    """Return the peak resident set size of the process in bytes, or None
+    where the resource module is not available."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def runBenchmark(name, workdir, repeat=3):
+    """Run a benchmark in workdir: repeat timed runs, then an untimed one
+    tracing allocations. Returns a dict of results."""
+    import gc
+    import statistics
+    import tracemalloc
+
+    setup, run, _ = benchmarks[name]
+    os.chdir(workdir)
+    times = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        rssBefore = peakRss()
+        for _ in range(repeat):
+            arg = setup() if setup else None
+            gc.collect()
+            start = time.perf_counter()
+            run(arg)
+            times.append(time.perf_counter() - start)
+            del arg
+        rss = peakRss()
+        arg = setup() if setup else None
+        gc.collect()
+        tracemalloc.start()
+        run(arg)
+        allocated, allocPeak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "times": times,
+        "min": min(times),
+        "median": statistics.median(times),
+        # Peak of the whole process, setup included
+        "peakRss": rss,
+        "rssBefore": rssBefore,
+        # Peak and retained size of the memory allocated by one run
+        "allocPeak": allocPeak,
+        "allocRetained": allocated,
+    }
+
+
+def _runIsolated(name, workdir, repeat):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(runBenchmark, name, workdir, repeat).result()
+
+
+def prepareWorkdir(workdir, corpus=".", synthetic=None, seed=0):
+    """Fill workdir with a kanji/ directory, either linked to corpus/kanji or
+    synthetic, and a release file: a copy of corpus/kanjivg.xml if there is
+    one, else built from kanji/. The release benchmark works in its own
+    release/ subdirectory. Returns a description of the corpus."""
+    import shutil
+
+    from kvg.kvg import release
+    from kvg.snapshot import loadXmlFile
+
+    source = os.path.join(corpus, "kanji")
+    kanjiDir = os.path.join(workdir, "kanji")
+    xmlSource = os.path.join(corpus, "kanjivg.xml")
+    if synthetic is None and os.path.isdir(source):
+        os.symlink(os.path.abspath(source), kanjiDir)
+        description = {"source": os.path.abspath(source)}
+        if os.path.exists(xmlSource):
+            shutil.copyfile(xmlSource, os.path.join(workdir, "kanjivg.xml"))
+            description["release"] = os.path.abspath(xmlSource)
+    else:
+        size = SYNTHETIC_SIZE if synthetic in (None, True) else int(synthetic)
+        writeSyntheticCorpus(kanjiDir, size, seed)
+        description = {"source": "synthetic", "size": size, "seed": seed}
+    description["files"] = len(os.listdir(kanjiDir))
+    os.mkdir(os.path.join(workdir, "release"))
+    os.symlink(os.path.abspath(kanjiDir), os.path.join(workdir, "release", "kanji"))
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if not os.path.exists("kanjivg.xml"):
+                release()
+            # Tree benchmarks load the trees from the snapshot
+            description["kanji"] = len(loadXmlFile("kanjivg.xml"))
+    finally:
+        os.chdir(cwd)
+    return description
+
+
+def gitCommit():
+    """Return the commit the kvg package is checked out at, if any."""
+    import subprocess
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _mib(value):
+    return "%.1f" % (value / 1048576) if value is not None else "-"
+
+
+def printResults(results, previous=None):
+    header = "%-12s %9s %9s %9s %9s" % (
+        "benchmark",
+        "median s",
+        "min s",
+        "RSS MiB",
+        "alloc MiB",
+    )
+    if previous:
+        header += " %9s %7s" % ("before s", "ratio")
+    print(header)
+    for name, result in results.items():
+        line = "%-12s %9.3f %9.3f %9s %9s" % (
+            name,
+            result["median"],
+            result["min"],
+            _mib(result["peakRss"]),
+            _mib(result["allocPeak"]),
+        )
+        old = previous.get(name) if previous else None
+        if old:
+            line += " %9.3f %6.2fx" % (old["median"], result["median"] / old["median"])
+        print(line)
+
+
+def main(
+    names=None,
+    corpus=".",
+    synthetic=None,
+    seed=0,
+    repeat=3,
+    output=BENCH_OUTPUT,
+    compare=None,
+):
+    import platform
+    import shutil
+    import tempfile
+
+    names = names or list(benchmarks)
+    for name in names:
+        if name not in benchmarks:
+            raise Exception(f"Unknown benchmark {name}")
+    previous = None
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            previous = json.load(f)["results"]
+
+    workdir = tempfile.mkdtemp(prefix="kvg-bench-")
+    try:
+        description = prepareWorkdir(workdir, corpus, synthetic, int(seed))
+        print(
+            "Corpus: %s, %d files, %d kanji"
+            % (description["source"], description["files"], description["kanji"])
+        )
+        results = {}
+        for name in names:
+            results[name] = _runIsolated(name, workdir, int(repeat))
+    finally:
+        shutil.rmtree(workdir)
+
+    printResults(results, previous)
+    report = {
+        "version": 1,
+        "commit": gitCommit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": description,
+        "repeat": int(repeat),
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as out:
+        json.dump(report, out, ensure_ascii=False, indent=1)
+        out.write("\n")
+    print(f"Results saved to {output}")
+
+
+if __name__ == "__main__":
+    options = {}
+    names = []
+    for a in sys.argv[1:]:
+        if a.startswith("--"):
+            name, _, value = a[2:].partition("=")
+            options[name] = value or True
+        else:
+            names.append(a)
+    allowedOptions = ["corpus", "synthetic", "seed", "repeat", "output", "compare"]
+    if any(o not in allowedOptions for o in options) or any(
+        n not in benchmarks for n in names
+    ):
+        descriptions = "".join(
+            "  %-16s  %s\n" % (name, description)
+            for name, (_, _, description) in benchmarks.items()
+        )
+        print(helpString % descriptions)
+        sys.exit(0)
+    main(names, **options)
@@ -0,0 +1,108 @@
+import marshal
+from collections import namedtuple
+
+from kvg.snapshot import isFresh, sourceStamp
+
+# A group containing a component. group is the group id as returned by
+# Kanji.getGroups().
+ComponentEntry = namedtuple(
+    "ComponentEntry",
+    ["kanji", "group", "element", "original", "position", "radical", "part"],
+)
+
+COMPONENTS_SUFFIX = ".components"
+
+
+class ComponentIndex:
+    """Inverted index of the components of a corpus: maps each element and
+    original to the groups where it appears. It answers the reverse question
+    of StrokeGr.components()."""
+
+    def __init__(self, components=None):
+        # component -> list of plain ComponentEntry tuples
+        self.components = components if components is not None else {}
+
+    def add(self, kanji):
+        """Index all the groups of a Kanji."""
+        kid = kanji.kId()
+        for gid, group in kanji.getGroups():
+            if not group.element and not group.original:
+                continue
+            entry = (
+                kid,
+                gid,
+                group.element,
+                group.original,
+                group.position,
+                group.radical,
+                group.part,
+            )
+            for component in {group.element, group.original}:
+                if component:
+                    self.components.setdefault(component, []).append(entry)
+
+    def find(self, component, position=None, radical=None, part=None):
+        """Return the ComponentEntry of every group whose element or original
+        is component, optionally restricted to a position, radical type or
+        part number."""
+        ret = []
+        for entry in self.components.get(component, ()):
+            entry = ComponentEntry(*entry)
+            if position is not None and entry.position != position:
+                continue
+            if radical is not None and entry.radical != radical:
+                continue
+            if part is not None and entry.part != part:
+                continue
+            ret.append(entry)
+        return ret
+
+    def kanji(self, component, **filters):
+        """Return the sorted ids of the kanji containing component."""
+        return sorted({entry.kanji for entry in self.find(component, **filters)})
+
+    def write(self, path, source=None):
+        stamp = sourceStamp(source) if source is not None else None
+        with open(path, "wb") as out:
+            marshal.dump(
+                {"version": 1, "source": stamp, "components": self.components}, out
+            )
+
+    @classmethod
+    def read(cls, path, source=None):
+        """Load an index written by write(). Returns None if it does not
+        exist or is stale with regard to its source file."""
+        try:
+            with open(path, "rb") as f:
+                data = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if data.get("version") != 1:
+            return None
+        if source is not None and not isFresh(data["source"], source):
+            return None
+        return cls(data["components"])
+
+
+def buildComponentIndex(kanjis):
+    """Build the ComponentIndex of an iterable of Kanji."""
+    index = ComponentIndex()
+    for kanji in kanjis:
+        index.add(kanji)
+    return index
+
+
+def loadComponentIndex(path):
+    """Return the ComponentIndex of the release file at path. It is kept
+    next to it and rebuilt whenever the release file changes."""
+    from kvg.utils import iterXmlFile
+
+    indexPath = path + COMPONENTS_SUFFIX
+    index = ComponentIndex.read(indexPath, path)
+    if index is None:
+        index = buildComponentIndex(iterXmlFile(path, validate=False))
+        try:
+            index.write(indexPath, path)
+        except OSError as e:
+            print(f"Could not write component index {indexPath}: {e}")
+    return index
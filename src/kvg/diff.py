@@ -0,0 +1,210 @@
+import contextlib
+import functools
+import hashlib
+import os
+from collections import namedtuple
+
+from kvg.kanjivg import StrokeGr
+
+# Structural diff of two versions of the corpus. Each kanji tree is reduced to
+# a fingerprint, a tree of hashes with one node per group:
+#   (digest, own digest, number of groups, sub-group fingerprints)
+# The own digest covers the attributes of the group, the type and path data of
+# its strokes and the place of its sub-groups among its children; the digest
+# adds the digests of the sub-groups. Trees are compared from the root down and
+# a subtree whose digest did not change is skipped whole. Stroke number
+# positions are not part of a fingerprint.
+
+CorpusDiff = namedtuple("CorpusDiff", ["added", "removed", "modified"])
+
+
+def fingerprintGroup(group):
+    """Return the fingerprint of the subtree of group."""
+    layout = []
+    groups = []
+    for child in group.children:
+        if isinstance(child, StrokeGr):
+            layout.append(None)
+            groups.append(fingerprintGroup(child))
+        else:
+            layout.append((child.element, child.svg))
+    attributes = (
+        group.element,
+        group.original,
+        group.part,
+        group.number,
+        group._flags,
+        group.position,
+        group.radical,
+        group.phon,
+    )
+    own = hashlib.sha1(repr((attributes, layout)).encode("utf-8")).digest()
+    h = hashlib.sha1(own)
+    size = 1
+    for sub in groups:
+        h.update(sub[0])
+        size += sub[2]
+    return (h.digest(), own, size, groups)
+
+
+def fingerprint(kanji):
+    """Return the fingerprint of a Kanji, None if it has no strokes."""
+    if kanji.strokes is None:
+        return None
+    return fingerprintGroup(kanji.strokes)
+
+
+def diffFingerprints(old, new, kid):
+    """Return the ids of the groups of the new tree of kid, as given by
+    Kanji.getGroups(), whose attributes, strokes or layout differ from the
+    group at the same place in the old tree. Groups that gained or lost
+    sub-groups are reported, but not compared further down."""
+    if old is None or new is None:
+        return [] if old is new else [kid]
+    changed = []
+    stack = [(old, new, 0)]
+    while stack:
+        old, new, index = stack.pop()
+        if old[0] == new[0]:
+            continue
+        if old[1] != new[1]:
+            changed.append(f"{kid}-g{index}" if index else kid)
+        if len(old[3]) != len(new[3]):
+            continue
+        pairs = []
+        index += 1
+        for oldSub, newSub in zip(old[3], new[3]):
+            pairs.append((oldSub, newSub, index))
+            index += newSub[2]
+        stack.extend(reversed(pairs))
+    return changed
+
+
+def diffKanji(old, new):
+    """Return the ids of the groups that differ between two versions of a
+    Kanji, see diffFingerprints()."""
+    return diffFingerprints(fingerprint(old), fingerprint(new), new.kId())
+
+
+def _entries(source):
+    """Return kId() -> location of every kanji of source: the path of its file
+    for a directory of SVG files, the byte range of its element for a release
+    file. Files are keyed by name, like LazyCorpus does. Nothing is written
+    next to source: a missing or stale index is built in memory."""
+    from kvg.utils import listSvgFiles, readXmlIndex
+
+    if not os.path.isdir(source):
+        return readXmlIndex(source, write=False)
+    ret = {}
+    for f in listSvgFiles(source):
+        kid = f"{f.id}-{f.variant}" if hasattr(f, "variant") else f.id
+        ret[kid] = f.path
+    return ret
+
+
+def _readEntry(mm, location):
+    if mm is None:
+        with open(location, "rb") as f:
+            return f.read()
+    start, end = location
+    return mm[start:end]
+
+
+def _parseEntry(data, svg):
+    from kvg.kanjivg import KanjisHandler, SVGHandler
+    from kvg.utils import XML_ROOT_END, XML_ROOT_START, parseXmlString
+
+    if svg:
+        handler = SVGHandler(validate=False)
+    else:
+        handler = KanjisHandler(validate=False)
+        data = XML_ROOT_START + data + XML_ROOT_END
+    parseXmlString(data, handler)
+    parsed = list(handler.kanjis.values())
+    if len(parsed) != 1:
+        raise Exception("Entry does not contain 1 kanji")
+    return parsed[0]
+
+
+def _diffChunk(oldSource, newSource, chunk):
+    import mmap
+
+    oldSvg = os.path.isdir(oldSource)
+    newSvg = os.path.isdir(newSource)
+    results = []
+    with contextlib.ExitStack() as stack:
+        maps = []
+        for source, svg in ((oldSource, oldSvg), (newSource, newSvg)):
+            if svg:
+                maps.append(None)
+                continue
+            f = stack.enter_context(open(source, "rb"))
+            maps.append(
+                stack.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            )
+        for kid, oldLocation, newLocation in chunk:
+            try:
+                oldData = _readEntry(maps[0], oldLocation)
+                newData = _readEntry(maps[1], newLocation)
+                # Same bytes in the same format, same tree
+                if oldSvg == newSvg and oldData == newData:
+                    continue
+                changed = diffFingerprints(
+                    fingerprint(_parseEntry(oldData, oldSvg)),
+                    fingerprint(_parseEntry(newData, newSvg)),
+                    kid,
+                )
+                if changed:
+                    results.append((kid, changed, None))
+            except Exception as e:
+                results.append((kid, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def _collectDiffResults(results, errors):
+    modified = {}
+    for chunk in results:
+        for kid, changed, error in chunk:
+            if error is not None:
+                if errors is None:
+                    print(f"{kid}: {error}")
+                else:
+                    errors[kid] = error
+                continue
+            modified[kid] = changed
+    return modified
+
+
+def diffCorpora(old, new, workers=None, chunksize=256, errors=None):
+    """Compare two versions of the corpus, each a release file or a directory
+    of SVG files. Kanji found in both are compared by a pool of worker
+    processes: entries with the same bytes are skipped, the others are parsed
+    and compared by diffFingerprints().
+
+    Returns a CorpusDiff of the sorted added and removed ids, and of the
+    modified ones mapped to their changed group ids. Kanji that fail to parse
+    are reported in the errors dict (kId() -> message) if given, printed
+    otherwise, and left out of the result."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    oldEntries = _entries(old)
+    newEntries = _entries(new)
+    added = sorted(kid for kid in newEntries if kid not in oldEntries)
+    removed = sorted(kid for kid in oldEntries if kid not in newEntries)
+    common = [
+        (kid, oldEntries[kid], newEntries[kid])
+        for kid in sorted(newEntries)
+        if kid in oldEntries
+    ]
+    chunks = [common[i : i + chunksize] for i in range(0, len(common), chunksize)]
+    diffChunk = functools.partial(_diffChunk, old, new)
+
+    if workers <= 1 or len(chunks) <= 1:
+        modified = _collectDiffResults(map(diffChunk, chunks), errors)
+        return CorpusDiff(added, removed, modified)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        modified = _collectDiffResults(executor.map(diffChunk, chunks), errors)
+    return CorpusDiff(added, removed, modified)
@@ -0,0 +1,172 @@
+import json
+import os
+import struct
+import sys
+
+from kvg.utils import SvgFileInfo
+
+# Index of the SVG files describing each character, as written by
+# make-index.pl: {character: [file names]} with sorted keys and file names.
+FILE_INDEX = "kvg-index.json"
+
+# Binary variant, for readers that cannot afford to parse JSON: magic, number
+# of characters N, then N sorted code points, N + 1 offsets into the names
+# blob and the blob itself, holding the newline-separated file names of each
+# character. Integers are unsigned 32 bits, little endian.
+BINARY_INDEX_MAGIC = b"KVGFIDX1"
+_binaryHeader = struct.Struct("<8sI")
+
+
+def fileIndexKey(info):
+    return chr(int(info.id, 16))
+
+
+def _svgFileInfo(name, directory):
+    """Return the SvgFileInfo of a file of directory, or None with a warning,
+    as make-index.pl gives, if its name is not the one of a kanji file."""
+    try:
+        return SvgFileInfo(name, directory)
+    except Exception:
+        path = os.path.join(directory, name)
+        print(f"Could not get kanji from {path}", file=sys.stderr)
+        return None
+
+
+def buildFileIndex(directory):
+    """Build the file index of the SVG files of directory. Like
+    make-index.pl, files without the .svg extension are ignored and files
+    with another name than a kanji one are skipped with a warning."""
+    index = {}
+    for name in os.listdir(directory):
+        if not name.endswith(".svg"):
+            continue
+        info = _svgFileInfo(name, directory)
+        if info is not None:
+            index.setdefault(fileIndexKey(info), []).append(name)
+    for files in index.values():
+        files.sort()
+    return index
+
+
+def updateFileIndex(index, directory):
+    """Update index in place with the files added to or removed from
+    directory. Only the new files are looked at, and skipped as by
+    buildFileIndex() if their name is not a kanji one. Returns the number of
+    added and removed files."""
+    names = {f for f in os.listdir(directory) if f.endswith(".svg")}
+    known = {f for files in index.values() for f in files}
+    added = 0
+    removed = known - names
+    for f in sorted(names - known):
+        info = _svgFileInfo(f, directory)
+        if info is None:
+            continue
+        key = fileIndexKey(info)
+        index.setdefault(key, []).append(f)
+        index[key].sort()
+        added += 1
+    if removed:
+        for key in list(index):
+            files = [f for f in index[key] if f not in removed]
+            if files:
+                index[key] = files
+            else:
+                del index[key]
+    return added, len(removed)
+
+
+def readFileIndex(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def writeFileIndex(index, path):
+    # Same layout as make-index.pl (JSON::Create with indent and sort)
+    data = json.dumps(
+        index, ensure_ascii=False, sort_keys=True, indent="\t", separators=(",", ":")
+    )
+    tmpPath = f"{path}.tmp{os.getpid()}"
+    with open(tmpPath, "w", encoding="utf-8", newline="\n") as f:
+        f.write(data + "\n")
+    os.replace(tmpPath, path)
+
+
+def binaryIndexPath(path):
+    root, ext = os.path.splitext(path)
+    return root + ".bin" if ext == ".json" else path + ".bin"
+
+
+def writeBinaryFileIndex(index, path):
+    keys = sorted(index)
+    blobs = [("\n".join(index[key])).encode("utf-8") for key in keys]
+    offsets = [0]
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    tmpPath = f"{path}.tmp{os.getpid()}"
+    with open(tmpPath, "wb") as f:
+        f.write(_binaryHeader.pack(BINARY_INDEX_MAGIC, len(keys)))
+        f.write(struct.pack(f"<{len(keys)}I", *(ord(key) for key in keys)))
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(b"".join(blobs))
+    os.replace(tmpPath, path)
+
+
+class BinaryFileIndex:
+    """Read-only view of a binary file index. The file is memory-mapped and
+    looked up in place: opening it costs the same whatever its size."""
+
+    def __init__(self, path):
+        import mmap
+
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = _binaryHeader.unpack_from(self.map)
+        if magic != BINARY_INDEX_MAGIC:
+            raise Exception(f"Not a binary file index ({path})")
+        start = _binaryHeader.size
+        view = memoryview(self.map)
+        self.codes = view[start : start + 4 * count]
+        self.offsets = view[start + 4 * count : start + 8 * count + 4]
+        if sys.byteorder == "little":
+            self.codes = self.codes.cast("I")
+            self.offsets = self.offsets.cast("I")
+        else:
+            self.codes = struct.unpack(f"<{count}I", self.codes)
+            self.offsets = struct.unpack(f"<{count + 1}I", self.offsets)
+        self.blobStart = start + 8 * count + 4
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _find(self, char):
+        from bisect import bisect_left
+
+        code = ord(char)
+        i = bisect_left(self.codes, code)
+        if i < len(self.codes) and self.codes[i] == code:
+            return i
+        return None
+
+    def __contains__(self, char):
+        return self._find(char) is not None
+
+    def get(self, char, default=None):
+        """Return the file names of char, or default."""
+        i = self._find(char)
+        if i is None:
+            return default
+        start = self.blobStart + self.offsets[i]
+        end = self.blobStart + self.offsets[i + 1]
+        return self.map[start:end].decode("utf-8").split("\n")
+
+    def __getitem__(self, char):
+        ret = self.get(char)
+        if ret is None:
+            raise KeyError(char)
+        return ret
+
+    def close(self):
+        for view in (self.codes, self.offsets):
+            if isinstance(view, memoryview):
+                view.release()
+        self.map.close()
@@ -0,0 +1,305 @@
+# Numeric stroke geometry. Requires NumPy (the "geometry" extra).
+
+import re
+
+import numpy as np
+
+_pathToken = re.compile(r"[MmCcSsLlZz]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+# Number of coordinates taken by each command
+_commandArgs = {"M": 2, "C": 6, "S": 4, "L": 2, "Z": 0}
+
+
+def pathPoints(d):
+    """Parse SVG path data (M, C, S, L, Z commands and their relative forms)
+    into a flat list of absolute cubic Bézier control points: 8 floats (x0,
+    y0, x1, y1, x2, y2, x3, y3) per segment. Lines are converted to
+    equivalent cubic segments."""
+    tokens = _pathToken.findall(d)
+    ret = []
+    x = y = 0.0
+    startX = startY = 0.0
+    # Second control point of the previous curve, for S
+    ctrlX = ctrlY = None
+    cmd = None
+    i = 0
+    n = len(tokens)
+    while i < n:
+        token = tokens[i]
+        if token.isalpha():
+            cmd = token
+            i += 1
+        elif cmd is None:
+            raise ValueError(f"Path data does not start with a command: {d}")
+        upper = cmd.upper()
+        if upper == "Z":
+            if x != startX or y != startY:
+                ret += _line(x, y, startX, startY)
+            x, y = startX, startY
+            ctrlX = None
+            # Z takes no coordinates, a new command must follow
+            cmd = None
+            continue
+        argc = _commandArgs.get(upper)
+        if argc is None:
+            raise ValueError(f"Unsupported path command {cmd}: {d}")
+        if i + argc > n:
+            raise ValueError(f"Missing coordinates for command {cmd}: {d}")
+        args = [float(t) for t in tokens[i : i + argc]]
+        i += argc
+        if cmd.islower():
+            for j in range(0, argc, 2):
+                args[j] += x
+                args[j + 1] += y
+        if upper == "M":
+            x, y = startX, startY = args
+            ctrlX = None
+            # Coordinates following a moveto are implicit linetos
+            cmd = "l" if cmd == "m" else "L"
+        elif upper == "L":
+            ret += _line(x, y, *args)
+            x, y = args
+            ctrlX = None
+        else:
+            if upper == "C":
+                x1, y1, x2, y2, x3, y3 = args
+            else:
+                x2, y2, x3, y3 = args
+                if ctrlX is None:
+                    x1, y1 = x, y
+                else:
+                    x1, y1 = 2 * x - ctrlX, 2 * y - ctrlY
+            ret += (x, y, x1, y1, x2, y2, x3, y3)
+            x, y = x3, y3
+            ctrlX, ctrlY = x2, y2
+    return ret
+
+
+def _line(x0, y0, x1, y1):
+    dx = (x1 - x0) / 3
+    dy = (y1 - y0) / 3
+    return (x0, y0, x0 + dx, y0 + dy, x1 - dx, y1 - dy, x1, y1)
+
+
+def parsePath(d):
+    """Return the absolute cubic Bézier control points of SVG path data as an
+    array of shape (segments, 4, 2)."""
+    return np.array(pathPoints(d), dtype=np.float64).reshape(-1, 4, 2)
+
+
+class StrokeTable:
+    """Control points of all the strokes of a corpus, in one contiguous array.
+
+    beziers has shape (segments, 4, 2). The segments of stroke i are
+    beziers[strokeOffsets[i]:strokeOffsets[i + 1]], and the strokes of kanji
+    k (in getStrokes() order) are kanjiOffsets[k] to kanjiOffsets[k + 1].
+    kanjiIds[k] is the key of kanji k in the corpus.
+
+    Groups are numbered in document order, like their SVG ids: the groups of
+    kanji k are kanjiGroupOffsets[k] to kanjiGroupOffsets[k + 1], the first
+    one being the root group. Since strokes are stored in document order too,
+    group g covers strokes groupRanges[g, 0] to groupRanges[g, 1]."""
+
+    def __init__(
+        self,
+        beziers,
+        strokeOffsets,
+        kanjiOffsets,
+        kanjiIds,
+        groupRanges,
+        kanjiGroupOffsets,
+    ):
+        self.beziers = beziers
+        self.strokeOffsets = strokeOffsets
+        self.kanjiOffsets = kanjiOffsets
+        self.kanjiIds = kanjiIds
+        self.groupRanges = groupRanges
+        self.kanjiGroupOffsets = kanjiGroupOffsets
+
+    def __len__(self):
+        return len(self.strokeOffsets) - 1
+
+    def strokeBeziers(self, i):
+        return self.beziers[self.strokeOffsets[i] : self.strokeOffsets[i + 1]]
+
+
+def strokeTable(kanjis):
+    """Convert all the strokes of kanjis (a dict as returned by readXmlFile()
+    or loadAllSvg()) into a StrokeTable."""
+    from kvg.kanjivg import StrokeGr
+
+    points = []
+    strokeOffsets = [0]
+    kanjiOffsets = [0]
+    kanjiIds = []
+    groupRanges = []
+    kanjiGroupOffsets = [0]
+
+    def addGroup(group):
+        index = len(groupRanges)
+        groupRanges.append(None)
+        start = len(strokeOffsets) - 1
+        for child in group.children:
+            if isinstance(child, StrokeGr):
+                addGroup(child)
+            else:
+                if child.svg:
+                    points.extend(pathPoints(child.svg))
+                strokeOffsets.append(len(points) // 8)
+        groupRanges[index] = (start, len(strokeOffsets) - 1)
+
+    for key, kanji in kanjis.items():
+        if kanji.strokes is not None:
+            addGroup(kanji.strokes)
+        kanjiOffsets.append(len(strokeOffsets) - 1)
+        kanjiGroupOffsets.append(len(groupRanges))
+        kanjiIds.append(key)
+    return StrokeTable(
+        np.array(points, dtype=np.float64).reshape(-1, 4, 2),
+        np.array(strokeOffsets, dtype=np.int64),
+        np.array(kanjiOffsets, dtype=np.int64),
+        kanjiIds,
+        np.array(groupRanges, dtype=np.int64).reshape(-1, 2),
+        np.array(kanjiGroupOffsets, dtype=np.int64),
+    )
+
+
+# Batch geometry. All these functions work on whole arrays of segments at
+# once; per-stroke, per-group and per-kanji results are reductions over the
+# ranges of a StrokeTable.
+
+
+def _bernstein(t):
+    t = np.asarray(t, dtype=np.float64)
+    mt = 1 - t
+    return np.stack([mt * mt * mt, 3 * mt * mt * t, 3 * mt * t * t, t * t * t], -1)
+
+
+def sampleSegments(beziers, n=16):
+    """Evaluate each segment of beziers (shape (segments, 4, 2)) at n evenly
+    spaced parameter values. Returns an array of shape (segments, n, 2)."""
+    return np.einsum("tk,skd->std", _bernstein(np.linspace(0, 1, n)), beziers)
+
+
+def sampleStrokes(table, n=16):
+    """Sample every segment of a StrokeTable at n points. Segments of stroke i
+    are rows strokeOffsets[i] to strokeOffsets[i + 1] of the result."""
+    return sampleSegments(table.beziers, n)
+
+
+def segmentBounds(beziers):
+    """Exact bounding boxes of segments, as an array of shape (segments, 2, 2)
+    holding [[xmin, ymin], [xmax, ymax]] for each segment."""
+    p0, p1, p2, p3 = (beziers[:, i] for i in range(4))
+    # Extrema are at the roots of the derivative, a quadratic at^2 + bt + c
+    a = -p0 + 3 * p1 - 3 * p2 + p3
+    b = 2 * (p0 - 2 * p1 + p2)
+    c = p1 - p0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        root = np.sqrt(b * b - 4 * a * c)
+        quadratic = np.abs(a) > 1e-12
+        t1 = np.where(quadratic, (-b + root) / (2 * a), -c / b)
+        t2 = np.where(quadratic, (-b - root) / (2 * a), np.nan)
+    t = np.stack([t1, t2], -1)
+    # Roots outside of the segment are replaced by t = 0, an endpoint
+    t = np.where((t > 0) & (t < 1), t, 0.0)
+    mt = 1 - t
+    values = (
+        mt * mt * mt * p0[..., None]
+        + 3 * mt * mt * t * p1[..., None]
+        + 3 * mt * t * t * p2[..., None]
+        + t * t * t * p3[..., None]
+    )
+    lo = np.minimum(np.minimum(p0, p3), values.min(-1))
+    hi = np.maximum(np.maximum(p0, p3), values.max(-1))
+    return np.stack([lo, hi], 1)
+
+
+# Gauss-Legendre nodes and weights mapped to [0, 1]
+_legendre = np.polynomial.legendre.leggauss(16)
+_lengthNodes = (_legendre[0] + 1) / 2
+_lengthWeights = _legendre[1] / 2
+
+
+def segmentLengths(beziers):
+    """Arc length of each segment, by Gauss-Legendre quadrature."""
+    t = _lengthNodes
+    mt = 1 - t
+    # Derivative of the Bernstein basis
+    dBasis = np.stack(
+        [-3 * mt * mt, 3 * mt * (1 - 3 * t), 3 * t * (2 - 3 * t), 3 * t * t], -1
+    )
+    speed = np.linalg.norm(np.einsum("tk,skd->std", dBasis, beziers), axis=-1)
+    return speed @ _lengthWeights
+
+
+def _reduceRanges(ufunc, values, starts, ends, empty):
+    """Apply ufunc.reduceat to values over each [start, end) range. Ranges may
+    overlap or nest; empty ones give the empty value."""
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    ret = np.full((len(starts),) + values.shape[1:], empty, dtype=np.float64)
+    nonEmpty = ends > starts
+    if not nonEmpty.any():
+        return ret
+    indices = np.empty(2 * int(nonEmpty.sum()), dtype=np.int64)
+    indices[0::2] = starts[nonEmpty]
+    indices[1::2] = ends[nonEmpty]
+    # reduceat reduces between consecutive indices, so every other result
+    # is one of our ranges; the padding row keeps end indices in bounds.
+    padded = np.concatenate([values, values[:1]])
+    ret[nonEmpty] = ufunc.reduceat(padded, indices, axis=0)[0::2]
+    return ret
+
+
+def _rangeBounds(bounds, starts, ends):
+    # fmin/fmax ignore the NaN bounds of empty strokes
+    lo = _reduceRanges(np.fmin, bounds[:, 0], starts, ends, np.nan)
+    hi = _reduceRanges(np.fmax, bounds[:, 1], starts, ends, np.nan)
+    return np.stack([lo, hi], 1)
+
+
+def strokeBounds(table):
+    """Bounding box of each stroke, shape (strokes, 2, 2). NaN for strokes
+    without path data."""
+    offsets = table.strokeOffsets
+    return _rangeBounds(segmentBounds(table.beziers), offsets[:-1], offsets[1:])
+
+
+def groupBounds(table, strokeBoxes=None):
+    """Bounding box of each group, shape (groups, 2, 2)."""
+    if strokeBoxes is None:
+        strokeBoxes = strokeBounds(table)
+    ranges = table.groupRanges
+    return _rangeBounds(strokeBoxes, ranges[:, 0], ranges[:, 1])
+
+
+def kanjiBounds(table, strokeBoxes=None):
+    """Bounding box of each kanji, shape (kanji, 2, 2)."""
+    if strokeBoxes is None:
+        strokeBoxes = strokeBounds(table)
+    offsets = table.kanjiOffsets
+    return _rangeBounds(strokeBoxes, offsets[:-1], offsets[1:])
+
+
+def strokeLengths(table):
+    """Arc length of each stroke."""
+    offsets = table.strokeOffsets
+    lengths = segmentLengths(table.beziers)
+    return _reduceRanges(np.add, lengths, offsets[:-1], offsets[1:], 0.0)
+
+
+def groupLengths(table, strokeLens=None):
+    """Total stroke length of each group."""
+    if strokeLens is None:
+        strokeLens = strokeLengths(table)
+    ranges = table.groupRanges
+    return _reduceRanges(np.add, strokeLens, ranges[:, 0], ranges[:, 1], 0.0)
+
+
+def kanjiLengths(table, strokeLens=None):
+    """Total stroke length of each kanji."""
+    if strokeLens is None:
+        strokeLens = strokeLengths(table)
+    offsets = table.kanjiOffsets
+    return _reduceRanges(np.add, strokeLens, offsets[:-1], offsets[1:], 0.0)
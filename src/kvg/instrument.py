@@ -0,0 +1,231 @@
+import contextlib
+import json
+import os
+import sys
+import time
+
+# Opt-in instrumentation of the parse and release paths: counters and
+# inclusive timers per phase. While disabled, nothing is wrapped and the only
+# trace of it in the code is a `recorder is None` test once per file read;
+# enable() swaps timed wrappers in for the functions marked instrumented(),
+# in the namespaces of the kvg modules only, and for the element callbacks
+# of BasicHandler, and disable() puts the originals back. Only the current process is measured, not worker pools.
+
+# The active Recorder, None while instrumentation is disabled
+recorder = None
+
+# (function, phase) of every function marked instrumented()
+_instrumented = []
+# (module dict or class, name, original) of every wrapper put in place by
+# enable()
+_patched = []
+
+
+class Recorder:
+    """Counters and timers of an instrumented run. Timers are inclusive:
+    time spent decoding attributes is also counted in dispatch, itself part
+    of parse."""
+
+    def __init__(self):
+        self.counters = {}
+        # phase -> [calls, seconds]
+        self.timers = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def add(self, phase, seconds):
+        timer = self.timers.get(phase)
+        if timer is None:
+            timer = self.timers[phase] = [0, 0.0]
+        timer[0] += 1
+        timer[1] += seconds
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time the body of a with statement as phase name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def asDict(self):
+        return {
+            "counters": dict(sorted(self.counters.items())),
+            "timers": {
+                phase: {"calls": calls, "seconds": seconds}
+                for phase, (calls, seconds) in sorted(self.timers.items())
+            },
+        }
+
+
+def _timed(function, phase):
+    def wrapper(*args, **kwargs):
+        if recorder is None:
+            # Left behind by instrumented() after disable()
+            return function(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            recorder.add(phase, time.perf_counter() - start)
+
+    wrapper.__wrapped__ = function
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+
+def instrumented(phase):
+    """Mark a function to be timed as phase while instrumentation is
+    enabled. The function itself is returned unchanged."""
+
+    def register(function):
+        _instrumented.append((function, phase))
+        if recorder is not None:
+            # Defined after enable(), e.g. in a lazily imported module
+            return _timed(function, phase)
+        return function
+
+    return register
+
+
+def _timedStart(startElement):
+    def wrapper(handler, name, attrs):
+        recorder.count(f"elements.{name}")
+        start = time.perf_counter()
+        try:
+            startElement(handler, name, attrs)
+        finally:
+            recorder.add("dispatch", time.perf_counter() - start)
+
+    return wrapper
+
+
+def _timedEnd(endElement):
+    def wrapper(handler, name):
+        start = time.perf_counter()
+        try:
+            endElement(handler, name)
+        finally:
+            recorder.add("dispatch", time.perf_counter() - start)
+
+    return wrapper
+
+
+def _kvgNamespaces():
+    """Return the dicts of the loaded modules of the kvg package, and of
+    __main__ if it is one of its scripts (kvg.py, kvg-lookup.py or a module
+    run with python -m)."""
+    packageDir = os.path.dirname(os.path.abspath(__file__))
+    ret = []
+    for name, module in list(sys.modules.items()):
+        if name == "__main__":
+            path = getattr(module, "__file__", None)
+            if path is None or os.path.dirname(os.path.abspath(path)) != packageDir:
+                continue
+        elif name != "kvg" and not name.startswith("kvg."):
+            continue
+        if all(module.__dict__ is not namespace for namespace in ret):
+            ret.append(module.__dict__)
+    return ret
+
+
+def enable():
+    """Start collecting measurements into a new Recorder, and return it."""
+    global recorder
+    if recorder is not None:
+        return recorder
+    from kvg.xmlhandler import BasicHandler
+
+    recorder = Recorder()
+    # Functions are replaced wherever the kvg modules bind them, so that
+    # names imported with from ... import are instrumented too. Other
+    # modules are left alone.
+    namespaces = _kvgNamespaces()
+    for function, phase in _instrumented:
+        wrapper = _timed(function, phase)
+        for namespace in namespaces:
+            for name, value in list(namespace.items()):
+                if value is function:
+                    _patched.append((namespace, name, function))
+                    namespace[name] = wrapper
+    # Parsers look the callbacks up on the handler, so patching the class
+    # covers every backend. Subclasses do not override them.
+    for name, wrap in (("startElement", _timedStart), ("endElement", _timedEnd)):
+        original = BasicHandler.__dict__[name]
+        _patched.append((BasicHandler, name, original))
+        setattr(BasicHandler, name, wrap(original))
+    return recorder
+
+
+def disable():
+    """Stop collecting measurements and return the Recorder, if any."""
+    global recorder
+    for target, name, original in reversed(_patched):
+        if isinstance(target, dict):
+            target[name] = original
+        else:
+            setattr(target, name, original)
+    _patched.clear()
+    ret, recorder = recorder, None
+    return ret
+
+
+class TimedReader:
+    """Binary stream wrapper timing reads as the io phase."""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self, size=-1):
+        start = time.perf_counter()
+        data = self.stream.read(size)
+        recorder.add("io", time.perf_counter() - start)
+        recorder.count("io.bytes", len(data))
+        return data
+
+    def close(self):
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def timedInputSource(path):
+    """Return a SAX InputSource reading path through a TimedReader. The
+    system id keeps the file name in error messages."""
+    from xml.sax.xmlreader import InputSource
+
+    source = InputSource(path)
+    source.setByteStream(TimedReader(open(path, "rb")))
+    return source
+
+
+@contextlib.contextmanager
+def profiling(path=None, out=None):
+    """Instrument the body of a with statement. The measurements are printed
+    as JSON to out (stderr by default) at the end. If path is given, the
+    body also runs under cProfile and its statistics are dumped to path, in
+    the format read by pstats."""
+    import cProfile
+
+    recorder = enable()
+    profile = cProfile.Profile() if path else None
+    try:
+        if profile is not None:
+            profile.enable()
+        yield recorder
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(path)
+        disable()
+        print(
+            json.dumps(recorder.asDict(), ensure_ascii=False, indent=1),
+            file=out or sys.stderr,
+        )
@@ -17,9 +17,14 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from reprlib import recursive_repr
+from sys import intern
+
 from ordered_set import OrderedSet
 
+from kvg.instrument import instrumented
 from kvg.utils import PYTHON_VERSION_MAJOR, canonicalId
+from kvg.validate import printDiagnostics, validateKanji
 from kvg.xmlhandler import BasicHandler
 
 if PYTHON_VERSION_MAJOR > 2:
@@ -101,13 +106,14 @@ class Kanji:
         return ret
 
     def outputStrokesNumbers(self, out, indent=0):
-        strokes = self.getStrokes()
-        for cpt, stroke in enumerate(strokes, start=1):
-            stroke.numberToSVG(out, cpt, indent + 1)
+        from kvg.svgwriter import strokeNumbersToSVG
+
+        out.write(strokeNumbersToSVG(self, indent))
 
     def outputStrokes(self, out, indent=0):
-        if self.strokes is not None:
-            self.strokes.toSVG(out, self.kId(), [0], [1])
+        from kvg.svgwriter import strokesToSVG
+
+        out.write(strokesToSVG(self, indent))
 
     def simplify(self):
         if self.strokes is not None:
@@ -118,41 +124,157 @@ class Kanji:
             return self.strokes.getStrokes()
         return []
 
+    def iterStrokes(self):
+        if self.strokes is not None:
+            return self.strokes.iterStrokes()
+        return iter(())
+
+    def getGroups(self):
+        """Return (id, group) pairs for all the stroke groups, in document
+        order. Ids are the ones written by outputStrokes(), without the kvg:
+        prefix: kId() for the root group, kId()-gN for the others."""
+        ret = []
+        if self.strokes is None:
+            return ret
+        kid = self.kId()
+        stack = [self.strokes]
+        while stack:
+            group = stack.pop()
+            ret.append((f"{kid}-g{len(ret)}" if ret else kid, group))
+            stack.extend(
+                child
+                for child in reversed(group.children)
+                if isinstance(child, StrokeGr)
+            )
+        return ret
+
+
+# Bits of StrokeGr._flags
+VARIANT = 0x1
+PARTIAL = 0x2
+TRAD_FORM = 0x4
+RADICAL_FORM = 0x8
+
+
+def _flagProperty(bit):
+    def getFlag(self):
+        return bool(self._flags & bit)
+
+    def setFlag(self, value):
+        if value:
+            self._flags |= bit
+        else:
+            self._flags &= ~bit
+
+    return property(getFlag, setFlag)
+
+
+def _componentProperty(slot):
+    # components() of the ancestors of a group depend on its element and
+    # original, so their cached results are dropped when either is set
+    from operator import attrgetter
+
+    def setValue(self, value):
+        setattr(self, slot, value)
+        if self.parent is not None:
+            self.parent.invalidate()
+
+    return property(attrgetter(slot), setValue)
+
 
 class StrokeGr:
     """Describes a stroke group belonging to a kanji as closely as possible to the XML format. Sub-stroke groups or strokes are available in the.children member. They can either be of class StrokeGr or Stroke so their type should be checked."""
 
+    # A full corpus holds hundreds of thousands of groups, so they are slotted
+    # and the boolean attributes are packed into a single int.
+    __slots__ = (
+        "parent",
+        "_element",
+        "_original",
+        "part",
+        "number",
+        "_flags",
+        "position",
+        "radical",
+        "phon",
+        "children",
+        "_strokes",
+        "_components",
+    )
+
+    variant = _flagProperty(VARIANT)
+    partial = _flagProperty(PARTIAL)
+    tradForm = _flagProperty(TRAD_FORM)
+    radicalForm = _flagProperty(RADICAL_FORM)
+    # Element of StrokeGr
+    element = _componentProperty("_element")
+    # A more common, safer element this one derives of
+    original = _componentProperty("_original")
+
     def __init__(self, parent=None):
         self.parent = parent
+        # Cached results of getStrokes() and components(), see invalidate()
+        self._strokes = None
+        self._components = None
         if parent:
-            parent.children.append(self)
-        # Element of StrokeGr
-        self.element: str | None = None
-        # A more common, safer element this one derives of
-        self.original = None
+            parent.addChild(self)
+        self._element: str | None = None
+        self._original: str | None = None
         self.part: int | None = None
         self.number: int | None = None
-        self.variant = False
-        self.partial = False
-        self.tradForm = False
-        self.radicalForm = False
+        # variant, partial, tradForm and radicalForm
+        self._flags = 0
         self.position = None
         self.radical = None
         self.phon = None
 
         self.children = []
 
+    @recursive_repr("{...}")
     def __repr__(self):
-        return repr(vars(self))
+        return repr(
+            {
+                "parent": self.parent,
+                "element": self.element,
+                "original": self.original,
+                "part": self.part,
+                "number": self.number,
+                "variant": self.variant,
+                "partial": self.partial,
+                "tradForm": self.tradForm,
+                "radicalForm": self.radicalForm,
+                "position": self.position,
+                "radical": self.radical,
+                "phon": self.phon,
+                "children": self.children,
+            }
+        )
 
     def setParent(self, parent):
         if self.parent is not None or parent is None:
             raise Exception(
                 "Set parent should only be set once! There is no cleanup for old parents."
             )
-        parent.children.append(self)
+        parent.addChild(self)
         self.parent = parent
 
+    def addChild(self, child):
+        """Append a group or stroke to the children of this group. Code that
+        modifies children directly must call invalidate() afterwards."""
+        self.children.append(child)
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop the cached getStrokes() and components() results of this
+        group and of all its ancestors. Setting element or original does it
+        for the ancestors of a group; the results depend on no other
+        attribute."""
+        group = self
+        while group is not None:
+            group._strokes = None
+            group._components = None
+            group = group.parent
+
     def toSVG(self, out, rootId, groupCpt=[0], strCpt=[1], indent=0):
         gid = rootId
         if groupCpt[0] != 0:
@@ -196,109 +318,193 @@ class StrokeGr:
         out.write("\t" * indent + "</g>\n")
 
     def components(self, simplified=True, recursive=False, level=0):
+        """Return the components of the direct sub-groups: their original if
+        simplified and they have one, their element otherwise. If recursive,
+        the list starts with level and is followed by the components of all
+        the sub-groups, each prefixed by its own level."""
+        cache = self._components
+        if cache is None:
+            cache = self._components = {}
+        key = (simplified, recursive)
+        ret = cache.get(key)
+        if ret is None:
+            ret = cache[key] = tuple(self._computeComponents(simplified, recursive))
+        if recursive and level:
+            # Levels are the only ints in the list
+            return [c + level if c.__class__ is int else c for c in ret]
+        return list(ret)
+
+    def _computeComponents(self, simplified, recursive):
         ret = []
-        childsComp = []
-        for child in self.children:
-            if isinstance(child, StrokeGr):
-                found = False
-                # Can we find the component in the child?
-                if simplified and child.original:
-                    ret.append(child.original)
-                    found = True
-                elif child.element:
-                    ret.append(child.element)
-                    found = True
-                # If not, the components we are looking for are the child's
-                # components - we also do that if we asked all the sub-components of the group
-                if not found or recursive:
-                    newLevel = level
-                    if found:
-                        newLevel += 1
-                    childsComp += child.components(simplified, recursive, newLevel)
-        if recursive and ret:
-            ret = [level] + ret + childsComp
+        stack = [(self, 0)]
+        while stack:
+            group, level = stack.pop()
+            found = []
+            subGroups = []
+            for child in group.children:
+                if isinstance(child, StrokeGr):
+                    # Can we find the component in the child?
+                    if simplified and child.original:
+                        found.append(child.original)
+                        subGroups.append((child, level + 1))
+                    elif child.element:
+                        found.append(child.element)
+                        subGroups.append((child, level + 1))
+                    else:
+                        # If not, the components we are looking for are the
+                        # child's components
+                        subGroups.append((child, level))
+            if not recursive:
+                # Components of unnamed sub-groups are not reported
+                return found
+            # A group without named sub-groups does not report the components
+            # of its descendants either
+            if found:
+                ret.append(level)
+                ret += found
+                stack += reversed(subGroups)
         return ret
 
     def simplify(self):
-        for child in self.children:
-            if isinstance(child, StrokeGr):
-                child.simplify()
-        if len(self.children) == 1 and isinstance(self.children[0], StrokeGr):
-            child = self.children[0]
-            # Check if there is no conflict
-            if child.element and self.element and child.element != self.element:
-                return
-            if child.original and self.original and child.original != self.original:
-                return
-            # Parts cannot be merged
-            if child.part and self.part and self.part != child.part:
-                return
-            if child.variant and self.variant and child.variant != self.variant:
-                return
-            if child.partial and self.partial and child.partial != self.partial:
-                return
-            if child.tradForm and self.tradForm and child.tradForm != self.tradForm:
-                return
-            if (
-                child.radicalForm
-                and self.radicalForm
-                and child.radicalForm != self.radicalForm
-            ):
-                return
-            # We want to preserve inner identical positions - we may have something at the top
-            # of another top element, for instance.
-            if child.position and self.position:
-                return
-            if child.radical and self.radical and child.radical != self.radical:
-                return
-            if child.phon and self.phon and child.phon != self.phon:
-                return
-
-            # Ok, let's merge!
-            self.children = child.children
-            if child.element:
-                self.element = child.element
-            if child.original:
-                self.original = child.original
-            if child.part:
-                self.part = child.part
-            if child.variant:
-                self.variant = child.variant
-            if child.partial:
-                self.partial = child.partial
-            if child.tradForm:
-                self.tradForm = child.tradForm
-            if child.radicalForm:
-                self.radicalForm = child.radicalForm
-            if child.position:
-                self.position = child.position
-            if child.radical:
-                self.radical = child.radical
-            if child.phon:
-                self.phon = child.phon
+        """Merge every group of the subtree whose only child is a group into
+        that child, unless their attributes conflict. Groups are handled
+        bottom-up in a single pass, so whole chains of such groups are
+        collapsed."""
+        # Breadth-first list of the groups: going through it backwards
+        # handles every group after all its sub-groups.
+        groups = [self]
+        for group in groups:
+            for child in group.children:
+                if isinstance(child, StrokeGr):
+                    groups.append(child)
+        for group in reversed(groups):
+            children = group.children
+            while len(children) == 1 and isinstance(children[0], StrokeGr):
+                child = children[0]
+                # Attributes set on both groups must agree. Parts cannot be
+                # merged, and inner identical positions are preserved: we may
+                # have something at the top of another top element, for
+                # instance. Boolean attributes never conflict.
+                if (
+                    (child.position and group.position)
+                    or (
+                        child.element
+                        and group.element
+                        and child.element != group.element
+                    )
+                    or (
+                        child.original
+                        and group.original
+                        and child.original != group.original
+                    )
+                    or (child.part and group.part and child.part != group.part)
+                    or (
+                        child.radical
+                        and group.radical
+                        and child.radical != group.radical
+                    )
+                    or (child.phon and group.phon and child.phon != group.phon)
+                ):
+                    break
+                group._merge(child)
+                children = group.children
+
+    def _merge(self, child):
+        """Replace the children of this group with the ones of child, its
+        only child, and take over the attributes child sets."""
+        self.children = child.children
+        for grandChild in self.children:
+            if isinstance(grandChild, StrokeGr):
+                grandChild.parent = self
+        self.invalidate()
+        if child.element:
+            self.element = child.element
+        if child.original:
+            self.original = child.original
+        if child.part:
+            self.part = child.part
+        self._flags |= child._flags
+        if child.position:
+            self.position = child.position
+        if child.radical:
+            self.radical = child.radical
+        if child.phon:
+            self.phon = child.phon
 
     def getStrokes(self):
-        ret = []
-        for child in self.children:
-            if isinstance(child, StrokeGr):
-                ret += child.getStrokes()
+        """Return all the strokes of the group, in order."""
+        if self._strokes is None:
+            self._cacheStrokes()
+        return list(self._strokes)
+
+    def _cacheStrokes(self):
+        # Post-order walk computing the strokes of every sub-group that has
+        # none cached from the strokes of its children.
+        stack = [(self, False)]
+        while stack:
+            group, childrenDone = stack.pop()
+            if childrenDone:
+                ret = []
+                for child in group.children:
+                    if isinstance(child, StrokeGr):
+                        ret += child._strokes
+                    else:
+                        ret.append(child)
+                group._strokes = tuple(ret)
             else:
-                ret.append(child)
-        return ret
+                stack.append((group, True))
+                for child in group.children:
+                    if isinstance(child, StrokeGr) and child._strokes is None:
+                        stack.append((child, False))
+
+    def iterStrokes(self):
+        """Yield all the strokes of the group, in order."""
+        stack = [iter(self.children)]
+        while stack:
+            for child in stack[-1]:
+                if isinstance(child, StrokeGr):
+                    stack.append(iter(child.children))
+                    break
+                yield child
+            else:
+                stack.pop()
 
 
 class Stroke:
     """A single stroke, containing its type and (optionally) its SVG data."""
 
+    __slots__ = ("element", "svg", "number_pos", "position", "_beziers")
+
+    # Strokes never have children, they all share this empty tuple
+    children = ()
+
     def __init__(self, parent=None):
         self.element: str | None = None
         self.svg: str | None = None  # represents the path data string in the SVG
         self.number_pos = None
         self.position = None
-        self.children = []
+        # (svg, control points) cache of the beziers property
+        self._beziers = None
+
+    @property
+    def beziers(self):
+        """Absolute cubic Bézier control points of the stroke, as a NumPy array
+        of shape (segments, 4, 2). Parsed from svg on first access."""
+        if self._beziers is None or self._beziers[0] is not self.svg:
+            from kvg.geometry import parsePath
+
+            self._beziers = (self.svg, parsePath(self.svg or ""))
+        return self._beziers[1]
 
     def __repr__(self):
-        return repr(vars(self))
+        return repr(
+            {
+                "element": self.element,
+                "svg": self.svg,
+                "number_pos": self.number_pos,
+                "position": self.position,
+            }
+        )
 
     def number_to_svg(self, out, number, indent=0):
         if self.number_pos:
@@ -320,17 +526,101 @@ class Stroke:
         out.write(s)
 
 
+def simplifyAll(kanjis):
+    """Simplify every Kanji of the kanjis iterable in place. This runs in the
+    calling process: simplifying a tree costs much less than sending it to a
+    worker process and back."""
+    for kanji in kanjis:
+        kanji.simplify()
+
+
+def _isTrue(value):
+    return value.lower() == "true"
+
+
+def _isExactlyTrue(value):
+    return value == "true"
+
+
+# Attribute schemas: XML attribute name -> (attribute name, converter). Adding
+# an attribute to the parsed model only takes a new entry here.
+GROUP_ATTRIBUTES = {
+    "kvg:element": ("element", intern),
+    "kvg:variant": ("variant", _isTrue),
+    "kvg:partial": ("partial", _isTrue),
+    "kvg:original": ("original", intern),
+    "kvg:part": ("part", int),
+    "kvg:number": ("number", int),
+    "kvg:tradForm": ("tradForm", _isExactlyTrue),
+    "kvg:radicalForm": ("radicalForm", _isExactlyTrue),
+    "kvg:position": ("position", intern),
+    "kvg:radical": ("radical", intern),
+    "kvg:phon": ("phon", intern),
+}
+
+STROKE_ATTRIBUTES = {
+    "kvg:type": ("element", intern),
+    "d": ("svg", str),
+}
+
+
+def compileSchema(schema, flagBits=None):
+    """Precompute the decoding table of a schema. Attributes found in
+    flagBits are packed into the _flags bitfield instead of being set by
+    name."""
+    if flagBits is None:
+        flagBits = {}
+    return {
+        name: (field, flagBits.get(field, 0), convert)
+        for name, (field, convert) in schema.items()
+    }
+
+
+_groupDecoder = compileSchema(
+    GROUP_ATTRIBUTES,
+    {
+        "variant": VARIANT,
+        "partial": PARTIAL,
+        "tradForm": TRAD_FORM,
+        "radicalForm": RADICAL_FORM,
+    },
+)
+_strokeDecoder = compileSchema(STROKE_ATTRIBUTES)
+
+
+@instrumented("decode")
+def decodeAttributes(obj, attrs, decoder):
+    """Set the attributes of a freshly created obj from the XML attributes
+    attrs in a single pass, using a table built by compileSchema().
+    Attributes not in the schema are ignored."""
+    get = decoder.get
+    flags = 0
+    for name, value in attrs.items():
+        entry = get(name)
+        if entry is not None:
+            field, bit, convert = entry
+            if not bit:
+                setattr(obj, field, convert(value))
+            elif convert(value):
+                flags |= bit
+    if flags:
+        obj._flags |= flags
+
+
 class KanjisHandler(BasicHandler):
-    """XML handler for parsing kanji files. It can handle single-kanji files or aggregation files. After parsing, the kanjis are accessible through the kanjis member, indexed by their svg file name."""
+    """XML handler for parsing kanji files. It can handle single-kanji files or aggregation files. After parsing, the kanjis are accessible through the kanjis member, indexed by their svg file name. Unless validate is False, the problems found by validateKanji() are printed as each kanji is parsed."""
 
-    def __init__(self):
+    def __init__(self, validate=True):
         BasicHandler.__init__(self)
         self.kanji = None
         self.kanjis = {}
         self.group = None
         self.groups = []
-        self.compCpt = {}
+        self.validate = validate
         self.metComponents = OrderedSet([])
+        # If set, parsed kanji are passed to this callable instead of being
+        # stored in kanjis
+        self.onKanji = None
 
     def handle_start_kanji(self, attrs):
         if self.kanji is not None:
@@ -353,7 +643,12 @@ class KanjisHandler(BasicHandler):
         if self.kanji is None:
             raise Exception("No kanji object to assign strokes to.")
         self.kanji.strokes = self.groups[0]
-        self.kanjis[self.kanji.code] = self.kanji
+        if self.validate:
+            printDiagnostics(validateKanji(self.kanji))
+        if self.onKanji is not None:
+            self.onKanji(self.kanji)
+        else:
+            self.kanjis[self.kanji.code] = self.kanji
         self.groups = []
         self.kanji = None
 
@@ -363,28 +658,7 @@ class KanjisHandler(BasicHandler):
         group = StrokeGr(self.group)
 
         # Now parse group attributes
-        if "kvg:element" in attrs:
-            group.element = unicode(attrs["kvg:element"])
-        if "kvg:variant" in attrs:
-            group.variant = str(attrs["kvg:variant"]).lower() == "true"
-        if "kvg:partial" in attrs:
-            group.partial = str(attrs["kvg:partial"]).lower() == "true"
-        if "kvg:original" in attrs:
-            group.original = unicode(attrs["kvg:original"])
-        if "kvg:part" in attrs:
-            group.part = int(attrs["kvg:part"])
-        if "kvg:number" in attrs:
-            group.number = int(attrs["kvg:number"])
-        if "kvg:tradForm" in attrs and str(attrs["kvg:tradForm"]) == "true":
-            group.tradForm = True
-        if "kvg:radicalForm" in attrs and str(attrs["kvg:radicalForm"]) == "true":
-            group.radicalForm = True
-        if "kvg:position" in attrs:
-            group.position = unicode(attrs["kvg:position"])
-        if "kvg:radical" in attrs:
-            group.radical = unicode(attrs["kvg:radical"])
-        if "kvg:phon" in attrs:
-            group.phon = unicode(attrs["kvg:phon"])
+        decodeAttributes(group, attrs, _groupDecoder)
 
         self.group = group
 
@@ -393,41 +667,6 @@ class KanjisHandler(BasicHandler):
         if group.original:
             self.metComponents.add(group.original)
 
-        if group.number:
-            if not group.part:
-                print(f"{self.kanji.kId()}: Number specified, but part missing")
-            # The group must exist already
-            if group.part and group.part > 1:
-                if (
-                    group.element
-                    and (group.element + str(group.number)) not in self.compCpt
-                ):
-                    print(f"{self.kanji.kId()}: Missing numbered group")
-                elif (
-                    group.element
-                    and self.compCpt[group.element + str(group.number)]
-                    != group.part - 1
-                ):
-                    print(f"{self.kanji.kId()}: Incorrectly numbered group")
-            elif group.element and (group.element + str(group.number)) in self.compCpt:
-                print(f"{self.kanji.kId()}: Duplicate numbered group")
-            if group.element:
-                self.compCpt[group.element + str(group.number)] = group.part
-        elif group.part:
-            # The group must exist already
-            if group.element and group.element not in self.compCpt:
-                if group.part and group.part > 1:
-                    print(f"{self.kanji.kId()}: Incorrectly started multi-part group")
-            elif (
-                group.element
-                and group.part
-                and self.compCpt[group.element] != group.part - 1
-            ):
-                if group.part > 1:
-                    print(f"{self.kanji.kId()}: Incorrectly splitted multi-part group")
-            if group.element and group.part:
-                self.compCpt[group.element] = group.part
-
     def handle_end_g(self):
         if self.group and self.group.parent is None:
             self.groups.append(self.group)
@@ -438,18 +677,16 @@ class KanjisHandler(BasicHandler):
         if self.kanji is None or self.group is None:
             raise Exception("Stroke must be inside a kanji and group!")
         stroke = Stroke(self.group)
-        if "kvg:type" in attrs:
-            stroke.element = unicode(attrs["kvg:type"])
-        if "d" in attrs:
-            stroke.svg = unicode(attrs["d"])
-        self.group.children.append(stroke)
+        decodeAttributes(stroke, attrs, _strokeDecoder)
+        self.group.addChild(stroke)
 
 
 class SVGHandler(BasicHandler):
-    """SVG handler for parsing final kanji files. It can handle single-kanji files or aggregation files. After parsing, the kanji are accessible through the kanjis member, indexed by their svg file name."""
+    """SVG handler for parsing final kanji files. It can handle single-kanji files or aggregation files. After parsing, the kanji are accessible through the kanjis member, indexed by their svg file name. Unless validate is False, the problems found by validateKanji() are printed as each kanji is parsed."""
 
-    def __init__(self):
+    def __init__(self, validate=True):
         BasicHandler.__init__(self)
+        self.validate = validate
         self.kanjis = {}
         self.current_kanji = None
         self.groups = []
@@ -471,33 +708,11 @@ class SVGHandler(BasicHandler):
                 raise Exception(f"Invalid root group id type ({str(attrs['id'])})")
             self.current_kanji = Kanji(*idVariant)
             self.kanjis[self.current_kanji.code] = self.current_kanji
-            self.compCpt = {}
         else:
             group.setParent(self.groups[-1])
 
         # Now parse group attributes
-        if "kvg:element" in attrs:
-            group.element = unicode(attrs["kvg:element"])
-        if "kvg:variant" in attrs:
-            group.variant = str(attrs["kvg:variant"]).lower() == "true"
-        if "kvg:partial" in attrs:
-            group.partial = str(attrs["kvg:partial"]).lower() == "true"
-        if "kvg:original" in attrs:
-            group.original = unicode(attrs["kvg:original"])
-        if "kvg:part" in attrs:
-            group.part = int(attrs["kvg:part"])
-        if "kvg:number" in attrs:
-            group.number = int(attrs["kvg:number"])
-        if "kvg:tradForm" in attrs and str(attrs["kvg:tradForm"]) == "true":
-            group.tradForm = True
-        if "kvg:radicalForm" in attrs and str(attrs["kvg:radicalForm"]) == "true":
-            group.radicalForm = True
-        if "kvg:position" in attrs:
-            group.position = unicode(attrs["kvg:position"])
-        if "kvg:radical" in attrs:
-            group.radical = unicode(attrs["kvg:radical"])
-        if "kvg:phon" in attrs:
-            group.phon = unicode(attrs["kvg:phon"])
+        decodeAttributes(group, attrs, _groupDecoder)
 
         self.groups.append(group)
 
@@ -506,49 +721,6 @@ class SVGHandler(BasicHandler):
         if group.original:
             self.met_components.add(group.original)
 
-        if group.number:
-            if not group.part:
-                if self.current_kanji:
-                    print(
-                        f"{self.current_kanji.kId()}: Number specified, but part missing"
-                    )
-            # The group must exist already
-            if group.part and group.part > 1:
-                if (
-                    group.element
-                    and group.element + str(group.number) not in self.compCpt
-                ):
-                    if self.current_kanji:
-                        print(f"{self.current_kanji.kId()}: Missing numbered group")
-                elif (
-                    group.element
-                    and group.part
-                    and self.compCpt[group.element + str(group.number)]
-                    != group.part - 1
-                ):
-                    if self.current_kanji:
-                        print(f"{self.current_kanji.kId()}: Incorrectly numbered group")
-            elif group.element and (group.element + str(group.number)) in self.compCpt:
-                if self.current_kanji:
-                    print(f"{self.current_kanji.kId()}: Duplicate numbered group")
-            if group.element and group.part:
-                self.compCpt[group.element + str(group.number)] = group.part
-        elif group.part:
-            # The group must exist already
-            if group.part and group.part > 1:
-                if group.element and group.element not in self.compCpt:
-                    if self.current_kanji:
-                        print(
-                            f"{self.current_kanji.kId()}: Incorrectly started multi-part group"
-                        )
-                elif group.element and self.compCpt[group.element] != group.part - 1:
-                    if self.current_kanji:
-                        print(
-                            f"{self.current_kanji.kId()}: Incorrectly splitted multi-part group"
-                        )
-            if group.element and group.part:
-                self.compCpt[group.element] = group.part
-
     def handle_end_g(self):
         if len(self.groups) == 0:
             return
@@ -557,14 +729,13 @@ class SVGHandler(BasicHandler):
         if len(self.groups) == 1:  # index 1 - ignore root group
             if self.current_kanji:
                 self.current_kanji.strokes = group
+                if self.validate:
+                    printDiagnostics(validateKanji(self.current_kanji))
             self.current_kanji = None
             self.groups = []
 
     def handle_start_path(self, attrs):
         parent = None if len(self.groups) == 0 else self.groups[-1]
         stroke = Stroke(parent)
-        if "kvg:type" in attrs:
-            stroke.element = unicode(attrs["kvg:type"])
-        if "d" in attrs:
-            stroke.svg = unicode(attrs["d"])
-        self.groups[-1].children.append(stroke)
+        decodeAttributes(stroke, attrs, _strokeDecoder)
+        self.groups[-1].addChild(stroke)
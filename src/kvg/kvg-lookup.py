@@ -17,39 +17,71 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import contextlib
 import sys
 
-from kvg.kanjivg import Stroke, StrokeGr
-from kvg.utils import PYTHON_VERSION_MAJOR, canonicalId, listSvgFiles, readXmlFile
-
-if PYTHON_VERSION_MAJOR > 2:
-
-    def unicode(s):
-        return s
-
-    def unichr(c):
-        return chr(c)
-
+from kvg import instrument
+from kvg.lookup import (
+    DEFAULT_SOCKET,
+    LookupClient,
+    LookupData,
+    commands,
+    serve,
+    serverRunning,
+)
+from kvg.utils import PYTHON_VERSION_MAJOR
 
-helpString = """Usage: %s <find-svg|find-xml> <element1> [...elementN]
+helpString = """Usage: %s <find-svg|find-xml|find-component> <element1> [...elementN] [--server[=SOCKET]] [--profile[=FILE]]
+       %s serve [--socket=SOCKET] [--profile[=FILE]]
 
 Recognized commands:
   find-svg      Find and view summary of an SVG file for the given 
                 element in ./kanji/ directory.
   find-xml      Find and view summary of a <kanji> entry for
-                the given element from ./kanjivg.xml file.
+                the given element from ./kanjivg.xml file. The entry
+                is read from ./kanjivg.xml.kvgsnap if that snapshot is
+                up to date, or parsed alone using the ./kanjivg.xml.idx
+                offset index otherwise.
+  find-component
+                List the kanji of ./kanjivg.xml containing the given
+                component, either as element or original. Results can
+                be filtered with --position=, --radical= and --part=.
+                The ./kanjivg.xml.components index is built on first
+                use and whenever kanjivg.xml changes.
+  serve         Load ./kanji/ and ./kanjivg.xml once and answer the
+                commands above on a Unix socket (./kvg-lookup.sock by
+                default) until interrupted. Restart it when the data
+                changes.
+
+Options:
+  --server[=SOCKET]
+                Send the commands to a running server instead of
+                reading the data. The output is the same.
+  --profile[=FILE]
+                Print counters and the time spent per phase (io, parse,
+                dispatch, decode, validate, snapshot.read...) as JSON on
+                the standard error at the end. With FILE, also run under
+                cProfile and write its statistics to FILE, for pstats.
 
 Parameters:
   element       May either be the singular character, e.g. 並 or its
-                unicode code-point e.g. 4e26.
+                unicode code-point e.g. 4e26. For find-component, the
+                component itself, e.g. 氵. A single - reads the elements
+                from the standard input, one per line. All the elements
+                are looked up in one pass over the data, and results are
+                printed in the order of the elements.
 
 Examples:
   %s find-svg 並      Will list SVG files describing given character.
   %s find-xml 4e26    Will list <kanji> entry for the same character.
+  %s find-component 氵 --position=left
+                      Will list kanji having 氵 on their left side.
 """ % (
     sys.argv[0],
     sys.argv[0],
     sys.argv[0],
+    sys.argv[0],
+    sys.argv[0],
 )
 
 # Output helper
@@ -72,74 +104,53 @@ def writeOutput(data, output):
     output.write(encoded)
 
 
-# Summary generators
-
-
-def strokeGroupSummary(gr, indent=0):
-    if not isinstance(gr, StrokeGr):
-        raise Exception("Invalid structure")
-
-    ret = unicode(" " * indent * 4)
-    # ret += gr.element if gr.element is not None and len(gr.element) > 0 else "・"
-    ret += "- group"
-    if gr.element is not None and len(gr.element) > 0:
-        ret += f" {gr.element}"
-    if gr.position:
-        ret += f" ({gr.position})"
-
-    childStrokes = [
-        s.element for s in gr.children if isinstance(s, Stroke) and s.element
-    ]
-    if len(childStrokes):
-        ret += "\n%s- strokes: %s" % (" " * (indent + 1) * 4, " ".join(childStrokes))
-
-    ret += "\n"
-
-    for g in gr.children:
-        if isinstance(g, StrokeGr):
-            ret += strokeGroupSummary(g, indent + 1)
+# Commands
 
-    return ret
+data = LookupData()
 
 
-def characterSummary(c):
-    ret = f"Character summary: {c.code} ({c.strokes.element})"
-    if c.variant:
-        ret += f" - variant: {c.variant}"
-    ret += "\n"
-    ret += strokeGroupSummary(c.strokes)
-    return ret
+def commandFindSvg(arg):
+    writeOutput(commands["find-svg"](data, arg), sys.stdout)
 
 
-# Commands
+def commandFindXml(arg):
+    writeOutput(commands["find-xml"](data, arg), sys.stdout)
 
 
-def commandFindSvg(arg):
-    id = canonicalId(arg)
-    kanji = [(f.path, f.read()) for f in listSvgFiles("./kanji/") if f.id == id]
-    print("Found %d files matching ID %s" % (len(kanji), id))
-    for i, (path, c) in enumerate(kanji):
-        print("\nFile %s (%d/%d):" % (path, i + 1, len(kanji)))
-        writeOutput(characterSummary(c) + "\n", sys.stdout)
+def commandFindComponent(arg, position=None, radical=None, part=None):
+    output = commands["find-component"](data, arg, position, radical, part)
+    writeOutput(output, sys.stdout)
 
 
-def commandFindXml(arg):
-    id = canonicalId(arg)
-    files = readXmlFile("./kanjivg.xml")
-    if id in files:
-        writeOutput(characterSummary(files[id]) + "\n", sys.stdout)
-    else:
-        writeOutput(
-            unicode("Character %s (%s) not found.\n") % (id, unichr(int(id, 16))),
-            sys.stdout,
-        )
+def commandServe(arg, socket=None):
+    path = socket or DEFAULT_SOCKET
+    # Checked before loading the data, serve() checks again before binding
+    if serverRunning(path):
+        print(f"A lookup server is already running on {path}", file=sys.stderr)
+        sys.exit(1)
+    data.load()
+    print(f"Serving lookups on {path}", flush=True)
+    try:
+        serve(data, path)
+    except Exception as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
 
 
 # Main wrapper
 
+# command: (function, minimum argument count, accepted --options)
 actions = {
-    "find-svg": (commandFindSvg, 2),
-    "find-xml": (commandFindXml, 2),
+    "find-svg": (commandFindSvg, 2, []),
+    "find-xml": (commandFindXml, 2, []),
+    "find-component": (commandFindComponent, 2, ["position", "radical", "part"]),
+    "serve": (commandServe, 1, ["socket"]),
+}
+# option: test its value must pass, for the options that need a value
+optionValues = {
+    "position": bool,
+    "radical": bool,
+    "part": str.isdecimal,
 }
 
 if __name__ == "__main__":
@@ -151,14 +162,59 @@ if __name__ == "__main__":
         print(helpString)
         sys.exit(0)
 
-    action = actions[sys.argv[1]][0]
-    args = sys.argv[2:]
+    command = sys.argv[1]
+    action, _, allowedOptions = actions[command]
+    options = {}
+    for a in sys.argv[2:]:
+        if a.startswith("--"):
+            name, _, value = a[2:].partition("=")
+            options[name] = value
+    args = []
+    for a in sys.argv[2:]:
+        if a == "-":
+            args += [line.strip() for line in sys.stdin if line.strip()]
+        elif not a.startswith("--"):
+            args.append(a)
+    server = options.pop("server", None)
+    profile = options.pop("profile", None)
+    if (
+        any(o not in allowedOptions for o in options)
+        or (server is not None and command == "serve")
+        or any(
+            name in optionValues and not optionValues[name](value)
+            for name, value in options.items()
+        )
+    ):
+        print(helpString)
+        sys.exit(0)
 
-    if len(args) == 0:
-        action(None)
-    else:
-        for f in args:
-            action(f)
+    with contextlib.ExitStack() as stack:
+        if profile is not None:
+            recorder = stack.enter_context(instrument.profiling(profile or None))
+            stack.enter_context(recorder.phase(command))
+        if server is not None:
+            try:
+                client = LookupClient(server or DEFAULT_SOCKET)
+            except OSError as e:
+                print(
+                    f"No lookup server on {server or DEFAULT_SOCKET}: {e}",
+                    file=sys.stderr,
+                )
+                sys.exit(1)
+            try:
+                for f in args:
+                    writeOutput(client.query(command, f, **options), sys.stdout)
+            except Exception as e:
+                print(e, file=sys.stderr)
+                sys.exit(1)
+            finally:
+                client.close()
+        elif len(args) == 0:
+            action(None, **options)
+        else:
+            data.prefetch(command, args)
+            for f in args:
+                action(f, **options)
 
     if lossInWeirdEncoding:
         notice = """\nNotice: SOME CHARACTERS IN THE OUTPUT HAVE BEEN REPLACED WITH QUESTION MARKS.
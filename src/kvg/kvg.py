@@ -16,12 +16,26 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import contextlib
 import datetime
+import hashlib
+import itertools
+import json
 import os
 import re
 import sys
 
+from kvg import instrument
+from kvg.fileindex import FILE_INDEX
+from kvg.instrument import instrumented
 from kvg.kanjivg import LICENSE_STRING
+from kvg.utils import (
+    XML_ROOT_END,
+    XML_ROOT_START,
+    mapInOrder,
+    writeXmlIndex,
+    xmlIndexPath,
+)
 
 pathre = re.compile(r'<path .*d="([^"]*)".*/>')
 
@@ -29,7 +43,51 @@ helpString = """Usage: %s <command> [ kanji files ]
 Recognized commands:
   split file1 [ file2 ... ]       extract path data into a -paths suffixed file
   merge file1 [ file2 ... ]       merge path data from -paths suffixed file
-  release                         create single release file""" % (sys.argv[0],)
+  release [--incremental]         create single release file and its
+                                  kanjivg.xml.idx offset index. With
+                                  --incremental, only files changed since
+                                  the last release (as recorded in
+                                  kanjivg.xml.manifest) are extracted again
+  release --archives [--workers=N]
+                                  also create the dated .xml.gz, -all.zip
+                                  and -main.zip public release archives, in
+                                  a single parallel pass over kanji/. Cannot
+                                  be combined with --incremental
+  emit source [--output=DIR] [--workers=N]
+                                  write one SVG file per kanji of source (a
+                                  release file or a directory of SVG files)
+                                  into DIR (default svg/), in parallel
+  lint [ path ] [--workers=N]     check the part and number attributes of
+                                  every SVG file of path (a file or a
+                                  directory, kanji/ by default) in parallel.
+                                  Prints one JSON object per problem found
+                                  and exits with status 1 if there is any
+  index [ directory ] [--output=FILE] [--binary] [--full]
+                                  write the character -> files index of
+                                  directory (kanji/ by default) to FILE
+                                  (kvg-index.json by default), like
+                                  make-index.pl. An existing index is only
+                                  updated with the files added or removed
+                                  since it was written, unless --full is
+                                  given. --binary also writes the
+                                  memory-mappable kvg-index.bin variant
+  pack source [--output=FILE] [--verify]
+                                  write the path data of source (a release
+                                  file or a directory of SVG files) to the
+                                  path store FILE (source.paths by
+                                  default). --verify reads the store back
+                                  and compares it with source
+  diff old new [--workers=N]      compare two versions of the corpus (release
+                                  files or directories of SVG files) in
+                                  parallel. Prints one JSON object per
+                                  added, removed or modified kanji, with the
+                                  ids of the groups that changed, and exits
+                                  with status 1 if there is any
+
+Any command also accepts --profile[=FILE]: counters and time spent per
+phase (io, parse, dispatch, decode, validate, release.*...) are printed as
+JSON on the standard error at the end. With FILE, the command also runs
+under cProfile and its statistics are written to FILE, for pstats.""" % (sys.argv[0],)
 
 
 def createPathsSVG(f):
@@ -68,50 +126,383 @@ def mergePathsSVG(f):
     open(f, "w", encoding="utf-8").write(s)
 
 
-def release():
-    datadir = "kanji"
-    idMatchString = '<g id="kvg:StrokePaths_'
-    allfiles = os.listdir(datadir)
-    files = [f for f in allfiles if len(f) == 9]
-    del allfiles
-    files.sort()
-
-    with open("kanjivg.xml", "w", encoding="utf8") as out:
-        _extracted_from_release_(out, files, datadir, idMatchString)
-    print("%d kanji emitted" % len(files))
+RELEASE_MANIFEST = "kanjivg.xml.manifest"
+# Files of kanji/ that go into a release: all the SVG files into the -all.zip
+# archive, and the main ones, named after a kanji without variant, into
+# kanjivg.xml and the -main.zip archive
+RELEASE_FILE = re.compile(r"[0-9a-f]{5}(-[A-Za-z0-9]+)?\.svg")
+MAIN_RELEASE_FILE = re.compile(r"[0-9a-f]{5}\.svg")
+ID_MATCH_STRING = '<g id="kvg:StrokePaths_'
 
 
-# TODO Rename this here and in `release`
-def _extracted_from_release_(out, files, datadir, idMatchString):
-    out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-    out.write("<!--\n")
-    out.write(LICENSE_STRING)
-    out.write(
-        "\nThis file has been generated on %s, using the latest KanjiVG data\nto this date."
-        % (datetime.date.today())
+def extractKanji(data):
+    """Turn the content of a kanji/ SVG file into the <kanji> element of the
+    release file. Returns the kanji id and the element."""
+    # Same newline handling as reading the file in text mode
+    data = data.replace("\r\n", "\n").replace("\r", "\n")
+    data = data[data.find("<svg ") :]
+    data = data[data.find(ID_MATCH_STRING) + len(ID_MATCH_STRING) :]
+    kidend = data.find('"')
+    kid = data[:kidend]
+    data = (
+        '<kanji id="kvg:kanji_%s">' % (kid,)
+        + data[data.find("\n") : data.find('<g id="kvg:StrokeNumbers_') - 5]
+        + "</kanji>"
     )
-    out.write("\n-->\n")
-    out.write("<kanjivg xmlns:kvg='http://kanjivg.tagaini.net'>\n")
+    return kid, data
+
+
+def readReleaseManifest(release="kanjivg.xml", path=RELEASE_MANIFEST):
+    """Return the per-file entries of the manifest, if it describes the
+    current release file, or an empty dict."""
+    try:
+        with open(path, encoding="utf8") as f:
+            manifest = json.load(f)
+        st = os.stat(release)
+        if manifest.get("version") == 1 and manifest["release"] == [
+            st.st_size,
+            st.st_mtime_ns,
+        ]:
+            return manifest["files"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return {}
+
+
+@instrumented("release.manifest")
+def writeReleaseManifest(files, release="kanjivg.xml", path=RELEASE_MANIFEST):
+    st = os.stat(release)
+    with open(path, "w", encoding="utf8") as out:
+        json.dump(
+            {"version": 1, "release": [st.st_size, st.st_mtime_ns], "files": files},
+            out,
+            ensure_ascii=False,
+        )
+
+
+@instrumented("release.extract")
+def extractReleaseFiles(datadir, files, manifest, previous):
+    """Return the (kanji id, UTF-8 element) of each file, and their manifest
+    entries. Files whose size and mtime, or failing that content hash, match
+    their manifest entry are not extracted again: their element is copied
+    from previous, the release file the manifest was written for."""
+    fragments = []
+    entries = {}
+    reused = 0
     for f in files:
-        data = open(os.path.join(datadir, f), encoding="utf8").read()
-        data = data.replace("\r\n", "\n")
-        data = data[data.find("<svg ") :]
-        data = data[data.find(idMatchString) + len(idMatchString) :]
-        kidend = data.find('"')
-        data = (
-            '<kanji id="kvg:kanji_%s">' % (data[:kidend],)
-            + data[data.find("\n") : data.find('<g id="kvg:StrokeNumbers_') - 5]
-            + "</kanji>\n"
+        path = os.path.join(datadir, f)
+        st = os.stat(path)
+        entry = manifest.get(f)
+        if entry is None or entry[0] != st.st_size or entry[1] != st.st_mtime_ns:
+            raw = open(path, "rb").read()
+            digest = hashlib.sha1(raw).hexdigest()
+            if entry is None or entry[2] != digest:
+                kid, data = extractKanji(raw.decode("utf8"))
+                entries[f] = [st.st_size, st.st_mtime_ns, digest, kid]
+                fragments.append((kid, data.encode("utf8")))
+                continue
+        size, mtime, digest, kid, start, end = entry
+        entries[f] = [st.st_size, st.st_mtime_ns, digest, kid]
+        fragments.append((kid, previous[start:end]))
+        reused += 1
+    if instrument.recorder is not None:
+        instrument.recorder.count("release.files", len(files))
+        instrument.recorder.count("release.reused", reused)
+    return fragments, entries
+
+
+def workerCount(workers):
+    """Return the number of workers asked for by a --workers option: one per
+    CPU if it is not given or has no value."""
+    if workers is None or workers is True:
+        return os.cpu_count() or 1
+    return int(workers)
+
+
+def release(incremental=False, archives=False, workers=None):
+    if incremental and archives:
+        print("--incremental cannot be combined with --archives")
+        sys.exit(1)
+    datadir = "kanji"
+    allfiles = sorted(f for f in os.listdir(datadir) if RELEASE_FILE.fullmatch(f))
+    files = [f for f in allfiles if MAIN_RELEASE_FILE.fullmatch(f)]
+
+    if archives:
+        ranges, _, entries = releaseWithArchives(
+            datadir, allfiles, workerCount(workers)
+        )
+        fragments = [(entries[f][3], None) for f in files]
+    else:
+        # A full release ignores the manifest, but writes one for the next
+        # incremental release.
+        manifest = readReleaseManifest() if incremental else {}
+        previous = open("kanjivg.xml", "rb").read() if manifest else None
+        fragments, entries = extractReleaseFiles(datadir, files, manifest, previous)
+        del previous
+        with open("kanjivg.xml", "wb") as out:
+            ranges, _ = writeReleaseXml(out, fragments)
+    index = {}
+    for f, (kid, _), (start, end) in zip(files, fragments, ranges):
+        index[kid] = (start, end)
+        entries[f] += [start, end]
+    writeXmlIndex(index, xmlIndexPath("kanjivg.xml"), "kanjivg.xml")
+    writeReleaseManifest(entries)
+    print("%d kanji emitted" % len(files))
+
+
+def _readReleaseFile(path):
+    """Return the content of a file of kanji/, its manifest entry and, for a
+    main file, its release element."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    st = os.stat(path)
+    entry = [st.st_size, st.st_mtime_ns, hashlib.sha1(raw).hexdigest()]
+    fragment = None
+    if MAIN_RELEASE_FILE.fullmatch(os.path.basename(path)):
+        kid, data = extractKanji(raw.decode("utf8"))
+        entry.append(kid)
+        fragment = data.encode("utf8")
+    return raw, entry, fragment
+
+
+def _readReleaseFiles(paths):
+    return [_readReleaseFile(path) for path in paths]
+
+
+class _Tee:
+    """Binary stream writing to several streams at once."""
+
+    def __init__(self, *outs):
+        self.outs = outs
+
+    def write(self, data):
+        for out in self.outs:
+            out.write(data)
+
+
+@instrumented("release.archives")
+def releaseWithArchives(datadir, files, workers):
+    """Write kanjivg.xml together with the dated archives of a public
+    release: the gzipped release file, a zip of all the SVG files and a zip
+    of the main (variant-less) ones. Files are extracted in a pool of
+    workers, each file being read once, and results are streamed in file
+    order to all the outputs at once. Returns the element ranges and size of
+    kanjivg.xml and the manifest entries of the main files."""
+    import gzip
+    import zipfile
+
+    # The zips are compressed at level 9 like updatepublic.ts did, the .xml.gz
+    # at the gzip default level 6 like both update scripts did
+    date = datetime.date.today().strftime("%Y%m%d")
+    paths = [os.path.join(datadir, f) for f in files]
+    entries = {}
+
+    def fragments(results, allZip, mainZip):
+        for f, path, (raw, entry, fragment) in zip(files, paths, results):
+            # writestr() fills in the ZipInfo, so each archive needs its own
+            for archive in (allZip, mainZip) if fragment is not None else (allZip,):
+                zinfo = zipfile.ZipInfo.from_file(path, f"kanji/{f}")
+                archive.writestr(zinfo, raw, zipfile.ZIP_DEFLATED, 9)
+            if fragment is not None:
+                entries[f] = entry
+                yield entry[3], fragment
+
+    with contextlib.ExitStack() as stack:
+        if workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+            chunks = [paths[i : i + 64] for i in range(0, len(paths), 64)]
+            results = itertools.chain.from_iterable(
+                mapInOrder(executor, _readReleaseFiles, chunks, 2 * workers)
+            )
+        else:
+            results = map(_readReleaseFile, paths)
+        out = stack.enter_context(open("kanjivg.xml", "wb"))
+        gzOut = stack.enter_context(
+            gzip.GzipFile(
+                "kanjivg.xml",
+                "wb",
+                6,
+                fileobj=stack.enter_context(open(f"kanjivg-{date}.xml.gz", "wb")),
+            )
+        )
+        allZip = stack.enter_context(zipfile.ZipFile(f"kanjivg-{date}-all.zip", "w"))
+        mainZip = stack.enter_context(zipfile.ZipFile(f"kanjivg-{date}-main.zip", "w"))
+        ranges, size = writeReleaseXml(
+            _Tee(out, gzOut), fragments(results, allZip, mainZip)
         )
-        out.write(data)
-    out.write("</kanjivg>\n")
+    return ranges, size, entries
 
 
+@instrumented("release.write")
+def writeReleaseXml(out, fragments):
+    """Write the release file from (kanji id, UTF-8 element) pairs to the
+    binary stream out. Returns the byte range of each element and the size
+    of the file."""
+    pos = 0
+
+    def write(s):
+        nonlocal pos
+        out.write(s)
+        pos += len(s)
+
+    write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+    write(b"<!--\n")
+    write(LICENSE_STRING.encode("utf8"))
+    write(
+        (
+            "\nThis file has been generated on %s, using the latest KanjiVG data\nto this date."
+            % (datetime.date.today())
+        ).encode("utf8")
+    )
+    write(b"\n-->\n")
+    write(XML_ROOT_START)
+    ranges = []
+    for _, data in fragments:
+        start = pos
+        write(data)
+        ranges.append((start, pos))
+        write(b"\n")
+    write(XML_ROOT_END)
+    return ranges, pos
+
+
+def emit(source, output="svg", workers=None):
+    from kvg.svgwriter import writeSvgFiles
+    from kvg.utils import iterXmlFile, loadAllSvg
+
+    workers = workerCount(workers)
+    if os.path.isdir(source):
+        kanjis = loadAllSvg(source, workers, validate=False)
+    else:
+        kanjis = iterXmlFile(source, validate=False)
+    count = writeSvgFiles(kanjis, output, workers)
+    print(f"Wrote {count} files to {output}")
+
+
+def lint(path="kanji", workers=None):
+    from kvg.validate import lintFiles
+
+    workers = workerCount(workers)
+    if os.path.isdir(path):
+        paths = [os.path.join(path, f) for f in sorted(os.listdir(path))]
+    else:
+        paths = [path]
+    found = False
+    for f, diagnostics in lintFiles(paths, workers):
+        for diagnostic in diagnostics:
+            found = True
+            print(json.dumps({"file": f, **diagnostic._asdict()}, ensure_ascii=False))
+    if found:
+        sys.exit(1)
+
+
+def index(directory="kanji", output=FILE_INDEX, binary=False, full=False):
+    from kvg.fileindex import (
+        binaryIndexPath,
+        buildFileIndex,
+        readFileIndex,
+        updateFileIndex,
+        writeBinaryFileIndex,
+        writeFileIndex,
+    )
+
+    binaryPath = binaryIndexPath(output)
+    # Only file names matter, and adding, removing or renaming a file
+    # updates the mtime of its directory.
+    upToDate = (
+        not full
+        and os.path.exists(output)
+        and os.stat(output).st_mtime_ns >= os.stat(directory).st_mtime_ns
+    )
+    if upToDate and (not binary or os.path.exists(binaryPath)):
+        print(f"{output} is up to date")
+        return
+    if upToDate:
+        fileIndex = readFileIndex(output)
+    elif not full and os.path.exists(output):
+        fileIndex = readFileIndex(output)
+        added, removed = updateFileIndex(fileIndex, directory)
+        print(f"{output}: {added} files added, {removed} removed")
+        writeFileIndex(fileIndex, output)
+    else:
+        fileIndex = buildFileIndex(directory)
+        writeFileIndex(fileIndex, output)
+    if binary:
+        writeBinaryFileIndex(fileIndex, binaryPath)
+
+
+def pack(source, output=None, verify=False):
+    from kvg.pathstore import (
+        PATH_STORE_SUFFIX,
+        PathStore,
+        verifyPathStore,
+        writePathStore,
+    )
+    from kvg.utils import loadAllSvg, readXmlFile
+
+    if output is None:
+        output = source.rstrip("/") + PATH_STORE_SUFFIX
+    if os.path.isdir(source):
+        kanjis = loadAllSvg(source, validate=False)
+    else:
+        kanjis = readXmlFile(source, validate=False)
+    strokes, exceptions = writePathStore(kanjis, output)
+    pathBytes = sum(
+        len(s.svg.encode("utf-8"))
+        for kanji in kanjis.values()
+        for s in kanji.iterStrokes()
+        if s.svg
+    )
+    print(
+        f"{output}: {strokes} strokes, {exceptions} stored verbatim, "
+        f"{os.path.getsize(output)} bytes for {pathBytes} bytes of path data"
+    )
+    if verify:
+        store = PathStore(output)
+        mismatches = verifyPathStore(store, kanjis)
+        store.close()
+        for kid, stroke in mismatches:
+            print(f"{kid}: stroke {stroke} does not match")
+        if mismatches:
+            sys.exit(1)
+        print("Round trip OK")
+
+
+def diff(old, new, workers=None):
+    from kvg.diff import diffCorpora
+
+    workers = workerCount(workers)
+    result = diffCorpora(old, new, workers)
+    for kid in result.added:
+        print(json.dumps({"kanji": kid, "change": "added"}))
+    for kid in result.removed:
+        print(json.dumps({"kanji": kid, "change": "removed"}))
+    for kid, groups in sorted(result.modified.items()):
+        print(json.dumps({"kanji": kid, "change": "modified", "groups": groups}))
+    print(
+        f"{len(result.added)} added, {len(result.removed)} removed, "
+        f"{len(result.modified)} modified",
+        file=sys.stderr,
+    )
+    if result.added or result.removed or result.modified:
+        sys.exit(1)
+
+
+# command: (function, minimum argument count, accepted --options)
 actions = {
-    "split": (createPathsSVG, 2),
-    "merge": (mergePathsSVG, 2),
-    "release": (release, 1),
+    "split": (createPathsSVG, 2, []),
+    "merge": (mergePathsSVG, 2, []),
+    "release": (release, 1, ["incremental", "archives", "workers"]),
+    "emit": (emit, 2, ["output", "workers"]),
+    "lint": (lint, 1, ["workers"]),
+    "index": (index, 1, ["output", "binary", "full"]),
+    "pack": (pack, 2, ["output", "verify"]),
+    "diff": (diff, 3, ["workers"]),
 }
+# Commands given all their files at once rather than one at a time
+multiFileActions = {"diff"}
 
 if __name__ == "__main__":
     if (
@@ -122,14 +513,36 @@ if __name__ == "__main__":
         print(helpString)
         sys.exit(0)
 
-    action = actions[sys.argv[1]][0]
-    files = sys.argv[2:]
+    command = sys.argv[1]
+    action, _, allowedOptions = actions[command]
+    options = {}
+    for a in sys.argv[2:]:
+        if a.startswith("--"):
+            name, _, value = a[2:].partition("=")
+            options[name] = value or True
+    files = [a for a in sys.argv[2:] if not a.startswith("--")]
+    profile = options.pop("profile", None)
+    if any(o not in allowedOptions for o in options):
+        print(helpString)
+        sys.exit(0)
 
-    if len(files) == 0:
-        action()
-    else:
-        for f in files:
-            if not os.path.exists(f):
+    with contextlib.ExitStack() as stack:
+        if profile is not None:
+            recorder = stack.enter_context(
+                instrument.profiling(profile if profile is not True else None)
+            )
+            stack.enter_context(recorder.phase(command))
+        if len(files) == 0:
+            action(**options)
+        elif command in multiFileActions:
+            missing = [f for f in files if not os.path.exists(f)]
+            for f in missing:
                 print(f"{f} does not exist!")
-                continue
-            action(f)
+            if not missing:
+                action(*files, **options)
+        else:
+            for f in files:
+                if not os.path.exists(f):
+                    print(f"{f} does not exist!")
+                    continue
+                action(f, **options)
@@ -0,0 +1,123 @@
+import os
+from collections import OrderedDict
+from collections.abc import Mapping
+
+# Number of parsed kanji a LazyCorpus keeps by default
+DEFAULT_CACHE_SIZE = 256
+
+
+class LazyKanji:
+    """Stand-in for a Kanji of a LazyCorpus. Its id is known without parsing
+    anything; the tree is parsed on first access to strokes or to any other
+    Kanji attribute, and is then shared through the cache of the corpus.
+    Changes to a tree, such as simplify(), are lost when it is evicted."""
+
+    __slots__ = ("corpus", "code", "variant")
+
+    def __init__(self, corpus, kid):
+        self.corpus = corpus
+        self.code, _, variant = kid.partition("-")
+        self.variant = variant or None
+
+    def __repr__(self):
+        return f"LazyKanji({self.kId()!r})"
+
+    def kId(self):
+        ret = self.code
+        if self.variant:
+            ret += f"-{self.variant}"
+        return ret
+
+    def load(self):
+        """Return the Kanji this proxy stands for."""
+        return self.corpus.load(self.kId())
+
+    @property
+    def strokes(self):
+        return self.load().strokes
+
+    def __getattr__(self, name):
+        # copy and pickle probe special methods such as __setstate__ on
+        # instances whose slots are not set yet: private and special names
+        # are never delegated, so they neither recurse nor parse anything
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+
+class LazyCorpus(Mapping):
+    """Mapping of kId() to LazyKanji over a release file or a directory of
+    SVG files. Only the list of ids is read up front: a kanji is parsed when
+    its tree is first needed, and the maxsize most recently used trees are
+    kept in memory."""
+
+    def __init__(self, source, maxsize=DEFAULT_CACHE_SIZE, validate=False):
+        from kvg.utils import listSvgFiles, readXmlIndex
+
+        if maxsize < 1:
+            raise ValueError("LazyCorpus needs room for at least one kanji")
+        self.source = source
+        self.maxsize = maxsize
+        self.validate = validate
+        # kId() -> Kanji, least recently used first
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if os.path.isdir(source):
+            # kId() -> SvgFileInfo
+            self.files = {}
+            for f in listSvgFiles(source):
+                kid = f"{f.id}-{f.variant}" if hasattr(f, "variant") else f.id
+                self.files[kid] = f
+            self.index = None
+        else:
+            # kId() -> byte range of its <kanji> element
+            self.files = None
+            self.index = readXmlIndex(source)
+
+    def _ids(self):
+        return self.files if self.files is not None else self.index
+
+    def __getitem__(self, kid):
+        if kid not in self._ids():
+            raise KeyError(kid)
+        return LazyKanji(self, kid)
+
+    def __contains__(self, kid):
+        return kid in self._ids()
+
+    def __iter__(self):
+        return iter(sorted(self._ids()))
+
+    def __len__(self):
+        return len(self._ids())
+
+    def load(self, kid):
+        """Return the Kanji of kid, parsing it unless it is cached."""
+        kanji = self.cache.get(kid)
+        if kanji is not None:
+            self.hits += 1
+            self.cache.move_to_end(kid)
+            return kanji
+        self.misses += 1
+        kanji = self._parse(kid)
+        self.cache[kid] = kanji
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return kanji
+
+    def _parse(self, kid):
+        from kvg.utils import readXmlEntries
+
+        if self.files is not None:
+            return self.files[kid].read(validate=self.validate)
+        found = readXmlEntries(
+            self.source, [kid], index=self.index, validate=self.validate
+        )
+        if kid not in found:
+            raise KeyError(kid)
+        return found[kid]
+
+    def clear(self):
+        """Drop all the cached trees."""
+        self.cache.clear()
@@ -0,0 +1,327 @@
+import json
+import os
+
+from kvg.kanjivg import Stroke, StrokeGr
+from kvg.utils import canonicalId, listSvgFiles
+
+DEFAULT_SOCKET = "./kvg-lookup.sock"
+
+
+# Summary generators
+
+
+def strokeGroupSummary(gr, indent=0):
+    if not isinstance(gr, StrokeGr):
+        raise Exception("Invalid structure")
+
+    ret = " " * indent * 4
+    # ret += gr.element if gr.element is not None and len(gr.element) > 0 else "・"
+    ret += "- group"
+    if gr.element is not None and len(gr.element) > 0:
+        ret += f" {gr.element}"
+    if gr.position:
+        ret += f" ({gr.position})"
+
+    childStrokes = [
+        s.element for s in gr.children if isinstance(s, Stroke) and s.element
+    ]
+    if len(childStrokes):
+        ret += "\n%s- strokes: %s" % (" " * (indent + 1) * 4, " ".join(childStrokes))
+
+    ret += "\n"
+
+    for g in gr.children:
+        if isinstance(g, StrokeGr):
+            ret += strokeGroupSummary(g, indent + 1)
+
+    return ret
+
+
+def characterSummary(c):
+    ret = f"Character summary: {c.code} ({c.strokes.element})"
+    if c.variant:
+        ret += f" - variant: {c.variant}"
+    ret += "\n"
+    ret += strokeGroupSummary(c.strokes)
+    return ret
+
+
+class LookupData:
+    """Data the lookup commands work on: the SVG files of directory and the
+    release file at xmlPath. By default each query reads what it needs from
+    disk, and prefetch() reads what a batch of queries needs in one pass;
+    after load(), everything is answered from memory."""
+
+    def __init__(self, directory="./kanji/", xmlPath="./kanjivg.xml"):
+        self.directory = directory
+        self.xmlPath = xmlPath
+        # id -> list of (path, Kanji or the exception raised reading it)
+        self.svgFiles = None
+        self.xmlKanjis = None
+        self.components = None
+        # id -> SvgFileInfo list of directory, read once
+        self.svgInfos = None
+        # Release file entries read by prefetch(), None for missing ones
+        self.xmlEntries = {}
+
+    def load(self):
+        """Read all the SVG files, in parallel with loadAllSvg(), the release
+        file and its component index into memory. Missing sources are
+        skipped."""
+        from kvg.components import loadComponentIndex
+        from kvg.snapshot import loadXmlFile
+        from kvg.utils import loadAllSvg
+
+        if os.path.isdir(self.directory):
+            errors = {}
+            kanjis = loadAllSvg(self.directory, errors=errors, validate=False)
+
+            def entry(f):
+                # A file that failed to parse raises when it is looked up
+                name = os.path.basename(f.path)[:-4]
+                if name in kanjis:
+                    return f.path, kanjis[name]
+                return f.path, Exception(errors[f.path])
+
+            self.svgFiles = {
+                id: [entry(f) for f in files] for id, files in self.svgIndex().items()
+            }
+        if os.path.exists(self.xmlPath):
+            self.xmlKanjis = loadXmlFile(self.xmlPath)
+            self.components = loadComponentIndex(self.xmlPath)
+
+    def prefetch(self, command, args):
+        """Read at once the data needed to run command on all args."""
+        if command == "find-svg":
+            self.svgIndex()
+        elif command == "find-xml" and self.xmlKanjis is None:
+            ids = []
+            for arg in args:
+                try:
+                    ids.append(canonicalId(arg))
+                except ValueError:
+                    # Reported when the argument is looked up
+                    pass
+            found = self._readXml(ids)
+            # Missing ids are recorded too, so they are not searched again
+            self.xmlEntries.update((id, found.get(id)) for id in ids)
+        elif command == "find-component":
+            self.componentIndex()
+
+    def svgIndex(self):
+        """Return the SvgFileInfo of directory, indexed by id and sorted by
+        path like loadAllSvg() reads them."""
+        if self.svgInfos is None:
+            self.svgInfos = {}
+            for f in sorted(listSvgFiles(self.directory), key=lambda f: f.path):
+                self.svgInfos.setdefault(f.id, []).append(f)
+        return self.svgInfos
+
+    def findSvg(self, id):
+        """Return (path, Kanji) pairs for the SVG files describing id."""
+        if self.svgFiles is None:
+            return [
+                (f.path, f.read(validate=False)) for f in self.svgIndex().get(id, [])
+            ]
+        ret = self.svgFiles.get(id, [])
+        for _, kanji in ret:
+            if isinstance(kanji, Exception):
+                raise kanji
+        return ret
+
+    def findXml(self, id):
+        """Return the Kanji of id in the release file, or None."""
+        if self.xmlKanjis is not None:
+            return self.xmlKanjis.get(id)
+        if id in self.xmlEntries:
+            return self.xmlEntries[id]
+        return self._readXml([id]).get(id)
+
+    def _readXml(self, ids):
+        from kvg.snapshot import readSnapshot, snapshotPath
+        from kvg.utils import readXmlEntries
+
+        files = readSnapshot(snapshotPath(self.xmlPath), self.xmlPath, keys=ids)
+        if files is None:
+            files = readXmlEntries(self.xmlPath, ids)
+        return files
+
+    def componentIndex(self):
+        if self.components is None:
+            from kvg.components import loadComponentIndex
+
+            self.components = loadComponentIndex(self.xmlPath)
+        return self.components
+
+
+# Commands. Each returns the text printed by kvg-lookup.py.
+
+
+def findSvg(data, arg):
+    id = canonicalId(arg)
+    kanji = data.findSvg(id)
+    ret = "Found %d files matching ID %s\n" % (len(kanji), id)
+    for i, (path, c) in enumerate(kanji):
+        ret += "\nFile %s (%d/%d):\n" % (path, i + 1, len(kanji))
+        ret += characterSummary(c) + "\n"
+    return ret
+
+
+def findXml(data, arg):
+    id = canonicalId(arg)
+    kanji = data.findXml(id)
+    if kanji is not None:
+        return characterSummary(kanji) + "\n"
+    return "Character %s (%s) not found.\n" % (id, chr(int(id, 16)))
+
+
+def findComponent(data, arg, position=None, radical=None, part=None):
+    entries = data.componentIndex().find(
+        arg, position, radical, int(part) if part is not None else None
+    )
+    kanji = {entry.kanji for entry in entries}
+    ret = "Found %d groups containing %s in %d kanji\n" % (
+        len(entries),
+        arg,
+        len(kanji),
+    )
+    for entry in entries:
+        ret += "%s (%s): group %s" % (
+            entry.kanji,
+            chr(int(entry.kanji.split("-")[0], 16)),
+            entry.group,
+        )
+        if entry.element:
+            ret += f" {entry.element}"
+        if entry.original and entry.original != entry.element:
+            ret += f" (original {entry.original})"
+        if entry.position:
+            ret += f" ({entry.position})"
+        if entry.radical:
+            ret += f", radical: {entry.radical}"
+        if entry.part:
+            ret += f", part {entry.part}"
+        ret += "\n"
+    return ret
+
+
+commands = {
+    "find-svg": findSvg,
+    "find-xml": findXml,
+    "find-component": findComponent,
+}
+
+
+# Server and client. Requests and responses are JSON objects, one per line:
+# {"command": ..., "arg": ..., "options": {...}} is answered by either
+# {"output": ...} or {"error": ...}.
+
+
+def _answer(data, line):
+    try:
+        request = json.loads(line)
+        command = commands[request["command"]]
+        output = command(data, request["arg"], **request.get("options", {}))
+        response = {"output": output}
+    except Exception as e:
+        response = {"error": f"{type(e).__name__}: {e}"}
+    return json.dumps(response, ensure_ascii=False).encode("utf8") + b"\n"
+
+
+def serverRunning(path=DEFAULT_SOCKET):
+    """Tell whether a lookup server answers on the Unix socket at path."""
+    import socket
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError:
+        return False
+    finally:
+        client.close()
+    return True
+
+
+def serve(data, path=DEFAULT_SOCKET):
+    """Answer lookup requests on the Unix socket at path until SIGINT or
+    SIGTERM. Clients are served concurrently; data should be load()ed
+    beforehand. Refuses to start if another server answers on path; a
+    socket left behind by a server that did not exit cleanly is replaced."""
+    import asyncio
+    import signal
+
+    # (device, inode) of the socket this server bound, the only one it may
+    # remove when it stops
+    bound = None
+
+    async def handleClient(reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(_answer(data, line))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def main():
+        nonlocal bound
+        server = await asyncio.start_unix_server(handleClient, path=path)
+        st = os.stat(path)
+        bound = (st.st_dev, st.st_ino)
+        loop = asyncio.get_running_loop()
+        stopped = loop.create_future()
+
+        def stop():
+            if not stopped.done():
+                stopped.set_result(None)
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop)
+        async with server:
+            await stopped
+
+    if os.path.exists(path):
+        if serverRunning(path):
+            raise Exception(f"A lookup server is already running on {path}")
+        os.unlink(path)
+    try:
+        asyncio.run(main())
+    finally:
+        try:
+            st = os.stat(path)
+            if (st.st_dev, st.st_ino) == bound:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+class LookupClient:
+    """Connection to a lookup server."""
+
+    def __init__(self, path=DEFAULT_SOCKET):
+        import socket
+
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(path)
+        self.stream = self.socket.makefile("rwb")
+
+    def query(self, command, arg, **options):
+        """Return the output of a command, or raise an Exception with the
+        error the server met."""
+        request = {"command": command, "arg": arg, "options": options}
+        self.stream.write(json.dumps(request, ensure_ascii=False).encode("utf8"))
+        self.stream.write(b"\n")
+        self.stream.flush()
+        line = self.stream.readline()
+        if not line:
+            raise Exception("Lookup server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise Exception(response["error"])
+        return response["output"]
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
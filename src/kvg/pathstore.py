@@ -0,0 +1,288 @@
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+
+# Columnar store of the path data (Stroke.svg) of a corpus.
+#
+# Numbers are quantized to hundredths, the precision of KanjiVG, and each one
+# is stored as the difference with the number two places before it in the
+# same stroke (the previous x for an x, the previous y for a y). Commands are
+# stored as their letter and the count of numbers following it. Paths that
+# would not be written back exactly by formatPath() (other number formats,
+# separators or precision) are kept verbatim in an exceptions table, so the
+# round trip is always lossless.
+#
+# Layout, little endian, every section starting on a 4 bytes boundary:
+#   header: magic, kanji, strokes, commands, numbers, exceptions, ids length
+#   uint32 kanjiOffsets[kanji + 1]        first stroke of each kanji
+#   uint32 commandOffsets[strokes + 1]    first command of each stroke
+#   uint32 numberOffsets[strokes + 1]     first number of each stroke
+#   uint32 exceptionStrokes[exceptions]   sorted stroke indices
+#   uint32 exceptionOffsets[exceptions + 1]
+#   int16  deltas[numbers]
+#   uint8  commands[commands]             command letters
+#   uint8  counts[commands]               numbers after each command
+#   exception strings (UTF-8), then kanji ids (newline separated)
+PATH_STORE_MAGIC = b"KVGPATH1"
+PATH_STORE_SUFFIX = ".paths"
+_header = struct.Struct("<8s6I")
+
+# A stroke without path data is stored as this exception, which is not UTF-8
+_noPath = b"\xff"
+
+_pathToken = re.compile(r"[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)")
+
+
+def formatNumber(q):
+    """Write a number quantized to hundredths the way KanjiVG does: no
+    trailing zeros nor trailing dot."""
+    ret = "%d.%02d" % divmod(abs(q), 100)
+    ret = ret.rstrip("0").rstrip(".")
+    return "-" + ret if q < 0 else ret
+
+
+def formatPath(commands, counts, numbers):
+    """Write path data from command letters, the count of numbers after each
+    command and the quantized numbers. Numbers are separated by commas, or
+    by nothing before a minus sign."""
+    ret = []
+    i = 0
+    for command, count in zip(commands, counts):
+        ret.append(chr(command))
+        for j in range(i, i + count):
+            q = numbers[j]
+            if j != i and q >= 0:
+                ret.append(",")
+            ret.append(formatNumber(q))
+        i += count
+    return "".join(ret)
+
+
+def encodePath(d):
+    """Split path data into (commands, counts, numbers), or return None if
+    formatPath() would not give d back."""
+    commands = []
+    counts = []
+    numbers = []
+    for token in _pathToken.findall(d):
+        if token.isalpha():
+            commands.append(ord(token))
+            counts.append(0)
+        elif not commands or counts[-1] == 255:
+            return None
+        else:
+            numbers.append(round(float(token) * 100))
+            counts[-1] += 1
+    if formatPath(commands, counts, numbers) != d:
+        return None
+    return commands, counts, numbers
+
+
+def _pad(out):
+    out.write(b"\0" * (-out.tell() % 4))
+
+
+def writePathStore(kanjis, path):
+    """Write the path data of kanjis to a path store. kanjis is a dict of
+    Kanji, stored under its keys, or any other iterable of Kanji, stored
+    under their kId(). Strokes are stored in getStrokes() order. Returns the
+    number of strokes and of exceptions."""
+    from kvg.utils import kanjiItems
+
+    kanjiIds = []
+    kanjiOffsets = array("I", [0])
+    commandOffsets = array("I", [0])
+    numberOffsets = array("I", [0])
+    commands = array("B")
+    counts = array("B")
+    deltas = array("h")
+    exceptions = {}
+    for kid, kanji in kanjiItems(kanjis):
+        kanjiIds.append(kid)
+        for stroke in kanji.iterStrokes():
+            encoded = None if stroke.svg is None else encodePath(stroke.svg)
+            if encoded is not None:
+                strokeCommands, strokeCounts, numbers = encoded
+                strokeDeltas = [
+                    q - numbers[i - 2] if i >= 2 else q for i, q in enumerate(numbers)
+                ]
+                if any(not -32768 <= delta < 32768 for delta in strokeDeltas):
+                    encoded = None
+            if encoded is None:
+                strokeIndex = len(commandOffsets) - 1
+                if stroke.svg is None:
+                    exceptions[strokeIndex] = _noPath
+                else:
+                    exceptions[strokeIndex] = stroke.svg.encode("utf-8")
+            else:
+                commands.extend(strokeCommands)
+                counts.extend(strokeCounts)
+                deltas.extend(strokeDeltas)
+            commandOffsets.append(len(commands))
+            numberOffsets.append(len(deltas))
+        kanjiOffsets.append(len(commandOffsets) - 1)
+
+    exceptionStrokes = array("I", sorted(exceptions))
+    exceptionOffsets = array("I", [0])
+    for strokeIndex in exceptionStrokes:
+        exceptionOffsets.append(exceptionOffsets[-1] + len(exceptions[strokeIndex]))
+    ids = "\n".join(kanjiIds).encode("ascii")
+    sections = [
+        kanjiOffsets,
+        commandOffsets,
+        numberOffsets,
+        exceptionStrokes,
+        exceptionOffsets,
+        deltas,
+        commands,
+        counts,
+    ]
+    if sys.byteorder != "little":
+        for section in sections:
+            section.byteswap()
+
+    tmpPath = f"{path}.tmp{os.getpid()}"
+    with open(tmpPath, "wb") as out:
+        out.write(
+            _header.pack(
+                PATH_STORE_MAGIC,
+                len(kanjiIds),
+                len(commandOffsets) - 1,
+                len(commands),
+                len(deltas),
+                len(exceptionStrokes),
+                len(ids),
+            )
+        )
+        for section in sections:
+            _pad(out)
+            section.tofile(out)
+        _pad(out)
+        out.write(b"".join(exceptions[i] for i in sorted(exceptions)))
+        out.write(ids)
+    os.replace(tmpPath, path)
+    return len(commandOffsets) - 1, len(exceptions)
+
+
+class PathStore:
+    """Read-only view of a path store. The file is memory-mapped and its
+    arrays are used in place, so processes opening the same store share a
+    single copy of it."""
+
+    def __init__(self, path):
+        import mmap
+
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (
+            magic,
+            kanjiCount,
+            strokeCount,
+            commandCount,
+            numberCount,
+            exceptionCount,
+            idsLength,
+        ) = _header.unpack_from(self.map)
+        if magic != PATH_STORE_MAGIC:
+            raise Exception(f"Not a path store ({path})")
+        self._pos = _header.size
+        self.kanjiOffsets = self._array("I", kanjiCount + 1)
+        self.commandOffsets = self._array("I", strokeCount + 1)
+        self.numberOffsets = self._array("I", strokeCount + 1)
+        self.exceptionStrokes = self._array("I", exceptionCount)
+        self.exceptionOffsets = self._array("I", exceptionCount + 1)
+        self.deltas = self._array("h", numberCount)
+        self.commands = self._array("B", commandCount)
+        self.counts = self._array("B", commandCount)
+        self._pos += -self._pos % 4
+        self.exceptionStart = self._pos
+        idsStart = self._pos + self.exceptionOffsets[exceptionCount]
+        ids = self.map[idsStart : idsStart + idsLength].decode("ascii")
+        self.kanjiIds = ids.split("\n") if ids else []
+        self.index = {kid: i for i, kid in enumerate(self.kanjiIds)}
+
+    def _array(self, typecode, count):
+        self._pos += -self._pos % 4
+        size = array(typecode).itemsize
+        view = memoryview(self.map)[self._pos : self._pos + count * size]
+        self._pos += count * size
+        if typecode == "B":
+            return view
+        if sys.byteorder == "little":
+            return view.cast(typecode)
+        ret = array(typecode, view)
+        ret.byteswap()
+        return ret
+
+    def __len__(self):
+        return len(self.kanjiIds)
+
+    def strokeRange(self, kid):
+        """Return the range of the stroke indices of a kanji."""
+        i = self.index[kid]
+        return range(self.kanjiOffsets[i], self.kanjiOffsets[i + 1])
+
+    def _exception(self, stroke):
+        i = bisect_left(self.exceptionStrokes, stroke)
+        if i == len(self.exceptionStrokes) or self.exceptionStrokes[i] != stroke:
+            return False, None
+        start = self.exceptionStart + self.exceptionOffsets[i]
+        data = self.map[start : self.exceptionStart + self.exceptionOffsets[i + 1]]
+        return True, None if data == _noPath else data.decode("utf-8")
+
+    def strokeNumbers(self, stroke):
+        """Return the quantized numbers of a stroke, in hundredths."""
+        start, end = self.numberOffsets[stroke], self.numberOffsets[stroke + 1]
+        ret = list(self.deltas[start:end])
+        for i in range(2, len(ret)):
+            ret[i] += ret[i - 2]
+        return ret
+
+    def strokePath(self, stroke):
+        """Return the path data of a stroke, as found in Stroke.svg."""
+        isException, d = self._exception(stroke)
+        if isException:
+            return d
+        start, end = self.commandOffsets[stroke], self.commandOffsets[stroke + 1]
+        return formatPath(
+            self.commands[start:end], self.counts[start:end], self.strokeNumbers(stroke)
+        )
+
+    def kanjiPaths(self, kid):
+        """Return the path data of all the strokes of a kanji, in order."""
+        return [self.strokePath(stroke) for stroke in self.strokeRange(kid)]
+
+    def close(self):
+        for name in (
+            "kanjiOffsets",
+            "commandOffsets",
+            "numberOffsets",
+            "exceptionStrokes",
+            "exceptionOffsets",
+            "deltas",
+            "commands",
+            "counts",
+        ):
+            view = getattr(self, name)
+            if isinstance(view, memoryview):
+                view.release()
+        self.map.close()
+
+
+def verifyPathStore(store, kanjis):
+    """Compare a PathStore with the kanjis (as given to writePathStore()) it
+    was written from. Returns the (kanji id, stroke number) of every stroke
+    that does not match."""
+    from kvg.utils import kanjiItems
+
+    mismatches = []
+    for kid, kanji in kanjiItems(kanjis):
+        stored = store.kanjiPaths(kid) if kid in store.index else []
+        strokes = kanji.getStrokes()
+        for i in range(max(len(strokes), len(stored))):
+            if i >= len(strokes) or i >= len(stored) or strokes[i].svg != stored[i]:
+                mismatches.append((kid, i + 1))
+    return mismatches
@@ -0,0 +1,218 @@
+import gc
+import hashlib
+import marshal
+import os
+import struct
+
+from kvg.instrument import instrumented
+from kvg.kanjivg import Kanji, Stroke, StrokeGr
+from kvg.utils import readXmlFile
+
+# Snapshot layout: magic, header length, marshalled header, then one
+# marshalled blob per kanji. The header holds the stamp of the source file and
+# an index of (offset, length) of each blob, so a single kanji can be loaded
+# without decoding the others.
+SNAPSHOT_MAGIC = b"KVGSNAP1"
+SNAPSHOT_SUFFIX = ".kvgsnap"
+
+_headerLen = struct.Struct("<I")
+
+# What struct.unpack() and marshal.loads() raise on truncated data, and
+# unpacking a header or blob that is not laid out as expected
+_corruptErrors = (struct.error, EOFError, ValueError, TypeError, KeyError)
+
+
+def encodeGroup(group):
+    children = []
+    for child in group.children:
+        if isinstance(child, StrokeGr):
+            children.append(encodeGroup(child))
+        else:
+            children.append(
+                (child.element, child.svg, child.number_pos, child.position)
+            )
+    return (
+        group.element,
+        group.original,
+        group.part,
+        group.number,
+        group.variant,
+        group.partial,
+        group.tradForm,
+        group.radicalForm,
+        group.position,
+        group.radical,
+        group.phon,
+        children,
+    )
+
+
+def decodeGroup(data, parent=None):
+    group = StrokeGr(parent)
+    (
+        group.element,
+        group.original,
+        group.part,
+        group.number,
+        group.variant,
+        group.partial,
+        group.tradForm,
+        group.radicalForm,
+        group.position,
+        group.radical,
+        group.phon,
+        children,
+    ) = data
+    for child in children:
+        if len(child) == 4:
+            stroke = Stroke(group)
+            stroke.element, stroke.svg, stroke.number_pos, stroke.position = child
+            group.addChild(stroke)
+        else:
+            decodeGroup(child, group)
+    return group
+
+
+def encodeKanji(kanji):
+    strokes = encodeGroup(kanji.strokes) if kanji.strokes is not None else None
+    return (kanji.code, kanji.variant, strokes)
+
+
+def decodeKanji(data):
+    code, variant, strokes = data
+    kanji = Kanji(code, variant)
+    if strokes is not None:
+        kanji.strokes = decodeGroup(strokes)
+    return kanji
+
+
+def fileHash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def sourceStamp(path, withHash=True):
+    st = os.stat(path)
+    return (st.st_size, st.st_mtime_ns, fileHash(path) if withHash else None)
+
+
+def snapshotPath(source):
+    return source + SNAPSHOT_SUFFIX
+
+
+@instrumented("snapshot.write")
+def writeSnapshot(kanjis, path, source=None):
+    """Write the kanjis dict to a snapshot file. If source is given, its
+    stamp is recorded so that readSnapshot() can detect stale snapshots."""
+    stamp = sourceStamp(source) if source is not None else None
+    blobs = []
+    index = {}
+    offset = 0
+    for key, kanji in kanjis.items():
+        blob = marshal.dumps(encodeKanji(kanji))
+        index[key] = (offset, len(blob))
+        offset += len(blob)
+        blobs.append(blob)
+    header = marshal.dumps({"version": 1, "source": stamp, "index": index})
+
+    tmpPath = f"{path}.tmp{os.getpid()}"
+    with open(tmpPath, "wb") as out:
+        out.write(SNAPSHOT_MAGIC)
+        out.write(_headerLen.pack(len(header)))
+        out.write(header)
+        for blob in blobs:
+            out.write(blob)
+    os.replace(tmpPath, path)
+
+
+def isFresh(stamp, source):
+    """Tell whether source still matches a stamp from sourceStamp()."""
+    if stamp is None:
+        return True
+    size, mtime, digest = stamp
+    st = os.stat(source)
+    if st.st_size != size:
+        return False
+    if st.st_mtime_ns == mtime:
+        return True
+    # Touched but maybe not modified: only the content hash can tell.
+    return fileHash(source) == digest
+
+
+@instrumented("snapshot.read")
+def readSnapshot(path, source=None, keys=None):
+    """Return the kanjis dict stored in the snapshot at path, or None if it
+    does not exist, is truncated or corrupt, or is stale with regard to the
+    source file. If keys is
+    given, only these entries are decoded; missing keys are skipped."""
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return None
+    with f:
+        try:
+            return _readSnapshot(f, source, keys)
+        except _corruptErrors:
+            # Truncated or damaged: treat it like a missing snapshot so that
+            # it is rebuilt from the source.
+            return None
+
+
+def _readSnapshot(f, source, keys):
+    if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        return None
+    (headerLen,) = _headerLen.unpack(f.read(_headerLen.size))
+    header = marshal.loads(f.read(headerLen))
+    if header["version"] != 1:
+        return None
+    if source is not None and not isFresh(header["source"], source):
+        return None
+    dataStart = f.tell()
+    index = header["index"]
+
+    if keys is None:
+        data = f.read()
+        # The decoded trees are all kept, so collecting while building
+        # them only burns time.
+        gcWasEnabled = gc.isenabled()
+        gc.disable()
+        try:
+            return {
+                key: decodeKanji(marshal.loads(data[offset : offset + length]))
+                for key, (offset, length) in index.items()
+            }
+        finally:
+            if gcWasEnabled:
+                gc.enable()
+
+    kanjis = {}
+    for key in keys:
+        if key not in index:
+            continue
+        offset, length = index[key]
+        f.seek(dataStart + offset)
+        kanjis[key] = decodeKanji(marshal.loads(f.read(length)))
+    return kanjis
+
+
+def loadXmlFile(path, keys=None, snapshot=None):
+    """Like readXmlFile(), but goes through a snapshot file (by default next
+    to path) that is created or refreshed whenever it is missing or stale.
+    The source is not validated, see kvg.validate."""
+    if snapshot is None:
+        snapshot = snapshotPath(path)
+    kanjis = readSnapshot(snapshot, path, keys)
+    if kanjis is not None:
+        return kanjis
+
+    kanjis = readXmlFile(path, validate=False)
+    try:
+        writeSnapshot(kanjis, snapshot, path)
+    except OSError as e:
+        print(f"Could not write snapshot {snapshot}: {e}")
+    if keys is None:
+        return kanjis
+    return {key: kanjis[key] for key in keys if key in kanjis}
@@ -0,0 +1,190 @@
+import functools
+import os
+
+from kvg.kanjivg import (
+    LICENSE_STRING,
+    PARTIAL,
+    RADICAL_FORM,
+    TRAD_FORM,
+    VARIANT,
+    StrokeGr,
+)
+
+# Text of the boolean attributes of <g> elements for every value of
+# StrokeGr._flags. toSVG() writes variant between number and original, and
+# the three others between original and position.
+_variantAttributes = ("", ' kvg:variant="true"')
+
+
+def _formText(flags):
+    ret = ""
+    if flags & PARTIAL:
+        ret += ' kvg:partial="true"'
+    if flags & TRAD_FORM:
+        ret += ' kvg:tradForm="true"'
+    if flags & RADICAL_FORM:
+        ret += ' kvg:radicalForm="true"'
+    return ret
+
+
+_formAttributes = tuple(_formText(flags) for flags in range(16))
+
+
+def _groupTag(group, gid, tabs):
+    flags = group._flags
+    ret = f'{tabs}<g id="kvg:{gid}"'
+    if group.element:
+        ret += f' kvg:element="{group.element}"'
+    if group.part:
+        ret += ' kvg:part="%d"' % group.part
+    if group.number:
+        ret += ' kvg:number="%d"' % group.number
+    ret += _variantAttributes[flags & VARIANT]
+    if group.original:
+        ret += f' kvg:original="{group.original}"'
+    ret += _formAttributes[flags]
+    if group.position:
+        ret += f' kvg:position="{group.position}"'
+    if group.radical:
+        ret += f' kvg:radical="{group.radical}"'
+    if group.phon:
+        ret += f' kvg:phon="{group.phon}"'
+    return ret + ">\n"
+
+
+def strokesToSVG(kanji, indent=0):
+    """Return the stroke groups of a Kanji as SVG, exactly as written by
+    StrokeGr.toSVG(), in a single string."""
+    if kanji.strokes is None:
+        return ""
+    kid = kanji.kId()
+    parts = []
+    append = parts.append
+    groupCpt = 0
+    strokeCpt = 1
+    # Iterators over the children of the groups being written; the items of
+    # stack[i] are at indent + i.
+    stack = [iter((kanji.strokes,))]
+    while stack:
+        for item in stack[-1]:
+            tabs = "\t" * (indent + len(stack) - 1)
+            if isinstance(item, StrokeGr):
+                gid = f"{kid}-g{groupCpt}" if groupCpt else kid
+                groupCpt += 1
+                append(_groupTag(item, gid, tabs))
+                stack.append(iter(item.children))
+                break
+            tag = f'{tabs}<path id="kvg:{kid}-s{strokeCpt}"'
+            strokeCpt += 1
+            if item.element:
+                tag += f' kvg:type="{item.element}"'
+            if item.svg:
+                tag += f' d="{item.svg}"'
+            append(tag + "/>\n")
+        else:
+            stack.pop()
+            if stack:
+                append("\t" * (indent + len(stack) - 1) + "</g>\n")
+    return "".join(parts)
+
+
+def strokeNumbersToSVG(kanji, indent=0):
+    """Return the stroke numbers of a Kanji as SVG, as written by
+    Kanji.outputStrokesNumbers()."""
+    tabs = "\t" * (indent + 1)
+    return "".join(
+        tabs
+        + '<text transform="matrix(1 0 0 1 %.2f %.2f)">%d</text>\n'
+        % (stroke.number_pos[0], stroke.number_pos[1], cpt)
+        for cpt, stroke in enumerate(kanji.iterStrokes(), start=1)
+        if stroke.number_pos
+    )
+
+
+SVG_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<!--
+%s
+-->
+<!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 1.0//EN" "http://www.w3.org/TR/2001/REC-SVG-20010904/DTD/svg10.dtd" [
+	<!ATTLIST g
+		xmlns:kvg CDATA #FIXED "http://kanjivg.tagaini.net"
+		kvg:element CDATA #IMPLIED
+		kvg:variant CDATA #IMPLIED
+		kvg:partial CDATA #IMPLIED
+		kvg:original CDATA #IMPLIED
+		kvg:part CDATA #IMPLIED
+		kvg:number CDATA #IMPLIED
+		kvg:tradForm CDATA #IMPLIED
+		kvg:radicalForm CDATA #IMPLIED
+		kvg:position CDATA #IMPLIED
+		kvg:radical CDATA #IMPLIED
+		kvg:phon CDATA #IMPLIED >
+	<!ATTLIST path
+		xmlns:kvg CDATA #FIXED "http://kanjivg.tagaini.net"
+		kvg:type CDATA #IMPLIED >
+]>
+<svg xmlns="http://www.w3.org/2000/svg" width="109" height="109" viewBox="0 0 109 109">
+""" % (LICENSE_STRING,)
+
+
+def kanjiToSVG(kanji):
+    """Return a complete SVG document for a Kanji, laid out like the files of
+    the kanji/ directory."""
+    kid = kanji.kId()
+    return (
+        SVG_HEADER
+        + f'\t<g id="kvg:StrokePaths_{kid}" style="fill:none;stroke:#000000;stroke-width:3;stroke-linecap:round;stroke-linejoin:round;">\n'
+        + strokesToSVG(kanji, 2)
+        + "\t</g>\n"
+        + f'\t<g id="kvg:StrokeNumbers_{kid}" style="font-size:8;fill:#808080">\n'
+        + strokeNumbersToSVG(kanji, 1)
+        + "\t</g>\n</svg>"
+    )
+
+
+def _writeSvgFiles(chunk, directory):
+    from kvg.snapshot import decodeKanji
+
+    for name, data in chunk:
+        kanji = decodeKanji(data)
+        path = os.path.join(directory, f"{name}.svg")
+        with open(path, "w", encoding="utf-8", newline="") as out:
+            out.write(kanjiToSVG(kanji))
+    return len(chunk)
+
+
+def writeSvgFiles(kanjis, directory, workers=None, chunksize=256):
+    """Write an SVG file for each Kanji of kanjis into directory, using a pool
+    of worker processes. Files are named after the keys of kanjis if it is a
+    dict, such as returned by loadAllSvg(), and after kId() if it is any other
+    iterable of Kanji, such as returned by iterXmlFile(): at most 2 *
+    workers chunks of it are held in memory at a time. Returns the number of
+    files written."""
+    from kvg.snapshot import encodeKanji
+    from kvg.utils import kanjiItems, mapInOrder
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    os.makedirs(directory, exist_ok=True)
+
+    # Trees are sent to the workers in their compact snapshot encoding
+    def chunks():
+        chunk = []
+        for name, kanji in kanjiItems(kanjis):
+            chunk.append((name, encodeKanji(kanji)))
+            if len(chunk) == chunksize:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    if workers <= 1:
+        return sum(_writeSvgFiles(chunk, directory) for chunk in chunks())
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Chunks are encoded as the workers need them, so that a streamed source
+    # such as iterXmlFile() is not held in memory all at once
+    writeChunk = functools.partial(_writeSvgFiles, directory=directory)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return sum(mapInOrder(executor, writeChunk, chunks(), 2 * workers))
@@ -1,6 +1,10 @@
+import functools
 import os
 import sys
 
+from kvg import instrument
+from kvg.instrument import instrumented
+
 PYTHON_VERSION_MAJOR = sys.version_info[0]
 
 if PYTHON_VERSION_MAJOR < 3:
@@ -49,23 +53,174 @@ class SvgFileInfo:
     def __repr__(self):
         return repr(vars(self))
 
-    def read(self, SVGHandler=None):
+    def read(self, SVGHandler=None, backend=None, validate=True):
         if SVGHandler is None:
             from kvg.kanjivg import SVGHandler
-        handler = SVGHandler()
-        parseXmlFile(self.path, handler)
+        handler = SVGHandler(validate=validate)
+        parseXmlFile(self.path, handler, backend)
         parsed = list(handler.kanjis.values())
         if len(parsed) != 1:
             raise Exception(f"File does not contain 1 kanji entry. ({self.path})")
         return parsed[0]
 
 
-def parseXmlFile(path, handler):
-    from xml.sax import parse
+def _saxParser(handler):
+    from xml.sax import make_parser
+
+    parser = make_parser()
+    parser.setContentHandler(handler)
+    return parser.feed, parser.close
+
+
+def _expatParser(handler):
+    # Drives the handler straight from pyexpat, skipping the xml.sax reader
+    # and the AttributesImpl wrapping: handlers get a plain attributes dict.
+    from xml.parsers.expat import ParserCreate
+
+    parser = ParserCreate()
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.startElement
+    parser.EndElementHandler = handler.endElement
+    parser.CharacterDataHandler = handler.characters
+
+    def feed(data):
+        parser.Parse(data, False)
+
+    def close():
+        parser.Parse(b"", True)
+        handler.endDocument()
+
+    handler.startDocument()
+    return feed, close
+
+
+def _lxmlParser(handler):
+    from lxml import etree
+
+    parser = etree.XMLPullParser(
+        events=("start-ns", "start", "end"),
+        resolve_entities=False,
+        no_network=True,
+        huge_tree=True,
+    )
+    # lxml reports {uri}local names, handlers expect prefix:local ones
+    prefixes = {}
+    qnames = {}
+
+    def qname(name):
+        ret = qnames.get(name)
+        if ret is None:
+            ret = name
+            if name[0] == "{":
+                uri, local = name[1:].split("}", 1)
+                prefix = prefixes.get(uri)
+                ret = f"{prefix}:{local}" if prefix else local
+            qnames[name] = ret
+        return ret
+
+    def process():
+        for event, elem in parser.read_events():
+            if event == "start":
+                attrs = {qname(k): v for k, v in elem.attrib.items()}
+                handler.startElement(qname(elem.tag), attrs)
+            elif event == "end":
+                if len(elem) == 0 and elem.text:
+                    handler.characters(elem.text)
+                tail = elem.tail
+                handler.endElement(qname(elem.tag))
+                if tail:
+                    handler.characters(tail)
+                # Only keep the elements that are still open
+                elem.clear()
+                parent = elem.getparent()
+                if parent is not None:
+                    while elem.getprevious() is not None:
+                        del parent[0]
+            else:
+                prefix, uri = elem
+                prefixes[uri] = prefix
+                qnames.clear()
+
+    def feed(data):
+        parser.feed(data)
+        process()
+
+    def close():
+        parser.close()
+        process()
+        handler.endDocument()
+
+    handler.startDocument()
+    return feed, close
+
+
+# Parser backends. Each one takes a SAX content handler and returns a
+# (feed, close) pair driving it incrementally. They all produce identical
+# Kanji trees.
+XML_BACKENDS = {
+    "sax": _saxParser,
+    "expat": _expatParser,
+    "lxml": _lxmlParser,
+}
+
+DEFAULT_XML_BACKEND = os.environ.get("KVG_XML_BACKEND", "sax")
 
-    parse(path, handler)
+XML_BLOCK_SIZE = 1 << 16
 
 
+def xmlBackends():
+    """Return the names of the parser backends available here."""
+    ret = ["sax", "expat"]
+    try:
+        import lxml.etree  # noqa: F401
+
+        ret.append("lxml")
+    except ImportError:
+        pass
+    return ret
+
+
+def xmlParser(handler, backend=None):
+    """Return the (feed, close) pair of the given backend for handler."""
+    if backend is None:
+        backend = DEFAULT_XML_BACKEND
+    if backend not in XML_BACKENDS:
+        raise ValueError(f"Unknown XML parser backend: {backend}")
+    return XML_BACKENDS[backend](handler)
+
+
+def _parseXmlSource(source, handler, backend):
+    if instrument.recorder is not None:
+        source = instrument.TimedReader(source)
+    feed, close = xmlParser(handler, backend)
+    for block in iter(lambda: source.read(XML_BLOCK_SIZE), b""):
+        feed(block)
+    close()
+
+
+@instrumented("parse")
+def parseXmlFile(path, handler, backend=None):
+    if (backend or DEFAULT_XML_BACKEND) == "sax":
+        from xml.sax import parse
+
+        # Unlike a fed parser, this keeps the file name in error messages
+        if instrument.recorder is not None:
+            parse(instrument.timedInputSource(path), handler)
+        else:
+            parse(path, handler)
+        return
+    with open(path, "rb") as source:
+        _parseXmlSource(source, handler, backend)
+
+
+@instrumented("parse")
+def parseXmlString(data, handler, backend=None):
+    import io
+
+    _parseXmlSource(io.BytesIO(data), handler, backend)
+
+
+@instrumented("list")
 def listSvgFiles(directory=None):
     if directory is None:
         # Default to the kanji directory in the kvg package
@@ -73,12 +228,225 @@ def listSvgFiles(directory=None):
     return [SvgFileInfo(f, directory) for f in os.listdir(directory)]
 
 
-def readXmlFile(path, KanjisHandler=None):
+def _readSvgFiles(paths, backend=None, validate=True):
+    results = []
+    for path in paths:
+        try:
+            info = SvgFileInfo(os.path.basename(path), os.path.dirname(path))
+            results.append((path, info.read(backend=backend, validate=validate), None))
+        except Exception as e:
+            results.append((path, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+def loadAllSvg(
+    directory=None,
+    workers=None,
+    errors=None,
+    chunksize=64,
+    backend=None,
+    validate=True,
+    aliases=None,
+):
+    """Parse every SVG file of directory using a pool of worker processes.
+
+    Returns a dict of Kanji indexed by their file name without the .svg
+    extension, in the order of the sorted file names, whatever the number of
+    workers. Files that fail to parse are reported in the errors dict (path ->
+    message) if given, printed otherwise, and do not stop the run. Some files
+    describe another kanji than the one they are named after (e.g. 031d0.svg
+    draws 04e00): they are kept under their file name, and recorded in the
+    aliases dict (file name -> kId()) if given. validate is passed to the
+    SVGHandler of each file."""
+    if directory is None:
+        directory = os.path.join(os.path.dirname(__file__), "kanji")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    paths = [os.path.join(directory, f) for f in sorted(os.listdir(directory))]
+    chunks = [paths[i : i + chunksize] for i in range(0, len(paths), chunksize)]
+    readChunk = functools.partial(_readSvgFiles, backend=backend, validate=validate)
+
+    if workers <= 1 or len(chunks) <= 1:
+        results = map(readChunk, chunks)
+        return _collectSvgResults(results, errors, aliases)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Whole chunks are sent back at once so each batch of trees is pickled in
+    # a single payload, and map() preserves the submission order.
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return _collectSvgResults(executor.map(readChunk, chunks), errors, aliases)
+
+
+def _collectSvgResults(results, errors, aliases):
+    kanjis = {}
+    for chunk in results:
+        for path, kanji, error in chunk:
+            if error is not None:
+                if errors is None:
+                    print(f"{path}: {error}")
+                else:
+                    errors[path] = error
+                continue
+            # Checked by SvgFileInfo: the name is the kId() with its .svg suffix
+            kid = os.path.basename(path)[:-4]
+            if aliases is not None and kanji.kId() != kid:
+                aliases[kid] = kanji.kId()
+            kanjis[kid] = kanji
+    return kanjis
+
+
+def mapInOrder(executor, function, chunks, pending):
+    """Yield the result of function for each of chunks in order, like
+    executor.map() but with at most pending chunks submitted ahead of the
+    consumer, so that neither the chunks nor their results pile up in
+    memory."""
+    from collections import deque
+
+    futures = deque()
+    for chunk in chunks:
+        if len(futures) == pending:
+            yield futures.popleft().result()
+        futures.append(executor.submit(function, chunk))
+    while futures:
+        yield futures.popleft().result()
+
+
+def kanjiItems(kanjis):
+    """Return the (id, Kanji) pairs of kanjis, either a dict of Kanji such as
+    returned by loadAllSvg(), or an iterable of Kanji identified by kId()."""
+    from collections.abc import Mapping
+
+    if isinstance(kanjis, Mapping):
+        return kanjis.items()
+    return ((kanji.kId(), kanji) for kanji in kanjis)
+
+
+def iterXmlFile(path, KanjisHandler=None, backend=None, validate=True):
+    """Yield the kanji of a release file one by one, as soon as each <kanji>
+    element is closed. Kanji already yielded are not kept by the parser, so
+    memory use does not grow with the file size."""
     if KanjisHandler is None:
         from kvg.kanjivg import KanjisHandler
-    handler = KanjisHandler()
-    parseXmlFile(path, handler)
+    handler = KanjisHandler(validate=validate)
+    parsed = []
+    handler.onKanji = parsed.append
+    feed, close = xmlParser(handler, backend)
+    with open(path, "rb") as source:
+        if instrument.recorder is not None:
+            source = instrument.TimedReader(source)
+        for block in iter(lambda: source.read(XML_BLOCK_SIZE), b""):
+            feed(block)
+            yield from parsed
+            parsed.clear()
+        close()
+    yield from parsed
+
+
+def readXmlFile(path, KanjisHandler=None, backend=None, validate=True):
+    if KanjisHandler is None:
+        from kvg.kanjivg import KanjisHandler
+    handler = KanjisHandler(validate=validate)
+    parseXmlFile(path, handler, backend)
     if list(handler.kanjis.values()):
         return handler.kanjis
     else:
         raise Exception(f"File does not contain any kanji entries. ({path})")
+
+
+# Sidecar index of kanjivg.xml: maps each kanji id (as in kvg:kanji_<id>) to
+# the byte range of its <kanji> element, so single entries can be parsed
+# without reading the whole file.
+XML_INDEX_SUFFIX = ".idx"
+XML_ROOT_START = b"<kanjivg xmlns:kvg='http://kanjivg.tagaini.net'>\n"
+XML_ROOT_END = b"</kanjivg>\n"
+
+
+def xmlIndexPath(path):
+    return path + XML_INDEX_SUFFIX
+
+
+def _xmlIndexStamp(release):
+    st = os.stat(release)
+    return [st.st_size, st.st_mtime_ns]
+
+
+@instrumented("index.write")
+def writeXmlIndex(index, path, release):
+    """Write the index of the release file at release to path, together with
+    the size and modification time of the release file."""
+    import json
+
+    data = {"stamp": _xmlIndexStamp(release), "kanji": index}
+    with open(path, "w", encoding="utf8") as out:
+        json.dump(data, out, separators=(",", ":"))
+
+
+def buildXmlIndex(path):
+    """Scan an existing release file for the byte ranges of its entries."""
+    import mmap
+    import re
+
+    index = {}
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for match in re.finditer(rb'<kanji id="kvg:kanji_([^"]+)">', mm):
+            end = mm.find(b"</kanji>", match.end())
+            if end < 0:
+                raise Exception(
+                    f"Unterminated kanji entry at {match.start()}. ({path})"
+                )
+            index[match.group(1).decode("utf8")] = (
+                match.start(),
+                end + len(b"</kanji>"),
+            )
+    return index
+
+
+def readXmlIndex(path, write=True):
+    """Return the index of the release file at path. It is read from the
+    sidecar file if the size and modification time it records still match
+    the release file, and rebuilt otherwise; unless write is False, the
+    rebuilt index is saved to the sidecar file."""
+    import json
+
+    stamp = _xmlIndexStamp(path)
+    try:
+        with open(xmlIndexPath(path), encoding="utf8") as f:
+            data = json.load(f)
+        if data["stamp"] == stamp:
+            return {k: tuple(v) for k, v in data["kanji"].items()}
+    except (OSError, ValueError, KeyError):
+        pass
+    index = buildXmlIndex(path)
+    if not write:
+        return index
+    try:
+        writeXmlIndex(index, xmlIndexPath(path), path)
+    except OSError:
+        pass
+    return index
+
+
+def readXmlEntries(
+    path, ids, index=None, KanjisHandler=None, backend=None, validate=True
+):
+    """Parse only the entries of ids (kanji ids, with variant suffix if any)
+    from the release file at path. Returns a dict indexed by those ids;
+    unknown ids are skipped."""
+    import mmap
+
+    if KanjisHandler is None:
+        from kvg.kanjivg import KanjisHandler
+    if index is None:
+        index = readXmlIndex(path)
+    kanjis = {}
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for kid in ids:
+            if kid not in index:
+                continue
+            start, end = index[kid]
+            handler = KanjisHandler(validate=validate)
+            data = XML_ROOT_START + mm[start:end] + XML_ROOT_END
+            parseXmlString(data, handler, backend)
+            kanjis[kid] = list(handler.kanjis.values())[0]
+    return kanjis
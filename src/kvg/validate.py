@@ -0,0 +1,99 @@
+import os
+from collections import namedtuple
+
+from kvg.instrument import instrumented
+
+# A problem found in a kanji. group is the id of the offending group, as
+# returned by Kanji.getGroups(); rule is one of the keys of RULES.
+Diagnostic = namedtuple("Diagnostic", ["kanji", "group", "rule", "message"])
+
+RULES = {
+    "number-without-part": "Number specified, but part missing",
+    "missing-numbered-group": "Missing numbered group",
+    "incorrectly-numbered-group": "Incorrectly numbered group",
+    "duplicate-numbered-group": "Duplicate numbered group",
+    "multipart-not-started": "Incorrectly started multi-part group",
+    "multipart-misnumbered": "Incorrectly splitted multi-part group",
+    "parse-error": "File could not be parsed",
+}
+
+
+@instrumented("validate")
+def validateKanji(kanji):
+    """Check the consistency of the part and number attributes of the groups
+    of a Kanji: the parts of an element must follow each other, and numbered
+    elements must not be repeated. Returns a list of Diagnostic, in document
+    order."""
+    ret = []
+    kid = kanji.kId()
+    # Last part met of each multi-part element, keyed by element and number
+    # for numbered ones
+    parts = {}
+    for gid, group in kanji.getGroups():
+        element, part, number = group.element, group.part, group.number
+        rule = None
+        if number:
+            key = f"{element}{number}"
+            if not part:
+                ret.append(
+                    Diagnostic(
+                        kid, gid, "number-without-part", RULES["number-without-part"]
+                    )
+                )
+            if part and part > 1:
+                if element and key not in parts:
+                    rule = "missing-numbered-group"
+                elif element and parts[key] != part - 1:
+                    rule = "incorrectly-numbered-group"
+            elif element and key in parts:
+                rule = "duplicate-numbered-group"
+            if element and part:
+                parts[key] = part
+        elif part:
+            if part > 1:
+                if element and element not in parts:
+                    rule = "multipart-not-started"
+                elif element and parts[element] != part - 1:
+                    rule = "multipart-misnumbered"
+            if element:
+                parts[element] = part
+        if rule is not None:
+            ret.append(Diagnostic(kid, gid, rule, RULES[rule]))
+    return ret
+
+
+def printDiagnostics(diagnostics, out=None):
+    """Print diagnostics the way parsing used to report them."""
+    for diagnostic in diagnostics:
+        print(f"{diagnostic.kanji}: {diagnostic.message}", file=out)
+
+
+def _lintFiles(paths):
+    from kvg.utils import _readSvgFiles
+
+    results = []
+    for path, kanji, error in _readSvgFiles(paths, validate=False):
+        if error is not None:
+            results.append((path, [Diagnostic(None, None, "parse-error", error)]))
+        else:
+            results.append((path, validateKanji(kanji)))
+    return results
+
+
+def lintFiles(paths, workers=None, chunksize=64):
+    """Parse and validate SVG files using a pool of worker processes. Yields
+    (path, diagnostics) pairs in the order of paths; files that cannot be
+    parsed get a single parse-error diagnostic."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    chunks = [paths[i : i + chunksize] for i in range(0, len(paths), chunksize)]
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield from _lintFiles(chunk)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for results in executor.map(_lintFiles, chunks):
+            yield from results
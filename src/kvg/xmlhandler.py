@@ -18,6 +18,34 @@
 
 import xml.sax.handler
 
+# Shared by all the element names a handler has no method for
+_noHandlers = (None, None, None)
+
+# Dispatch tables, built once per handler class
+_dispatchTables = {}
+
+
+def dispatchTable(cls):
+    """Return a dict mapping each element name to the (handle_start_*,
+    handle_data_*, handle_end_*) functions of cls, None where undefined."""
+    table = _dispatchTables.get(cls)
+    if table is None:
+        names = set()
+        for attrName in dir(cls):
+            for prefix in ("handle_start_", "handle_data_", "handle_end_"):
+                if attrName.startswith(prefix):
+                    names.add(attrName[len(prefix) :])
+        table = {
+            name: (
+                getattr(cls, f"handle_start_{name}", None),
+                getattr(cls, f"handle_data_{name}", None),
+                getattr(cls, f"handle_end_{name}", None),
+            )
+            for name in names
+        }
+        _dispatchTables[cls] = table
+    return table
+
 
 class BasicHandler(xml.sax.handler.ContentHandler):
     """Basic SAX handler."""
@@ -25,7 +53,17 @@ class BasicHandler(xml.sax.handler.ContentHandler):
     def __init__(self):
         xml.sax.handler.ContentHandler.__init__(self)
         self.elementsTree = []
-        self.current_chars = ""
+        self.dispatch = dispatchTable(type(self))
+        # Text is collected in chunks and only joined when a handler needs it
+        self.chars = []
+
+    @property
+    def current_chars(self):
+        return "".join(self.chars)
+
+    @current_chars.setter
+    def current_chars(self, value):
+        self.chars = [value]
 
     def currentElement(self):
         """Return the current element."""
@@ -33,25 +71,21 @@ class BasicHandler(xml.sax.handler.ContentHandler):
 
     def startElement(self, name, attrs):
         """Handle the start of an element."""
-        self.elementsTree.append(str(name))
-        attrName = f"handle_start_{str(name)}"
-        if hasattr(self, attrName):
-            rfunc = getattr(self, attrName)
-            rfunc(attrs)
-        self.current_chars = ""
+        self.elementsTree.append(name)
+        start = self.dispatch.get(name, _noHandlers)[0]
+        if start is not None:
+            start(self, attrs)
+        self.chars = []
 
     def endElement(self, name):
         """Handle the end of an element."""
-        attrName = f"handle_data_{name}"
-        if hasattr(self, attrName):
-            rfunc = getattr(self, attrName)
-            rfunc(self.current_chars)
-        attrName = f"handle_end_{str(name)}"
-        if hasattr(self, attrName):
-            rfunc = getattr(self, attrName)
-            rfunc()
+        _, data, end = self.dispatch.get(name, _noHandlers)
+        if data is not None:
+            data(self, "".join(self.chars))
+        if end is not None:
+            end(self)
         self.elementsTree.pop()
 
     def characters(self, content):
         """Add characters to the current element."""
-        self.current_chars += content
+        self.chars.append(content)
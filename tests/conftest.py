@@ -0,0 +1,18 @@
+import pytest
+
+from corpus import SAMPLE_FILES, loadKanji, writeRelease
+
+
+@pytest.fixture(scope="session")
+def sampleRelease(tmp_path_factory):
+    """A release file of the sample files named after a kanji without
+    variant, as kvg.py release would pick them. Alias files are left out so
+    that every entry has the kId() of its file."""
+    kanjis = []
+    for f in SAMPLE_FILES:
+        kanji = loadKanji(f)
+        if len(f) == 9 and kanji.kId() == f[:-4]:
+            kanjis.append(kanji)
+    path = tmp_path_factory.mktemp("release") / "kanjivg.xml"
+    writeRelease(path, kanjis)
+    return str(path)
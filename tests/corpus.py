@@ -0,0 +1,69 @@
+import os
+
+import kvg
+
+KANJI_DIR = os.path.join(os.path.dirname(kvg.__file__), "kanji")
+
+# Fixed sample of kanji/: one file every few hundred, plus an alias file
+# (031d0.svg draws 04e00) and the file it aliases
+SAMPLE_FILES = [
+    "00021.svg",
+    "02ea4.svg",
+    "031d0.svg",
+    "04e00.svg",
+    "05016.svg",
+    "053df-VtLst.svg",
+    "058de.svg",
+    "05b57.svg",
+    "05d82-Kaisho.svg",
+    "0610d.svg",
+    "0652b-Kaisho.svg",
+    "06803.svg",
+    "06b50.svg",
+    "06c34.svg",
+    "06ff3.svg",
+    "0751c.svg",
+    "078e7-Kaisho.svg",
+    "07c9f-Kaisho.svg",
+    "08033.svg",
+    "083b1.svg",
+    "08870.svg",
+    "08ccd.svg",
+    "0914b.svg",
+    "096f6-Insatsu.svg",
+    "09b23-HzFst.svg",
+    "26951-HzFst.svg",
+]
+
+
+def loadKanji(name="05b57.svg"):
+    """Parse a file of kanji/, without validation. The default, 字, has a
+    group nested in another one."""
+    from kvg.utils import SvgFileInfo
+
+    return SvgFileInfo(name, KANJI_DIR).read(validate=False)
+
+
+def samplePaths():
+    """Return the paths of SAMPLE_FILES."""
+    return [os.path.join(KANJI_DIR, f) for f in SAMPLE_FILES]
+
+
+def writeRelease(path, kanjis):
+    """Write a release file of the kanjis (Kanji iterable) to path."""
+    from kvg.kvg import writeReleaseXml
+    from kvg.svgwriter import strokesToSVG
+
+    fragments = [
+        (
+            kanji.kId(),
+            (
+                f'<kanji id="kvg:kanji_{kanji.kId()}">\n'
+                + strokesToSVG(kanji)
+                + "</kanji>"
+            ).encode("utf-8"),
+        )
+        for kanji in kanjis
+    ]
+    with open(path, "wb") as out:
+        writeReleaseXml(out, fragments)
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from corpus import KANJI_DIR, SAMPLE_FILES, samplePaths
+from kvg.snapshot import encodeKanji
+from kvg.utils import SvgFileInfo, readXmlEntries, readXmlFile, xmlBackends
+
+BACKENDS = ["sax", "expat", "lxml"]
+
+
+def requireBackend(backend):
+    if backend not in xmlBackends():
+        pytest.skip(f"{backend} is not installed")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def testSvgFiles(backend):
+    requireBackend(backend)
+    for f in SAMPLE_FILES:
+        info = SvgFileInfo(f, KANJI_DIR)
+        expected = encodeKanji(info.read(backend="sax", validate=False))
+        assert encodeKanji(info.read(backend=backend, validate=False)) == expected, f
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def testReleaseFile(backend, sampleRelease):
+    requireBackend(backend)
+    expected = readXmlFile(sampleRelease, backend="sax", validate=False)
+    parsed = readXmlFile(sampleRelease, backend=backend, validate=False)
+    assert list(parsed) == list(expected)
+    for kid, kanji in parsed.items():
+        assert encodeKanji(kanji) == encodeKanji(expected[kid]), kid
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def testReleaseEntries(backend, sampleRelease):
+    requireBackend(backend)
+    expected = readXmlFile(sampleRelease, backend="sax", validate=False)
+    parsed = readXmlEntries(
+        sampleRelease, list(expected), backend=backend, validate=False
+    )
+    for kid, kanji in expected.items():
+        assert encodeKanji(parsed[kid]) == encodeKanji(kanji), kid
+
+
+def testReleaseMatchesSvgFiles(sampleRelease):
+    parsed = readXmlFile(sampleRelease, validate=False)
+    for path in samplePaths():
+        name = os.path.basename(path)
+        kanji = SvgFileInfo(name, KANJI_DIR).read(validate=False)
+        if len(name) != 9 or kanji.kId() != name[:-4]:
+            continue
+        assert encodeKanji(parsed[kanji.kId()]) == encodeKanji(kanji), name
+
+
+def testUnknownBackend():
+    with pytest.raises(ValueError):
+        SvgFileInfo(SAMPLE_FILES[0], KANJI_DIR).read(backend="dom")
@@ -0,0 +1,58 @@
+from corpus import loadKanji
+from kvg.kanjivg import Stroke, StrokeGr
+from kvg.snapshot import decodeKanji, encodeKanji
+
+
+def deepestGroup(kanji):
+    return kanji.getGroups()[-1][1]
+
+
+def components(kanji):
+    return kanji.strokes.components(recursive=True)
+
+
+def testElementInvalidatesAncestors():
+    kanji = loadKanji()
+    before = components(kanji)
+    deepestGroup(kanji).element = "X"
+    assert components(kanji) != before
+    assert components(kanji) == components(decodeKanji(encodeKanji(kanji)))
+
+
+def testOriginalInvalidatesAncestors():
+    kanji = loadKanji()
+    before = components(kanji)
+    group = deepestGroup(kanji)
+    group.original = "X"
+    assert components(kanji) != before
+    assert "X" in components(kanji)
+    group.original = None
+    assert components(kanji) == before
+
+
+def newStroke(svg):
+    stroke = Stroke()
+    stroke.svg = svg
+    return stroke
+
+
+def testAddChildInvalidatesStrokes():
+    kanji = loadKanji()
+    before = kanji.getStrokes()
+    # 冖, nested in 宀, holds the second and third strokes
+    nested = dict(kanji.getGroups())["05b57-g2"]
+    assert nested.getStrokes() == before[1:3]
+
+    added = newStroke("M1,1")
+    nested.addChild(added)
+    assert kanji.getStrokes() == before[:3] + [added] + before[3:]
+    assert nested.getStrokes() == before[1:3] + [added]
+
+    # A new group and the stroke added to it afterwards
+    group = StrokeGr()
+    group.setParent(nested)
+    group.element = "X"
+    deeper = newStroke("M2,2")
+    group.addChild(deeper)
+    assert kanji.getStrokes() == before[:3] + [added, deeper] + before[3:]
+    assert "X" in components(kanji)
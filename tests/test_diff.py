@@ -0,0 +1,169 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from corpus import KANJI_DIR, SAMPLE_FILES, loadKanji, writeRelease
+from kvg.diff import diffCorpora, diffKanji
+from kvg.kanjivg import Stroke, StrokeGr
+from kvg.snapshot import decodeKanji, encodeKanji
+from kvg.utils import xmlIndexPath
+
+# 05b57 (字): 宀 (g1: a stroke, then 冖 as g2 with two strokes) over 子 (g3)
+
+
+def copyKanji(kanji):
+    return decodeKanji(encodeKanji(kanji))
+
+
+def group(kanji, gid):
+    return dict(kanji.getGroups())[gid]
+
+
+def testUnchanged():
+    kanji = loadKanji()
+    assert diffKanji(kanji, copyKanji(kanji)) == []
+
+
+def testChangedPath():
+    old = loadKanji()
+    new = copyKanji(old)
+    new.getStrokes()[-1].svg += "l1,1"
+    assert diffKanji(old, new) == ["05b57-g3"]
+
+
+def testChangedStrokeType():
+    old = loadKanji()
+    new = copyKanji(old)
+    new.getStrokes()[0].element = "㇒"
+    assert diffKanji(old, new) == ["05b57-g1"]
+    new = copyKanji(old)
+    new.getStrokes()[1].element = "㇒"
+    assert diffKanji(old, new) == ["05b57-g2"]
+
+
+def testChangedAttributes():
+    old = loadKanji()
+    new = copyKanji(old)
+    group(new, "05b57-g2").part = 1
+    group(new, "05b57").radical = "general"
+    assert diffKanji(old, new) == ["05b57", "05b57-g2"]
+
+
+def testGainedSubGroup():
+    old = loadKanji()
+    new = copyKanji(old)
+    parent = group(new, "05b57-g3")
+    added = StrokeGr()
+    added.element = "一"
+    added.setParent(parent)
+    stroke = Stroke()
+    stroke.svg = "M1,1"
+    added.addChild(stroke)
+    assert diffKanji(old, new) == ["05b57-g3"]
+    assert diffKanji(new, old) == ["05b57-g3"]
+
+
+def testLostSubGroup():
+    old = loadKanji()
+    new = copyKanji(old)
+    # 宀 loses 冖, its strokes are kept
+    outer = group(new, "05b57-g1")
+    outer.children = [outer.children[0]] + outer.children[1].children
+    outer.invalidate()
+    assert len(new.getStrokes()) == len(old.getStrokes())
+    assert diffKanji(old, new) == ["05b57-g1"]
+    assert diffKanji(new, old) == ["05b57-g1"]
+    # Ids are the ones of the new tree: 子 is now g2
+    group(new, "05b57-g2").element = "孑"
+    assert diffKanji(old, new) == ["05b57-g1", "05b57-g2"]
+
+
+@pytest.fixture
+def versions(tmp_path):
+    """Two copies of a few files of kanji/: 04e00 is edited in the new one,
+    05b57 only reformatted, 06c34 removed and 08033 added."""
+    old = tmp_path / "old"
+    new = tmp_path / "new"
+    os.mkdir(old)
+    for name in ("04e00.svg", "05b57.svg", "06c34.svg", "0751c.svg"):
+        shutil.copy(os.path.join(KANJI_DIR, name), old)
+    shutil.copytree(old, new)
+    path = new / "04e00.svg"
+    data = path.read_text(encoding="utf-8")
+    path.write_text(data.replace('kvg:type="㇐"', 'kvg:type="㇑"'), encoding="utf-8")
+    path = new / "05b57.svg"
+    path.write_text(path.read_text(encoding="utf-8").replace("\n", "\r\n"))
+    os.unlink(new / "06c34.svg")
+    shutil.copy(os.path.join(KANJI_DIR, "08033.svg"), new)
+    return str(old), str(new)
+
+
+def testDirectories(versions):
+    old, new = versions
+    result = diffCorpora(old, new, workers=1)
+    assert result.added == ["08033"]
+    assert result.removed == ["06c34"]
+    assert result.modified == {"04e00": ["04e00"]}
+
+
+def testCommand(versions, capsys):
+    from kvg.kvg import diff
+
+    old, new = versions
+    with pytest.raises(SystemExit) as e:
+        diff(old, new, workers=1)
+    assert e.value.code == 1
+    out, err = capsys.readouterr()
+    assert [json.loads(line) for line in out.splitlines()] == [
+        {"kanji": "08033", "change": "added"},
+        {"kanji": "06c34", "change": "removed"},
+        {"kanji": "04e00", "change": "modified", "groups": ["04e00"]},
+    ]
+    assert err == "1 added, 1 removed, 1 modified\n"
+
+    diff(old, old, workers=1)
+    out, err = capsys.readouterr()
+    assert out == ""
+    assert err == "0 added, 0 removed, 0 modified\n"
+
+
+def testDirectoriesInParallel(versions):
+    old, new = versions
+    assert diffCorpora(old, new, workers=2, chunksize=1) == diffCorpora(
+        old, new, workers=1
+    )
+
+
+def testDirectoryAgainstRelease(tmp_path):
+    names = [f for f in SAMPLE_FILES if len(f) == 9 and f != "031d0.svg"]
+    directory = tmp_path / "kanji"
+    os.mkdir(directory)
+    for name in names:
+        shutil.copy(os.path.join(KANJI_DIR, name), directory)
+    release = str(tmp_path / "kanjivg.xml")
+    writeRelease(release, [loadKanji(name) for name in names])
+    errors = {}
+    result = diffCorpora(str(directory), release, workers=1, errors=errors)
+    assert result == ([], [], {})
+    assert errors == {}
+
+    kanji = loadKanji("06c34.svg")
+    kanji.getStrokes()[0].svg = "M1,1"
+    others = [
+        loadKanji(name) for name in names if name not in ("05b57.svg", "06c34.svg")
+    ]
+    writeRelease(release, others + [kanji])
+    result = diffCorpora(str(directory), release, workers=1)
+    assert result.added == []
+    assert result.removed == ["05b57"]
+    assert result.modified == {"06c34": ["06c34"]}
+
+
+def testReleaseLeftUntouched(tmp_path):
+    release = str(tmp_path / "kanjivg.xml")
+    writeRelease(release, [loadKanji("04e00.svg"), loadKanji("05b57.svg")])
+    assert diffCorpora(release, release, workers=1) == ([], [], {})
+    assert not os.path.exists(xmlIndexPath(release))
+    assert os.listdir(tmp_path) == ["kanjivg.xml"]
@@ -0,0 +1,46 @@
+import os
+import re
+
+from corpus import KANJI_DIR
+from kvg.fileindex import buildFileIndex, updateFileIndex
+
+
+def makeIndex(directory):
+    """Index of directory as make-index.pl builds it."""
+    index = {}
+    for name in sorted(os.listdir(directory)):
+        match = re.fullmatch(r"([0-9a-f]{5})(-.*)?\.svg", name)
+        if match:
+            index.setdefault(chr(int(match.group(1), 16)), []).append(name)
+    return index
+
+
+def touch(directory, *names):
+    for name in names:
+        (directory / name).write_text("")
+
+
+def testMatchesMakeIndex():
+    assert buildFileIndex(KANJI_DIR) == makeIndex(KANJI_DIR)
+
+
+def testStrayFilesSkipped(tmp_path, capsys):
+    touch(tmp_path, "04e00.svg", "04e00-Kaisho.svg", "05b57.svg")
+    touch(tmp_path, "README", "notes.txt", "4E00.svg", "kanji.svg")
+    index = buildFileIndex(str(tmp_path))
+    assert index == {"一": ["04e00-Kaisho.svg", "04e00.svg"], "字": ["05b57.svg"]}
+    warnings = capsys.readouterr().err.splitlines()
+    assert sorted(warnings) == [
+        f"Could not get kanji from {tmp_path / '4E00.svg'}",
+        f"Could not get kanji from {tmp_path / 'kanji.svg'}",
+    ]
+
+
+def testUpdateSkipsStrayFiles(tmp_path, capsys):
+    touch(tmp_path, "04e00.svg", "05b57.svg")
+    index = buildFileIndex(str(tmp_path))
+    touch(tmp_path, "06c34.svg", "kanji.svg", "README")
+    os.unlink(tmp_path / "05b57.svg")
+    assert updateFileIndex(index, str(tmp_path)) == (1, 1)
+    assert index == {"一": ["04e00.svg"], "水": ["06c34.svg"]}
+    assert "kanji.svg" in capsys.readouterr().err
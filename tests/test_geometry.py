@@ -0,0 +1,198 @@
+import re
+
+import pytest
+
+from corpus import SAMPLE_FILES, loadKanji
+
+np = pytest.importorskip("numpy")
+
+from kvg.geometry import (  # noqa: E402
+    groupBounds,
+    groupLengths,
+    kanjiBounds,
+    kanjiLengths,
+    parsePath,
+    strokeBounds,
+    strokeLengths,
+    strokeTable,
+)
+
+
+def segments(d):
+    return parsePath(d).tolist()
+
+
+def line(x0, y0, x1, y1):
+    dx = (x1 - x0) / 3
+    dy = (y1 - y0) / 3
+    return [[x0, y0], [x0 + dx, y0 + dy], [x1 - dx, y1 - dy], [x1, y1]]
+
+
+def testAbsoluteCurve():
+    assert segments("M10,20C11,22,13,24,15,26") == [
+        [[10, 20], [11, 22], [13, 24], [15, 26]]
+    ]
+    assert parsePath("M10,20").shape == (0, 4, 2)
+
+
+def testRelativeCommands():
+    assert segments("m10,20c1,2,3,4,5,6") == [[[10, 20], [11, 22], [13, 24], [15, 26]]]
+    # Relative to the end of the previous segment, not to the moveto
+    assert segments("M0,0C1,1,2,2,3,3c1,0,2,0,3,0l0,4") == [
+        [[0, 0], [1, 1], [2, 2], [3, 3]],
+        [[3, 3], [4, 3], [5, 3], [6, 3]],
+        line(6, 3, 6, 7),
+    ]
+
+
+def testSmoothCurveReflection():
+    expected = [
+        [[0, 0], [0, 1], [2, 1], [2, 0]],
+        # First control point: (2, 1) reflected about (2, 0)
+        [[2, 0], [2, -1], [4, -1], [4, 0]],
+    ]
+    assert segments("M0,0C0,1,2,1,2,0S4,-1,4,0") == expected
+    assert segments("M0,0C0,1,2,1,2,0s2,-1,2,0") == expected
+    # S after S reflects the control point of the previous S
+    assert segments("M0,0C0,1,2,1,2,0s2,-1,2,0s2,1,2,0")[2] == [
+        [4, 0],
+        [4, 1],
+        [6, 1],
+        [6, 0],
+    ]
+
+
+def testSmoothCurveWithoutPreviousCurve():
+    # The first control point is then the current point
+    assert segments("M1,1S2,3,4,5") == [[[1, 1], [1, 1], [2, 3], [4, 5]]]
+    assert segments("M0,0C1,1,2,2,3,3L6,3S7,4,8,5")[2] == [
+        [6, 3],
+        [6, 3],
+        [7, 4],
+        [8, 5],
+    ]
+
+
+def testClosePath():
+    assert segments("M0,0L9,0L9,9Z") == [
+        line(0, 0, 9, 0),
+        line(9, 0, 9, 9),
+        line(9, 9, 0, 0),
+    ]
+    # Already at the start point: nothing to close
+    assert segments("M0,0L9,0L0,0z") == [line(0, 0, 9, 0), line(9, 0, 0, 0)]
+    # Z moves back to the start of the subpath
+    assert segments("M3,3L9,3Zl0,6") == [
+        line(3, 3, 9, 3),
+        line(9, 3, 3, 3),
+        line(3, 3, 3, 9),
+    ]
+    # and resets the reflected control point
+    assert segments("M0,0C0,1,2,1,2,0ZS4,-1,4,0")[-1] == [
+        [0, 0],
+        [0, 0],
+        [4, -1],
+        [4, 0],
+    ]
+
+
+def testImplicitRepeatedCommands():
+    assert segments("M0,0c1,1,2,2,3,3,1,1,2,2,3,3") == [
+        [[0, 0], [1, 1], [2, 2], [3, 3]],
+        [[3, 3], [4, 4], [5, 5], [6, 6]],
+    ]
+    # Coordinates following a moveto are linetos of the same kind
+    assert segments("M1,1 4,1 4,4") == [line(1, 1, 4, 1), line(4, 1, 4, 4)]
+    assert segments("m1,1 3,0 0,3") == [line(1, 1, 4, 1), line(4, 1, 4, 4)]
+
+
+def testNumberFormats():
+    # Separators may be left out before a sign or a second decimal point
+    assert segments("M.5.5c1-1,2-2,3e1-3E-1") == [
+        [[0.5, 0.5], [1.5, -0.5], [2.5, -1.5], [30.5, 0.2]]
+    ]
+
+
+def testSampleStrokes():
+    for f in SAMPLE_FILES:
+        kanji = loadKanji(f)
+        for stroke in kanji.getStrokes():
+            beziers = parsePath(stroke.svg)
+            assert len(beziers), stroke.svg
+            # The strokes are single subpaths: each segment starts where the
+            # previous one ended
+            assert (beziers[1:, 0] == beziers[:-1, 3]).all(), stroke.svg
+            start = re.match(r"M\s*([-\d.]+)[\s,]*([-\d.]+)", stroke.svg)
+            assert beziers[0, 0].tolist() == [float(v) for v in start.groups()]
+
+
+def testInvalidPaths():
+    with pytest.raises(ValueError):
+        parsePath("10,10L20,20")
+    with pytest.raises(ValueError):
+        parsePath("M0,0C1,1,2,2")
+
+
+@pytest.fixture(scope="module")
+def sampleKanjis():
+    return {f: loadKanji(f) for f in SAMPLE_FILES}
+
+
+@pytest.fixture(scope="module")
+def table(sampleKanjis):
+    return strokeTable(sampleKanjis)
+
+
+def polyline(d, n=2000):
+    """Points of a stroke, each segment evaluated at n + 1 parameter values
+    with the cubic Bézier formula."""
+    t = np.linspace(0, 1, n + 1)[:, None]
+    mt = 1 - t
+    points = [
+        mt**3 * p0 + 3 * mt * mt * t * p1 + 3 * mt * t * t * p2 + t**3 * p3
+        for p0, p1, p2, p3 in parsePath(d)
+    ]
+    return np.concatenate(points)
+
+
+def testStrokesAgainstPolylines(sampleKanjis, table):
+    strokes = [s for k in sampleKanjis.values() for s in k.getStrokes()]
+    assert len(table) == len(strokes)
+    bounds = strokeBounds(table)
+    lengths = strokeLengths(table)
+    for stroke, box, length in zip(strokes, bounds, lengths):
+        points = polyline(stroke.svg)
+        # The polyline lies inside the exact box and reaches its sides
+        assert (points.min(0) >= box[0] - 1e-9).all(), stroke.svg
+        assert (points.max(0) <= box[1] + 1e-9).all(), stroke.svg
+        assert np.allclose(points.min(0), box[0], atol=1e-4), stroke.svg
+        assert np.allclose(points.max(0), box[1], atol=1e-4), stroke.svg
+        reference = np.linalg.norm(np.diff(points, axis=0), axis=1).sum()
+        assert length == pytest.approx(reference, rel=1e-4), stroke.svg
+
+
+def testGroupsAreUnionsOfStrokes(sampleKanjis, table):
+    bounds = strokeBounds(table)
+    lengths = strokeLengths(table)
+    groupBoxes = groupBounds(table)
+    groupLens = groupLengths(table)
+    kanjiBoxes = kanjiBounds(table)
+    kanjiLens = kanjiLengths(table)
+    g = 0
+    first = 0
+    for k, kanji in enumerate(sampleKanjis.values()):
+        strokes = kanji.getStrokes()
+        index = {id(stroke): first + i for i, stroke in enumerate(strokes)}
+        for _, group in kanji.getGroups():
+            rows = [index[id(stroke)] for stroke in group.getStrokes()]
+            assert (groupBoxes[g, 0] == bounds[rows, 0].min(0)).all()
+            assert (groupBoxes[g, 1] == bounds[rows, 1].max(0)).all()
+            assert groupLens[g] == pytest.approx(lengths[rows].sum())
+            g += 1
+        rows = list(range(first, first + len(strokes)))
+        assert (kanjiBoxes[k] == groupBoxes[table.kanjiGroupOffsets[k]]).all()
+        assert (kanjiBoxes[k, 0] == bounds[rows, 0].min(0)).all()
+        assert (kanjiBoxes[k, 1] == bounds[rows, 1].max(0)).all()
+        assert kanjiLens[k] == pytest.approx(lengths[rows].sum())
+        first += len(strokes)
+    assert g == len(groupBoxes)
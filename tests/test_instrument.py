@@ -0,0 +1,51 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import types
+
+import kvg
+import kvg.utils
+from corpus import samplePaths
+from kvg import instrument
+
+
+def testOnlyKvgModulesPatched(monkeypatch):
+    original = kvg.utils.parseXmlFile
+    other = types.ModuleType("other")
+    other.parseXmlFile = original
+    monkeypatch.setitem(sys.modules, "other", other)
+
+    recorder = instrument.enable()
+    try:
+        assert kvg.utils.parseXmlFile is not original
+        assert kvg.utils.parseXmlFile.__wrapped__ is original
+        assert other.parseXmlFile is original
+        kvg.utils.listSvgFiles(os.path.dirname(samplePaths()[0]))
+        assert recorder.timers["list"][0] == 1
+    finally:
+        instrument.disable()
+    assert kvg.utils.parseXmlFile is original
+    assert other.parseXmlFile is original
+
+
+def testScriptInstrumented(tmp_path):
+    """Functions bound in kvg.py run as a script are timed too."""
+    os.mkdir(tmp_path / "kanji")
+    for path in samplePaths()[:4]:
+        shutil.copy(path, tmp_path / "kanji")
+    srcDir = os.path.dirname(os.path.dirname(kvg.__file__))
+    result = subprocess.run(
+        [sys.executable, "-P", os.path.join(srcDir, "kvg", "kvg.py")]
+        + ["release", "--profile"],
+        cwd=tmp_path,
+        env=dict(os.environ, PYTHONPATH=srcDir),
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    timers = json.loads(result.stderr)["timers"]
+    # Defined in kvg.py, and imported into it from kvg.utils
+    for phase in ("release", "release.extract", "release.write", "index.write"):
+        assert timers[phase]["calls"] == 1, phase
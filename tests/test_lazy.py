@@ -0,0 +1,54 @@
+import copy
+import pickle
+
+import pytest
+
+from corpus import KANJI_DIR, loadKanji
+from kvg.lazy import LazyCorpus
+from kvg.snapshot import encodeKanji
+
+
+@pytest.fixture(params=["directory", "release"])
+def corpus(request, sampleRelease):
+    if request.param == "directory":
+        return LazyCorpus(KANJI_DIR)
+    return LazyCorpus(sampleRelease)
+
+
+def testAttributesDelegated(corpus):
+    lazy = corpus["05b57"]
+    assert corpus.misses == 0
+    assert encodeKanji(lazy.load()) == encodeKanji(loadKanji())
+    assert len(lazy.getStrokes()) == 6
+    assert corpus.misses == 1
+
+
+def testPrivateNamesNotDelegated(corpus):
+    lazy = corpus["05b57"]
+    for name in ("__setstate__", "__deepcopy__", "_flags", "_private"):
+        assert not hasattr(lazy, name)
+    assert corpus.misses == 0
+    # Unknown public names are still looked up on the Kanji
+    with pytest.raises(AttributeError):
+        lazy.noSuchAttribute
+    assert corpus.misses == 1
+
+
+def testCopy(corpus):
+    lazy = corpus["05b57"]
+    copied = copy.copy(lazy)
+    assert copied.corpus is corpus
+    assert copied.kId() == "05b57"
+    assert corpus.misses == 0
+    assert copied.load() is lazy.load()
+
+    deep = copy.deepcopy(lazy)
+    assert deep.kId() == "05b57"
+    assert encodeKanji(deep.load()) == encodeKanji(loadKanji())
+
+
+def testPickle(corpus):
+    lazy = corpus["04e00"]
+    restored = pickle.loads(pickle.dumps(lazy))
+    assert restored.kId() == "04e00"
+    assert encodeKanji(restored.load()) == encodeKanji(loadKanji("04e00.svg"))
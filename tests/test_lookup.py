@@ -0,0 +1,189 @@
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+import kvg
+from corpus import KANJI_DIR, SAMPLE_FILES
+from kvg.lookup import LookupClient, LookupData, commands, serve, serverRunning
+
+SRC_DIR = os.path.dirname(os.path.dirname(kvg.__file__))
+ENV = dict(os.environ, PYTHONPATH=SRC_DIR)
+# Run with -P, or kvg.py next to it would shadow the kvg package
+LOOKUP = [sys.executable, "-P", os.path.join(SRC_DIR, "kvg", "kvg-lookup.py")]
+
+# A server answering from empty data, enough to exercise the socket handling
+SERVER = "import sys; from kvg.lookup import LookupData, serve; serve(LookupData(), sys.argv[1])"
+
+# Files of kanji/ with several variants, next to the sample ones
+VARIANT_FILES = [
+    "05b57-Kaisho.svg",
+    "0658e.svg",
+    "0658e-Kaisho.svg",
+    "0658e-KaishoMdFst.svg",
+    "0658e-KaishoVt6.svg",
+]
+
+# (command, arguments and options) compared between the local and server
+# modes, with found and missing entries
+QUERIES = [
+    ("find-svg", ["04e00", "字", "0658e", "05d82", "4e01"]),
+    ("find-xml", ["04e00", "字", "6c34", "4e01"]),
+    ("find-component", ["口", "一", "子", "亻"]),
+    ("find-component", ["亻", "木", "子", "--position=left"]),
+    ("find-component", ["水", "--radical=general"]),
+    ("find-component", ["廿", "襾", "--part=2"]),
+]
+
+
+def startServer(path, cwd=None):
+    """Start a server on path: the kvg-lookup.py one serving the data of
+    cwd if given, one answering from empty data otherwise."""
+    if cwd is None:
+        command = [sys.executable, "-c", SERVER, path]
+    else:
+        command = LOOKUP + ["serve", f"--socket={path}"]
+    process = subprocess.Popen(command, cwd=cwd, env=ENV, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while not serverRunning(path):
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            pytest.fail("The lookup server did not start")
+        time.sleep(0.05)
+    return process
+
+
+def stopServer(process):
+    process.send_signal(signal.SIGTERM)
+    process.wait(timeout=30)
+
+
+@pytest.fixture
+def socketPath(tmp_path):
+    return str(tmp_path / "lookup.sock")
+
+
+def testServerRunning(socketPath):
+    assert not serverRunning(socketPath)
+    process = startServer(socketPath)
+    try:
+        assert serverRunning(socketPath)
+    finally:
+        stopServer(process)
+    assert not os.path.exists(socketPath)
+    assert not serverRunning(socketPath)
+
+
+def testSecondServerRefused(socketPath):
+    process = startServer(socketPath)
+    try:
+        with pytest.raises(Exception, match="already running"):
+            serve(LookupData(), socketPath)
+        # The running server still owns its socket
+        client = LookupClient(socketPath)
+        with pytest.raises(Exception, match="KeyError"):
+            client.query("no-such-command", "x")
+        client.close()
+    finally:
+        stopServer(process)
+
+
+def testStaleSocketReplaced(socketPath):
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socketPath)
+    stale.close()
+    assert os.path.exists(socketPath)
+    process = startServer(socketPath)
+    try:
+        assert serverRunning(socketPath)
+    finally:
+        stopServer(process)
+
+
+def testSocketOfAnotherServerKept(socketPath):
+    process = startServer(socketPath)
+    # Replaced behind the back of the server, which must not remove it
+    os.unlink(socketPath)
+    other = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    other.bind(socketPath)
+    try:
+        stopServer(process)
+        assert os.path.exists(socketPath)
+    finally:
+        other.close()
+
+
+@pytest.fixture
+def lookupDir(tmp_path, sampleRelease):
+    """A directory holding a kanji/ directory and its kanjivg.xml, as
+    kvg-lookup.py expects them."""
+    os.mkdir(tmp_path / "kanji")
+    for f in SAMPLE_FILES + VARIANT_FILES:
+        shutil.copy(os.path.join(KANJI_DIR, f), tmp_path / "kanji")
+    shutil.copy(sampleRelease, tmp_path / "kanjivg.xml")
+    return tmp_path
+
+
+def runLookup(args, cwd, input=None):
+    result = subprocess.run(
+        LOOKUP + args, cwd=cwd, env=ENV, input=input, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def testLoadedDataMatchesOnDemand(lookupDir):
+    local = LookupData(str(lookupDir / "kanji"), str(lookupDir / "kanjivg.xml"))
+    loaded = LookupData(str(lookupDir / "kanji"), str(lookupDir / "kanjivg.xml"))
+    loaded.load()
+    for command, args in QUERIES:
+        options = {}
+        for a in args:
+            if a.startswith("--"):
+                name, _, value = a[2:].partition("=")
+                options[name] = value
+        for arg in args:
+            if not arg.startswith("--"):
+                expected = commands[command](local, arg, **options)
+                assert commands[command](loaded, arg, **options) == expected
+
+
+def testServerMatchesLocal(lookupDir, tmp_path):
+    socketPath = str(tmp_path / "lookup.sock")
+    local = [runLookup([command] + args, lookupDir) for command, args in QUERIES]
+    # The snapshot and the component index are written by now: the server
+    # reads the same data
+    process = startServer(socketPath, lookupDir)
+    try:
+        for (command, args), expected in zip(QUERIES, local):
+            server = runLookup([command] + args + [f"--server={socketPath}"], lookupDir)
+            assert server == expected
+        # Through LookupClient too
+        client = LookupClient(socketPath)
+        try:
+            assert client.query("find-xml", "字") == runLookup(
+                ["find-xml", "字"], lookupDir
+            )
+        finally:
+            client.close()
+    finally:
+        stopServer(process)
+    assert "Found 4 files matching ID 0658e" in local[0]
+    assert "Character 04e01 (丁) not found." in local[1]
+
+
+@pytest.mark.parametrize("command", ["find-svg", "find-xml"])
+def testBatchMatchesOneByOne(lookupDir, command):
+    args = ["04e00", "字", "0658e", "4e01", "水"]
+    outputs = [runLookup([command, arg], lookupDir) for arg in args]
+    assert runLookup([command] + args, lookupDir) == "".join(outputs)
+    # Blank lines are skipped
+    stdin = "\n".join(args[1:]) + "\n\n"
+    assert runLookup([command, "-"], lookupDir, stdin) == "".join(outputs[1:])
+    # and - may be mixed with arguments, in order
+    assert runLookup([command, args[0], "-"], lookupDir, stdin) == "".join(outputs)
@@ -0,0 +1,132 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+import kvg
+from corpus import SAMPLE_FILES, samplePaths
+from kvg.kanjivg import Kanji, Stroke, StrokeGr
+from kvg.pathstore import PathStore, encodePath, verifyPathStore, writePathStore
+from kvg.utils import _readSvgFiles
+
+# Paths that formatPath() would not write back as is, and their reason
+FALLBACK_PATHS = {
+    "inkscape separators": "M 10.5,20 C 30,40 50,60 70,80",
+    "spaces only": "M10.5 20c1 2 3 4 5 6",
+    "trailing zeros": "M10.50,20.0c1,2,3,4,5,6",
+    "leading dot": "M.5,20c1,2,3,4,5,6",
+    "thousandths": "M10.125,20",
+    "explicit plus": "M+10,20",
+    "long command": "M0,0c" + ",".join(["1"] * 300),
+    "no command": "10,20",
+}
+
+# Paths encodePath() accepts, with a delta too large for the int16 column
+OVERFLOW_PATHS = ["M1,1L400,1", "M300,1L-30,1", "M-200,0l200,0"]
+
+
+def sampleKanjis():
+    """Kanji of the sample files, by file name as loadAllSvg() gives them."""
+    ret = {}
+    for path, kanji, error in _readSvgFiles(samplePaths(), validate=False):
+        assert error is None, error
+        ret[os.path.basename(path)[:-4]] = kanji
+    return ret
+
+
+def fallbackKanji():
+    kanji = Kanji("04e00")
+    kanji.strokes = StrokeGr()
+    paths = [None] + list(FALLBACK_PATHS.values()) + OVERFLOW_PATHS
+    # Packed strokes
+    paths += ["", "M1,2c3,4,5,6,7,8", "M327.67-327.68"]
+    for d in paths:
+        stroke = Stroke()
+        stroke.svg = d
+        kanji.strokes.addChild(stroke)
+    return kanji
+
+
+def roundTrip(kanjis, path):
+    writePathStore(kanjis, path)
+    store = PathStore(str(path))
+    try:
+        return {kid: store.kanjiPaths(kid) for kid in store.kanjiIds}
+    finally:
+        store.close()
+
+
+def testSampleRoundTrip(tmp_path):
+    kanjis = sampleKanjis()
+    assert kanjis
+    stored = roundTrip(kanjis, tmp_path / "sample.paths")
+    assert list(stored) == list(kanjis)
+    for kid, kanji in kanjis.items():
+        assert stored[kid] == [stroke.svg for stroke in kanji.getStrokes()], kid
+
+
+@pytest.mark.parametrize("name", sorted(FALLBACK_PATHS))
+def testFallbackPaths(name):
+    assert encodePath(FALLBACK_PATHS[name]) is None
+
+
+@pytest.mark.parametrize("d", OVERFLOW_PATHS)
+def testOverflowPaths(d):
+    assert encodePath(d) is not None
+
+
+def testFallbackRoundTrip(tmp_path):
+    kanji = fallbackKanji()
+    path = tmp_path / "fallback.paths"
+    strokes, exceptions = writePathStore([kanji], path)
+    assert strokes == len(kanji.getStrokes())
+    assert exceptions == 1 + len(FALLBACK_PATHS) + len(OVERFLOW_PATHS)
+    store = PathStore(str(path))
+    try:
+        assert store.kanjiPaths("04e00") == [s.svg for s in kanji.getStrokes()]
+        assert verifyPathStore(store, [kanji]) == []
+    finally:
+        store.close()
+
+
+def testVerifyReportsMismatches(tmp_path):
+    kanji = fallbackKanji()
+    path = tmp_path / "fallback.paths"
+    writePathStore([kanji], path)
+    kanji.getStrokes()[-1].svg = "M1,2"
+    store = PathStore(str(path))
+    try:
+        count = len(kanji.getStrokes())
+        assert verifyPathStore(store, [kanji]) == [("04e00", count)]
+    finally:
+        store.close()
+
+
+def testPackVerify(tmp_path):
+    """kvg.py pack --verify on a directory of SVG files."""
+    os.mkdir(tmp_path / "kanji")
+    for path in samplePaths():
+        shutil.copy(path, tmp_path / "kanji")
+    srcDir = os.path.dirname(os.path.dirname(kvg.__file__))
+    # Run with -P, or kvg.py would shadow the kvg package
+    result = subprocess.run(
+        [sys.executable, "-P", os.path.join(srcDir, "kvg", "kvg.py")]
+        + ["pack", "kanji", "--verify"],
+        cwd=tmp_path,
+        env=dict(os.environ, PYTHONPATH=srcDir),
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert result.stdout.endswith("Round trip OK\n")
+
+    kanjis = sampleKanjis()
+    store = PathStore(str(tmp_path / "kanji.paths"))
+    try:
+        assert sorted(store.kanjiIds) == sorted(f[:-4] for f in SAMPLE_FILES)
+        for name, kanji in kanjis.items():
+            assert store.kanjiPaths(name) == [s.svg for s in kanji.getStrokes()]
+    finally:
+        store.close()
@@ -0,0 +1,112 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from corpus import KANJI_DIR
+from kvg.kvg import readReleaseManifest, release
+from kvg.utils import readXmlFile, xmlIndexPath
+
+# Files whose layout extractKanji() expects, without indentation
+MAIN_FILES = ["04e00.svg", "05016.svg", "05b57.svg", "06c34.svg", "0751c.svg"]
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """A directory holding a kanji/ directory with a few main files and a
+    variant, as the working directory."""
+    os.mkdir(tmp_path / "kanji")
+    for f in MAIN_FILES + ["05d82-Kaisho.svg"]:
+        shutil.copy(os.path.join(KANJI_DIR, f), tmp_path / "kanji")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def releaseState():
+    """The release file, its index and the manifest entries, without the
+    stamps that depend on modification times."""
+    with open("kanjivg.xml", "rb") as f:
+        data = f.read()
+    with open(xmlIndexPath("kanjivg.xml"), encoding="utf8") as f:
+        index = json.load(f)["kanji"]
+    files = {f: entry[2:] for f, entry in readReleaseManifest().items()}
+    return data, index, files
+
+
+def testIncrementalMatchesFull(workdir):
+    release()
+    kanji = workdir / "kanji"
+    path = kanji / "05b57.svg"
+    path.write_bytes(path.read_bytes().replace(b'kvg:type="', b'kvg:type="x'))
+    os.unlink(kanji / "06c34.svg")
+    shutil.copy(os.path.join(KANJI_DIR, "0914b.svg"), kanji)
+    # Touched, but not modified: reused after a hash check
+    st = os.stat(kanji / "0751c.svg")
+    os.utime(kanji / "0751c.svg", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    release(incremental=True)
+    incremental = releaseState()
+    release()
+    assert incremental == releaseState()
+    kanjis = readXmlFile("kanjivg.xml", validate=False)
+    assert list(kanjis) == ["04e00", "05016", "05b57", "0751c", "0914b"]
+    assert kanjis["05b57"].getStrokes()[0].element.startswith("x")
+
+
+def testIncrementalReusesElements(workdir):
+    from kvg import instrument
+
+    release()
+    first = releaseState()
+    recorder = instrument.enable()
+    try:
+        release(incremental=True)
+    finally:
+        instrument.disable()
+    assert recorder.counters["release.reused"] == len(MAIN_FILES)
+    assert releaseState() == first
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def testArchives(workdir, workers, monkeypatch):
+    import builtins
+    import datetime
+    import gzip
+    import zipfile
+    import zlib
+
+    import kvg.kvg
+
+    release()
+    expected = releaseState()
+    os.unlink("kanjivg.xml")
+
+    # Each SVG file is read once, by a worker if there are any
+    reads = []
+
+    def countingOpen(path, *args, **kwargs):
+        if str(path).startswith("kanji/"):
+            reads.append(path)
+        return builtins.open(path, *args, **kwargs)
+
+    monkeypatch.setattr(kvg.kvg, "open", countingOpen, raising=False)
+    release(archives=True, workers=workers)
+    files = sorted(os.listdir("kanji"))
+    assert sorted(reads) == ([] if workers > 1 else [f"kanji/{f}" for f in files])
+    assert releaseState() == expected
+
+    date = datetime.date.today().strftime("%Y%m%d")
+    with gzip.open(f"kanjivg-{date}.xml.gz") as f:
+        assert f.read() == expected[0]
+    for suffix, names in (("all", files), ("main", MAIN_FILES)):
+        with zipfile.ZipFile(f"kanjivg-{date}-{suffix}.zip") as archive:
+            assert archive.namelist() == [f"kanji/{f}" for f in names]
+            for info in archive.infolist():
+                data = (workdir / info.filename).read_bytes()
+                assert archive.read(info) == data
+                # Deflated at level 9
+                compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+                deflated = compressor.compress(data) + compressor.flush()
+                assert info.compress_type == zipfile.ZIP_DEFLATED
+                assert info.compress_size == len(deflated)
@@ -0,0 +1,166 @@
+import random
+
+import pytest
+
+from corpus import KANJI_DIR
+from kvg.kanjivg import Kanji, Stroke, StrokeGr, simplifyAll
+from kvg.snapshot import decodeKanji, encodeKanji
+from kvg.utils import loadAllSvg
+
+
+def referenceSimplify(self):
+    """StrokeGr.simplify() as it was before the single iterative pass."""
+    for child in self.children:
+        if isinstance(child, StrokeGr):
+            referenceSimplify(child)
+    if len(self.children) == 1 and isinstance(self.children[0], StrokeGr):
+        child = self.children[0]
+        # Check if there is no conflict
+        if child.element and self.element and child.element != self.element:
+            return
+        if child.original and self.original and child.original != self.original:
+            return
+        # Parts cannot be merged
+        if child.part and self.part and self.part != child.part:
+            return
+        if child.variant and self.variant and child.variant != self.variant:
+            return
+        if child.partial and self.partial and child.partial != self.partial:
+            return
+        if child.tradForm and self.tradForm and child.tradForm != self.tradForm:
+            return
+        if (
+            child.radicalForm
+            and self.radicalForm
+            and child.radicalForm != self.radicalForm
+        ):
+            return
+        # We want to preserve inner identical positions - we may have something at the top
+        # of another top element, for instance.
+        if child.position and self.position:
+            return
+        if child.radical and self.radical and child.radical != self.radical:
+            return
+        if child.phon and self.phon and child.phon != self.phon:
+            return
+
+        # Ok, let's merge!
+        self.children = child.children
+        for grandChild in self.children:
+            if isinstance(grandChild, StrokeGr):
+                grandChild.parent = self
+        self.invalidate()
+        if child.element:
+            self.element = child.element
+        if child.original:
+            self.original = child.original
+        if child.part:
+            self.part = child.part
+        if child.variant:
+            self.variant = child.variant
+        if child.partial:
+            self.partial = child.partial
+        if child.tradForm:
+            self.tradForm = child.tradForm
+        if child.radicalForm:
+            self.radicalForm = child.radicalForm
+        if child.position:
+            self.position = child.position
+        if child.radical:
+            self.radical = child.radical
+        if child.phon:
+            self.phon = child.phon
+
+
+def referenceFixpoint(kanji):
+    """Apply referenceSimplify() until the tree no longer changes."""
+    while True:
+        before = encodeKanji(kanji)
+        referenceSimplify(kanji.strokes)
+        if encodeKanji(kanji) == before:
+            return
+
+
+def randomGroup(rng, depth=0):
+    """Random tree made mostly of single-child chains, with attributes that
+    often conflict."""
+    group = StrokeGr()
+    for name, values in (
+        ("element", "AB"),
+        ("original", "AB"),
+        ("position", ["left", "top"]),
+        ("radical", ["general"]),
+        ("phon", ["X"]),
+        ("part", [1, 2]),
+    ):
+        if rng.random() < 0.3:
+            setattr(group, name, rng.choice(values))
+    for name in ("variant", "partial", "tradForm", "radicalForm"):
+        if rng.random() < 0.2:
+            setattr(group, name, True)
+    for _ in range(1 if rng.random() < 0.6 else rng.randint(0, 3)):
+        if depth < 6 and rng.random() < 0.8:
+            randomGroup(rng, depth + 1).setParent(group)
+        else:
+            stroke = Stroke()
+            stroke.svg = "M1,1"
+            group.addChild(stroke)
+    return group
+
+
+def randomKanjis(count, seed=0):
+    rng = random.Random(seed)
+    ret = []
+    for i in range(count):
+        kanji = Kanji(0x4E00 + i)
+        kanji.strokes = randomGroup(rng)
+        ret.append(kanji)
+    return ret
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return list(loadAllSvg(KANJI_DIR, workers=1, errors={}, validate=False).values())
+
+
+def assertParents(group):
+    for child in group.children:
+        if isinstance(child, StrokeGr):
+            assert child.parent is group
+            assertParents(child)
+
+
+def checkAgainstReference(kanjis):
+    data = [encodeKanji(kanji) for kanji in kanjis if kanji.strokes is not None]
+    expected = [decodeKanji(d) for d in data]
+    for kanji in expected:
+        referenceFixpoint(kanji)
+    simplified = [decodeKanji(d) for d in data]
+    simplifyAll(simplified)
+    for kanji, reference in zip(simplified, expected):
+        assert encodeKanji(kanji) == encodeKanji(reference), kanji.kId()
+        assertParents(kanji.strokes)
+
+
+def testCorpusMatchesReference(corpus):
+    checkAgainstReference(corpus)
+
+
+def testRandomTreesMatchReference():
+    checkAgainstReference(randomKanjis(5000))
+
+
+def testCachesInvalidated():
+    data = [encodeKanji(kanji) for kanji in randomKanjis(500, seed=1)]
+    cached = [decodeKanji(d) for d in data]
+    for kanji in cached:
+        kanji.strokes.components(recursive=True)
+        kanji.getStrokes()
+    simplifyAll(cached)
+    fresh = [decodeKanji(d) for d in data]
+    simplifyAll(fresh)
+    for kanji, reference in zip(cached, fresh):
+        assert kanji.strokes.components(recursive=True) == (
+            reference.strokes.components(recursive=True)
+        )
+        assert len(kanji.getStrokes()) == len(reference.getStrokes())
@@ -0,0 +1,54 @@
+import os
+import shutil
+
+import pytest
+
+from kvg.snapshot import encodeKanji, loadXmlFile, readSnapshot, snapshotPath
+from kvg.utils import readXmlFile
+
+
+@pytest.fixture
+def release(sampleRelease, tmp_path):
+    """A copy of the sample release file and its snapshot."""
+    path = str(tmp_path / "kanjivg.xml")
+    shutil.copy(sampleRelease, path)
+    loadXmlFile(path)
+    return path
+
+
+def encoded(kanjis):
+    return {key: encodeKanji(kanji) for key, kanji in kanjis.items()}
+
+
+def testRoundTrip(release):
+    expected = encoded(readXmlFile(release, validate=False))
+    assert encoded(readSnapshot(snapshotPath(release), release)) == expected
+    keys = ["05b57", "missing"]
+    assert encoded(readSnapshot(snapshotPath(release), release, keys)) == {
+        "05b57": expected["05b57"]
+    }
+
+
+@pytest.mark.parametrize("keys", [None, ["0914b"]])
+def testTruncated(release, keys):
+    path = snapshotPath(release)
+    data = open(path, "rb").read()
+    # In the magic, the header length, the header and the last blob, which
+    # is the one of 0914b
+    for size in (4, 10, 40, len(data) - 1):
+        with open(path, "wb") as f:
+            f.write(data[:size])
+        assert readSnapshot(path, release, keys) is None
+
+
+def testCorruptRebuilt(release):
+    path = snapshotPath(release)
+    data = bytearray(open(path, "rb").read())
+    data[12:24] = b"\xff" * 12
+    with open(path, "wb") as f:
+        f.write(data)
+    assert readSnapshot(path, release) is None
+    expected = encoded(readXmlFile(release, validate=False))
+    assert encoded(loadXmlFile(release)) == expected
+    assert encoded(readSnapshot(path, release)) == expected
+    assert os.path.getsize(path) == len(data)
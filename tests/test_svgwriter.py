@@ -0,0 +1,116 @@
+import io
+import itertools
+import os
+
+import pytest
+
+from corpus import SAMPLE_FILES, loadKanji
+from kvg.svgwriter import (
+    SVG_HEADER,
+    kanjiToSVG,
+    strokeNumbersToSVG,
+    strokesToSVG,
+    writeSvgFiles,
+)
+from kvg.utils import mapInOrder
+
+# Files with the rarer group attributes: variant with tradForm and
+# radicalForm (065e2-Kaisho), partial and number (05b73, 05716), radicalForm
+# (05101)
+ATTRIBUTE_FILES = ["065e2-Kaisho.svg", "05101.svg", "05716.svg", "05b73.svg"]
+
+
+def referenceStrokes(kanji, indent=0):
+    """Stroke groups as written by StrokeGr.toSVG()."""
+    out = io.StringIO()
+    if kanji.strokes is not None:
+        kanji.strokes.toSVG(out, kanji.kId(), [0], [1], indent)
+    return out.getvalue()
+
+
+def referenceNumbers(kanji, indent=0):
+    out = io.StringIO()
+    for cpt, stroke in enumerate(kanji.getStrokes(), start=1):
+        stroke.number_to_svg(out, cpt, indent + 1)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("name", SAMPLE_FILES + ATTRIBUTE_FILES)
+def testMatchesToSVG(name):
+    kanji = loadKanji(name)
+    for indent in (0, 2):
+        assert strokesToSVG(kanji, indent) == referenceStrokes(kanji, indent)
+        assert strokeNumbersToSVG(kanji, indent) == referenceNumbers(kanji, indent)
+    out = io.StringIO()
+    kanji.outputStrokes(out)
+    assert out.getvalue() == referenceStrokes(kanji)
+
+
+def testAttributeFilesCovered():
+    svg = "".join(strokesToSVG(loadKanji(f)) for f in ATTRIBUTE_FILES)
+    for attribute in ("variant", "partial", "tradForm", "radicalForm", "number"):
+        assert f" kvg:{attribute}=" in svg
+
+
+@pytest.mark.parametrize(
+    "flags", list(itertools.product((False, True), repeat=4)), ids=str
+)
+def testAllAttributes(flags):
+    kanji = loadKanji()
+    for i, (_, group) in enumerate(kanji.getGroups()):
+        group.part = i + 1
+        group.number = i + 2
+        group.original = "原"
+        group.position = "top"
+        group.radical = "general"
+        group.phon = "音"
+        group.variant, group.partial, group.tradForm, group.radicalForm = flags
+    assert strokesToSVG(kanji, 1) == referenceStrokes(kanji, 1)
+
+
+def testKanjiToSVG():
+    kanji = loadKanji("05b73.svg")
+    kid = kanji.kId()
+    assert kanjiToSVG(kanji) == (
+        SVG_HEADER
+        + f'\t<g id="kvg:StrokePaths_{kid}" style="fill:none;stroke:#000000;stroke-width:3;stroke-linecap:round;stroke-linejoin:round;">\n'
+        + referenceStrokes(kanji, 2)
+        + "\t</g>\n"
+        + f'\t<g id="kvg:StrokeNumbers_{kid}" style="font-size:8;fill:#808080">\n'
+        + referenceNumbers(kanji, 1)
+        + "\t</g>\n</svg>"
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def testWriteSvgFiles(tmp_path, workers):
+    kanjis = {f[:-4]: loadKanji(f) for f in SAMPLE_FILES}
+    # A generator, as iterXmlFile() returns
+    count = writeSvgFiles(
+        (kanji for kanji in kanjis.values()), str(tmp_path), workers, chunksize=4
+    )
+    names = {kanji.kId() for kanji in kanjis.values()}
+    assert count == len(kanjis)
+    assert sorted(os.listdir(tmp_path)) == sorted(f"{kid}.svg" for kid in names)
+    for kanji in kanjis.values():
+        path = tmp_path / f"{kanji.kId()}.svg"
+        assert path.read_text(encoding="utf-8") == kanjiToSVG(kanji)
+
+
+def testMapInOrderBoundsPending():
+    from concurrent.futures import ThreadPoolExecutor
+
+    pulled = []
+
+    def chunks():
+        for i in range(20):
+            pulled.append(i)
+            yield i
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        for i, result in enumerate(mapInOrder(executor, lambda x: -x, chunks(), 3)):
+            assert result == -i
+            # The chunk of this result, the 3 pending ones and the one that
+            # made room for them
+            assert len(pulled) <= i + 4
+    assert pulled == list(range(20))
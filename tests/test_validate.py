@@ -0,0 +1,81 @@
+from corpus import SAMPLE_FILES, loadKanji
+from kvg.kanjivg import Kanji, Stroke, StrokeGr
+from kvg.svgwriter import kanjiToSVG
+from kvg.utils import SvgFileInfo
+from kvg.validate import RULES, Diagnostic, lintFiles, validateKanji
+
+# (element, part, number) of the sub-groups of the malformed kanji, with the
+# rule each one breaks
+MALFORMED = [
+    ("一", None, 1, "number-without-part"),
+    ("口", 2, None, "multipart-not-started"),
+    ("木", 1, None, None),
+    ("木", 3, None, "multipart-misnumbered"),
+    ("日", 2, 1, "missing-numbered-group"),
+    ("月", 1, 1, None),
+    ("月", 3, 1, "incorrectly-numbered-group"),
+    ("火", 1, 2, None),
+    ("火", 1, 2, "duplicate-numbered-group"),
+    # Well-formed: both parts of 水, and numbered parts that follow each other
+    ("水", 1, None, None),
+    ("水", 2, None, None),
+    ("土", 1, 1, None),
+    ("土", 2, 1, None),
+]
+
+
+def malformedKanji():
+    kanji = Kanji("04e00")
+    kanji.strokes = StrokeGr()
+    kanji.strokes.element = "一"
+    for i, (element, part, number, _) in enumerate(MALFORMED):
+        group = StrokeGr()
+        group.element = element
+        group.part = part
+        group.number = number
+        group.setParent(kanji.strokes)
+        stroke = Stroke()
+        stroke.svg = f"M{i},0l1,1"
+        group.addChild(stroke)
+    return kanji
+
+
+def expectedDiagnostics():
+    return [
+        Diagnostic("04e00", f"04e00-g{i}", rule, RULES[rule])
+        for i, (_, _, _, rule) in enumerate(MALFORMED, start=1)
+        if rule is not None
+    ]
+
+
+def testMalformedKanji():
+    assert validateKanji(malformedKanji()) == expectedDiagnostics()
+
+
+def testSampleFiles():
+    for f in SAMPLE_FILES:
+        assert validateKanji(loadKanji(f)) == [], f
+
+
+def testPrintedWhenParsing(tmp_path, capsys):
+    (tmp_path / "04e00.svg").write_text(kanjiToSVG(malformedKanji()), "utf-8")
+    kanji = SvgFileInfo("04e00.svg", str(tmp_path)).read(validate=False)
+    assert capsys.readouterr().out == ""
+    assert validateKanji(kanji) == expectedDiagnostics()
+    SvgFileInfo("04e00.svg", str(tmp_path)).read()
+    assert capsys.readouterr().out == "".join(
+        f"04e00: {d.message}\n" for d in expectedDiagnostics()
+    )
+
+
+def testLintFiles(tmp_path):
+    (tmp_path / "04e00.svg").write_text(kanjiToSVG(malformedKanji()), "utf-8")
+    (tmp_path / "05b57.svg").write_text(kanjiToSVG(loadKanji()), "utf-8")
+    (tmp_path / "06c34.svg").write_text("<svg", "utf-8")
+    paths = [str(tmp_path / f) for f in ("04e00.svg", "05b57.svg", "06c34.svg")]
+    results = list(lintFiles(paths, workers=1))
+    assert [path for path, _ in results] == paths
+    assert results[0][1] == expectedDiagnostics()
+    assert results[1][1] == []
+    assert [d.rule for d in results[2][1]] == ["parse-error"]
+    assert list(lintFiles(paths, workers=2, chunksize=1)) == results
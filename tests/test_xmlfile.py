@@ -0,0 +1,102 @@
+import json
+import os
+import shutil
+
+import pytest
+
+import kvg.utils
+from kvg.snapshot import encodeKanji
+from kvg.utils import (
+    iterXmlFile,
+    parseXmlFile,
+    readXmlEntries,
+    readXmlFile,
+    readXmlIndex,
+    xmlBackends,
+    xmlIndexPath,
+)
+
+
+@pytest.fixture
+def release(sampleRelease, tmp_path):
+    """A copy of the sample release file, without index."""
+    path = str(tmp_path / "kanjivg.xml")
+    shutil.copy(sampleRelease, path)
+    return path
+
+
+def encoded(kanjis):
+    return {key: encodeKanji(kanji) for key, kanji in kanjis.items()}
+
+
+def testIndexSlices(release):
+    data = open(release, "rb").read()
+    index = readXmlIndex(release)
+    assert list(index) == list(readXmlFile(release, validate=False))
+    ends = []
+    for kid, (start, end) in index.items():
+        entry = data[start:end]
+        assert entry.startswith(f'<kanji id="kvg:kanji_{kid}">'.encode())
+        assert entry.endswith(b"</kanji>")
+        assert entry.count(b"<kanji ") == 1
+        ends.append((start, end))
+    # Entries are back to back, one per line
+    for (_, end), (start, _) in zip(ends, ends[1:]):
+        assert data[end:start] == b"\n"
+    assert encoded(readXmlEntries(release, list(index), index)) == encoded(
+        readXmlFile(release)
+    )
+
+
+def testIndexReused(release):
+    index = readXmlIndex(release)
+    assert os.path.exists(xmlIndexPath(release))
+    # An up to date sidecar is read, not rebuilt
+    with open(xmlIndexPath(release), encoding="utf8") as f:
+        data = json.load(f)
+    data["kanji"] = {"04e00": data["kanji"]["04e00"]}
+    with open(xmlIndexPath(release), "w", encoding="utf8") as f:
+        json.dump(data, f)
+    assert readXmlIndex(release) == {"04e00": index["04e00"]}
+
+
+def testIndexRebuiltWhenStale(release):
+    index = readXmlIndex(release)
+    with open(xmlIndexPath(release), encoding="utf8") as f:
+        stamp = json.load(f)["stamp"]
+
+    # Same size, other modification time
+    st = os.stat(release)
+    os.utime(release, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    with open(xmlIndexPath(release), "w", encoding="utf8") as f:
+        json.dump({"stamp": stamp, "kanji": {}}, f)
+    assert readXmlIndex(release) == index
+
+    # Other content: the first entry is dropped
+    data = open(release, "rb").read()
+    start, end = index["00021"]
+    with open(release, "wb") as f:
+        f.write(data[:start] + data[end + 1 :])
+    shifted = end + 1 - start
+    assert readXmlIndex(release) == {
+        kid: (s - shifted, e - shifted)
+        for kid, (s, e) in index.items()
+        if kid != "00021"
+    }
+    assert readXmlIndex(release, write=False) == readXmlIndex(release)
+
+
+@pytest.mark.parametrize("blockSize", [kvg.utils.XML_BLOCK_SIZE, 97])
+@pytest.mark.parametrize("backend", ["sax", "expat", "lxml"])
+def testIterXmlFile(release, backend, blockSize, monkeypatch):
+    from kvg.kanjivg import KanjisHandler
+
+    if backend not in xmlBackends():
+        pytest.skip(f"{backend} is not installed")
+    handler = KanjisHandler(validate=False)
+    parseXmlFile(release, handler, backend)
+    expected = [(kid, encodeKanji(kanji)) for kid, kanji in handler.kanjis.items()]
+    # Small blocks end in the middle of entries and tags
+    monkeypatch.setattr(kvg.utils, "XML_BLOCK_SIZE", blockSize)
+    parsed = iterXmlFile(release, backend=backend, validate=False)
+    assert [(kanji.kId(), encodeKanji(kanji)) for kanji in parsed] == expected
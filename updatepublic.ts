@@ -6,13 +6,7 @@
  * Creates release archives of KanjiVG data
  */
 
-import fs from 'fs/promises'
-import path from 'path'
 import { execaCommand } from 'execa'
-import archiver from 'archiver'
-import { createWriteStream, createReadStream } from 'fs'
-import { pipeline } from 'stream/promises'
-import { createGzip } from 'zlib'
 
 async function main() {
   const date = new Date().toISOString().slice(0, 10).replace(/-/g, '')
@@ -22,21 +16,11 @@ async function main() {
 
   console.log('📦 Creating KanjiVG release archives...')
 
-  // Create zip of all kanji SVG files
-  console.log(`Creating ${outFileAll}...`)
-  await createZipArchive(outFileAll, 'kanji/**/*.svg')
-
-  // Create zip of main kanji SVG files (5-character filenames)
-  console.log(`Creating ${outFileMain}...`)
-  await createZipArchive(outFileMain, 'kanji/?????.svg')
-
-  // Run kvg.py release
-  console.log('Running kvg.py release...')
-  await execaCommand('python kvg.py release', { shell: true, stdio: 'inherit' })
-
-  // Gzip kanjivg.xml
-  console.log(`Creating ${outFileOne}...`)
-  await gzipFile('kanjivg.xml', outFileOne)
+  // kvg.py writes kanjivg.xml and the three archives in a single pass
+  await execaCommand('python kvg.py release --archives', {
+    shell: true,
+    stdio: 'inherit',
+  })
 
   console.log('✅ Release archives created successfully!')
   console.log(`  - ${outFileOne}`)
@@ -44,30 +28,6 @@ async function main() {
   console.log(`  - ${outFileMain}`)
 }
 
-async function createZipArchive(
-  outputFile: string,
-  pattern: string
-): Promise<void> {
-  return new Promise((resolve, reject) => {
-    const output = createWriteStream(outputFile)
-    const archive = archiver('zip', { zlib: { level: 9 } })
-
-    output.on('close', () => resolve())
-    archive.on('error', (err) => reject(err))
-
-    archive.pipe(output)
-    archive.glob(pattern)
-    archive.finalize()
-  })
-}
-
-async function gzipFile(inputFile: string, outputFile: string): Promise<void> {
-  const gzip = createGzip()
-  const source = createReadStream(inputFile)
-  const destination = createWriteStream(outputFile)
-  await pipeline(source, gzip, destination)
-}
-
 main().catch((error) => {
   console.error('❌ Error:', error.message)
   process.exit(1)